@@ -14,38 +14,199 @@ local buttons = {
 }
 
 
--- Create UDP client and connect to Python server
-local client = socket.udp()
-client:setpeername("127.0.0.1", 65432)
-client:settimeout(0)  -- Non-blocking
+-- Frame protocol (must match src/core/protocol.py)
+local SCREEN_WIDTH = 240
+local SCREEN_HEIGHT = 160
+local CHUNK_ROWS = 20
+local FRAME_CHUNKS = SCREEN_HEIGHT // CHUNK_ROWS
+local HEADER_FORMAT = "<c2BBI4I2I2I4I8"
+local MAGIC = "FR"
+local KIND_FRAME = 1
+local KIND_MEMORY = 2
+local FLAG_UNCHANGED = 1
+
+-- Memory that fully determines the rendered picture; hashing it natively is far
+-- cheaper than reading 38400 pixels, so unchanged screens are never re-read
+local VIDEO_REGIONS = {
+    {"VRAM", 0x18000},
+    {"PALRAM", 0x400},
+    {"OAM", 0x400},
+    {"IO", 0x60},   -- display control, scroll, window and blend registers
+}
+
+-- Python server port, assigned per emulator instance by BizHawkEmulator
+local PORT = tonumber(os.getenv("FIRERED_PORT")) or 65432
+
+-- Link to the Python server (see src/core/transport.py): "udp" datagrams, or
+-- "tcp" / "unix" streams of messages prefixed with their u32 length
+local TRANSPORT = os.getenv("FIRERED_TRANSPORT") or "udp"
+local ADDRESS = os.getenv("FIRERED_ADDRESS")  -- socket path for "unix"
+local STREAM = TRANSPORT ~= "udp"
+local LENGTH_FORMAT = "<I4"
+-- Datagrams carry a frame in FRAME_CHUNKS pieces; streams send it whole
+local FRAME_MESSAGES = STREAM and 1 or FRAME_CHUNKS
+
+-- Lockstep: only advance frames on `step` commands instead of free-running
+local LOCKSTEP = os.getenv("FIRERED_LOCKSTEP") == "1"
+
+-- Turbo: run uncapped with rendering and sound off. Only the last frame of
+-- each step is drawn, so `screen` still sees what the step ended on.
+local TURBO = os.getenv("FIRERED_TURBO") == "1"
+if TURBO then
+    client.speedmode(6400)           -- highest speed BizHawk accepts
+    emu.limitframerate(false)        -- no throttling to 60 fps
+    client.SetSoundOn(false)
+    client.invisibleemulation(true)  -- skip video output while emulating
+end
+
+-- Framebuffer accessor; exposed under `client` or `gui` depending on the BizHawk build
+local read_pixel = client.getpixel or gui.getpixel
+
+-- Connect to the Python server
+-- (named `conn` so it does not shadow BizHawk's `client` library)
+local conn
+if TRANSPORT == "tcp" then
+    conn = assert(socket.tcp())
+    conn:setoption("tcp-nodelay", true)
+    assert(conn:connect("127.0.0.1", PORT))
+elseif TRANSPORT == "unix" then
+    local unix = require("socket.unix")
+    conn = assert(type(unix) == "table" and unix.stream() or unix())
+    assert(conn:connect(ADDRESS))
+else
+    conn = socket.udp()
+    conn:setpeername("127.0.0.1", PORT)
+    conn:settimeout(0)  -- Non-blocking
+end
+
+local function send_message(data)
+    if STREAM then
+        conn:send(string.pack(LENGTH_FORMAT, #data) .. data)
+    else
+        conn:send(data)
+    end
+end
+
+-- Next command, nil if none is waiting, or false once the server has closed the stream
+local function receive_message()
+    if not STREAM then
+        return conn:receive()
+    end
+    -- Poll without blocking; a message that has started arriving is read whole
+    local readable = socket.select({conn}, nil, 0)
+    if #readable == 0 then
+        return nil
+    end
+    local prefix = conn:receive(4)
+    if not prefix then
+        return false
+    end
+    return conn:receive(string.unpack(LENGTH_FORMAT, prefix)) or false
+end
+
+-- 60-bit hash of the video state (0 is reserved for "no frame")
+local function frame_hash()
+    local h = 0
+    for _, region in ipairs(VIDEO_REGIONS) do
+        h = h ~ tonumber(memory.hash_region(0, region[2], region[1]):sub(1, 15), 16)
+    end
+    return h
+end
+
+-- Send the current framebuffer as raw RGB rows, split into FRAME_MESSAGES sequence-numbered chunks.
+-- If it hashes to `known` (the frame the client already has), send only a short notice.
+local function send_frame(seq, known)
+    local digest = frame_hash()
+    if digest == known then
+        send_message(string.pack(HEADER_FORMAT, MAGIC, KIND_FRAME, FLAG_UNCHANGED, seq, 0, 1, 0, digest))
+        return
+    end
+    local row = {}
+    local chunk_rows = SCREEN_HEIGHT // FRAME_MESSAGES
+    for chunk = 0, FRAME_MESSAGES - 1 do
+        local rows = {}
+        for r = 1, chunk_rows do
+            local y = chunk * chunk_rows + r - 1
+            local n = 0
+            for x = 0, SCREEN_WIDTH - 1 do
+                local argb = read_pixel(x, y)
+                row[n + 1] = (argb >> 16) & 0xFF
+                row[n + 2] = (argb >> 8) & 0xFF
+                row[n + 3] = argb & 0xFF
+                n = n + 3
+            end
+            rows[r] = string.char(table.unpack(row, 1, n))
+        end
+        local payload = table.concat(rows)
+        send_message(string.pack(HEADER_FORMAT, MAGIC, KIND_FRAME, 0, seq, chunk, FRAME_MESSAGES, #payload, digest) .. payload)
+    end
+end
+
+-- Read a list of "<addr>:<len>" / "*<ptr>+<offset>:<len>" ranges (hex addresses)
+-- from the system bus and send them back concatenated in one message
+local function send_memory(seq, spec)
+    local parts = {}
+    for token in spec:gmatch("%S+") do
+        local ptr, offset, len = token:match("^%*(%x+)%+(%x+):(%d+)$")
+        local addr
+        if ptr then
+            addr = memory.read_u32_le(tonumber(ptr, 16), "System Bus") + tonumber(offset, 16)
+        else
+            addr, len = token:match("^(%x+):(%d+)$")
+            addr = tonumber(addr, 16)
+        end
+        local bytes = memory.read_bytes_as_array(addr, tonumber(len), "System Bus")
+        parts[#parts + 1] = string.char(table.unpack(bytes))
+    end
+    local payload = table.concat(parts)
+    send_message(string.pack(HEADER_FORMAT, MAGIC, KIND_MEMORY, 0, seq, 0, 1, #payload, 0) .. payload)
+end
 
 -- Send initial ready signal
 console.log("Sending ready signal to Python server")
-client:send("ready")
+send_message("ready")
 
 -- Main loop
 while true do
     -- Handle incoming commands
-    local data = client:receive()
-    if data then
+    local message = receive_message()
+    if message == false then
+        -- Server closed the stream
+        break
+    elseif message then
+        -- Commands arrive as "#<id> <command>"; the id is echoed on every reply
+        local tag, data = message:match("^#(%d+) (.*)$")
+        if not tag then
+            tag, data = "0", message
+        end
+        local req_id = tonumber(tag)
+        local function reply(text)
+            send_message("#" .. tag .. " " .. text)
+        end
         local cmd = data:match("^(%S+)")
         
-        if cmd == "press" then
-            -- Handle button press
-            local button, duration = data:match("press (%S+) (%S+)")
-            if button and buttons[button] then
+        if cmd == "step" then
+            -- Hold a button (or nothing) for exactly N frames, then ack with the frame counter
+            local button, frames = data:match("step (%S+) (%d+)")
+            frames = tonumber(frames)
+            if button and frames and (button == "none" or buttons[button]) then
                 -- Create joypad table
                 local controls = {}
                 for b in pairs(buttons) do
                     controls[buttons[b]] = (b == button)
                 end
                 
-                -- Press button for duration
-                local frames = math.floor(duration * 60)  -- Convert seconds to frames
                 for i=1,frames do
                     joypad.set(controls, 1)
+                    if TURBO and i == frames then
+                        -- Render the frame the step ends on for screen capture
+                        client.invisibleemulation(false)
+                    end
                     emu.frameadvance()
                 end
+                if TURBO then
+                    client.invisibleemulation(true)
+                end
                 
                 -- Release button
                 for b in pairs(buttons) do
@@ -53,22 +214,73 @@ while true do
                 end
                 joypad.set(controls, 1)
                 
-                client:send("ok")
+                reply("ok " .. emu.framecount())
+                
+                -- Optional riders: the screen and a RAM read follow the ack,
+                -- so one command returns everything a step observes
+                local known = data:match(" screen (%d+)")
+                if known then
+                    send_frame(req_id, tonumber(known))
+                end
+                local spec = data:match(" readmem (.*)$")
+                if spec then
+                    send_memory(req_id, spec)
+                end
+            else
+                reply("error: invalid step")
             end
             
         elseif cmd == "screen" then
-            -- Capture and send screen content
-            local pixels = client.screenshottoclipboard()
-            client:send(pixels)
+            -- Send raw framebuffer unless it matches the client's frame hash;
+            -- chunks carry the request id as their seq
+            send_frame(req_id, tonumber(data:match("screen (%d+)")))
+            
+        elseif cmd == "readmem" then
+            -- Bulk RAM read for structured observations
+            send_memory(req_id, data:match("readmem (.*)") or "")
             
         elseif cmd == "loadstate" then
             -- Load save state
             local path = data:match("loadstate (.+)")
             if path then
                 savestate.load(path)
-                client:send("ok")
+                reply("ok")
             else
-                client:send("error: invalid path")
+                reply("error: invalid path")
+            end
+            
+        elseif cmd == "savestate" then
+            -- Write a savestate file (checkpoints)
+            local path = data:match("savestate (.+)")
+            if path then
+                savestate.save(path)
+                reply("ok")
+            else
+                reply("error: invalid path")
+            end
+            
+        elseif cmd == "savemem" then
+            -- Snapshot the core into memory; reply with its id
+            reply("ok " .. memorysavestate.savecorestate())
+            
+        elseif cmd == "loadmem" then
+            -- Restore an in-memory snapshot
+            local id = data:match("loadmem (%S+)")
+            if id then
+                memorysavestate.loadcorestate(id)
+                reply("ok")
+            else
+                reply("error: invalid snapshot id")
+            end
+            
+        elseif cmd == "dropmem" then
+            -- Free an in-memory snapshot
+            local id = data:match("dropmem (%S+)")
+            if id then
+                memorysavestate.removestate(id)
+                reply("ok")
+            else
+                reply("error: invalid snapshot id")
             end
             
         elseif cmd == "exit" then
@@ -76,11 +288,16 @@ while true do
         end
     end
     
-    -- Advance emulation
-    emu.frameadvance()
+    if LOCKSTEP then
+        -- Keep the UI responsive without advancing emulation
+        emu.yield()
+    else
+        -- Advance emulation
+        emu.frameadvance()
+    end
 end
 
 -- Cleanup
-if client then
-    client:close()
+if conn then
+    conn:close()
 end
\ No newline at end of file
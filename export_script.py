@@ -1,12 +1,20 @@
 import os
+import re
+import codecs
 import fnmatch
-from typing import List, Set
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Pattern, Tuple
 import json
 from pathlib import Path
 
+MANIFEST_FILE = "project_files.manifest.json"
+BOM = codecs.BOM_UTF8
+
 class ProjectExporter:
-    def __init__(self, config_file: str = 'export_config.json'):
+    def __init__(self, config_file: str = 'export_config.json', max_workers: int = 8):
         self.config_file = config_file
+        self.max_workers = max_workers
         self.default_config = {
             "exclude_patterns": [
                 "*/__pycache__/*",
@@ -18,6 +26,7 @@ class ProjectExporter:
                 ".env.template",
                 "*.exe",
                 "*.gba",
+                "*.State",
                 "logs/*",
                 "*.egg-info/*",
                 ".pytest_cache/*",
@@ -25,7 +34,8 @@ class ProjectExporter:
                 "__pycache__",
                 "*.log",
                 "export_script.py",
-                "project_files.txt"
+                "project_files.txt",
+                MANIFEST_FILE
             ],
             "exclude_dirs": [
                 "BizHawk",
@@ -36,13 +46,16 @@ class ProjectExporter:
                 ".env.template",
                 "export_script.py",
                 "project_files.txt",
+                MANIFEST_FILE,
                 "Pokemon - Fire Red Version (U) (V1.1).gba",
                 "visualboyadvance-m.exe"
             ],
             "output_file": "project_files.txt",
+            "manifest_file": MANIFEST_FILE,
             "delimiter": "# <FILE_DELIMITER> #"
         }
         self.config = self.load_config()
+        self._exclude = self.compile_excludes()
 
     def load_config(self) -> dict:
         """Load configuration from file or create default if it doesn't exist."""
@@ -59,65 +72,171 @@ class ProjectExporter:
                 json.dump(self.default_config, f, indent=4, sort_keys=True)
             return self.default_config
 
+    @property
+    def manifest_file(self) -> str:
+        return self.config.get("manifest_file", MANIFEST_FILE)
+
+    def compile_excludes(self) -> Pattern:
+        """Combine directory prefixes, exact file names and glob patterns into one regex.
+
+        Paths are matched relative to '.' with '/' separators; like fnmatch,
+        matching ignores case where the filesystem does.
+        """
+        alternatives = []
+        if self.config["exclude_dirs"]:
+            alternatives.append('(?:%s)' % '|'.join(re.escape(d) for d in self.config["exclude_dirs"]))
+        # The export's own output is never part of it
+        files = list(self.config["exclude_files"]) + [self.config["output_file"], self.manifest_file]
+        alternatives.append('(?:%s)\\Z' % '|'.join(re.escape(f) for f in files))
+        alternatives.extend(fnmatch.translate(p) for p in self.config["exclude_patterns"])
+        flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+        return re.compile('|'.join(alternatives), flags)
+
     def should_exclude(self, path: str) -> bool:
         """Check if a path should be excluded based on patterns and explicit exclusions."""
-        rel_path = os.path.relpath(path, '.')
-        
-        # Check explicit directory exclusions
-        for exclude_dir in self.config["exclude_dirs"]:
-            if rel_path.startswith(exclude_dir):
-                return True
+        rel_path = os.path.relpath(path, '.').replace(os.sep, '/')
+        return self._exclude.match(rel_path) is not None
 
-        # Check explicit file exclusions
-        if rel_path in self.config["exclude_files"]:
-            return True
+    def should_prune(self, path: str) -> bool:
+        """Check if a directory can be skipped entirely: it is excluded, or everything
+        inside it is (e.g. 'logs/*' matches 'logs/')."""
+        rel_path = os.path.relpath(path, '.').replace(os.sep, '/')
+        return self._exclude.match(rel_path) is not None or self._exclude.match(rel_path + '/') is not None
 
-        # Check pattern-based exclusions
-        for pattern in self.config["exclude_patterns"]:
-            if fnmatch.fnmatch(rel_path, pattern):
-                return True
+    def collect_files(self) -> List[str]:
+        """Relative paths of all files to export, in walk order."""
+        paths = []
+        for root, dirs, files in os.walk('.', topdown=True):
+            # Filter directories in-place so excluded trees are never descended
+            dirs[:] = [d for d in dirs if not self.should_prune(os.path.join(root, d))]
+            for file in files:
+                file_path = os.path.join(root, file)
+                if not self.should_exclude(file_path):
+                    paths.append(os.path.relpath(file_path, '.'))
+        return paths
 
-        return False
+    def read_file(self, file_path: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Read a file once and decode it with the first encoding that works.
 
-    def save_file_content(self, file_path: str, output_file) -> None:
-        """Save file content with proper encoding handling."""
-        encodings = ['utf-8-sig', 'utf-8', 'latin-1']
-        
-        for encoding in encodings:
+        Returns:
+            (raw bytes, text with universal newlines); text is None if the
+            file could not be read or decoded
+        """
+        try:
+            with open(file_path, 'rb') as source_file:
+                raw = source_file.read()
+        except Exception as e:
+            print(f"Error reading {file_path}: {str(e)}")
+            return None, None
+        for encoding in ['utf-8-sig', 'utf-8', 'latin-1']:
             try:
-                with open(file_path, 'r', encoding=encoding) as source_file:
-                    content = source_file.read()
-                    output_file.write(content)
-                    output_file.write('\n')
-                return
+                text = raw.decode(encoding)
             except UnicodeDecodeError:
                 continue
-            except Exception as e:
-                print(f"Error reading {file_path}: {str(e)}")
-                return
-        
+            return raw, text.replace('\r\n', '\n').replace('\r', '\n')
         print(f"Could not decode file: {file_path}")
+        return raw, None
+
+    def save_file_content(self, file_path: str, output_file) -> None:
+        """Save file content with proper encoding handling."""
+        _, text = self.read_file(file_path)
+        if text is not None:
+            output_file.write(text)
+            output_file.write('\n')
+
+    def load_manifest(self) -> Dict[str, dict]:
+        """File entries of the previous export, or {} if its output changed since."""
+        output = self.config["output_file"]
+        try:
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+            stat = os.stat(output)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if manifest.get("output") != {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}:
+            return {}
+        return manifest.get("files", {})
 
     def export_project(self) -> None:
-        """Export project files according to configuration."""
-        with open(self.config["output_file"], 'w', encoding='utf-8-sig') as f:
-            for root, dirs, files in os.walk('.', topdown=True):
-                # Filter directories in-place
-                dirs[:] = [d for d in dirs if not self.should_exclude(os.path.join(root, d))]
-                
-                # Process files
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if not self.should_exclude(file_path):
-                        rel_path = os.path.relpath(file_path, '.')
-                        f.write(f'{self.config["delimiter"]}\n{rel_path}\n\n')
-                        self.save_file_content(file_path, f)
-
-        print(f'Project files saved to {self.config["output_file"]}')
+        """Export project files according to configuration.
+
+        Files whose mtime and size match the manifest of the previous export
+        are copied from the previous output instead of being read again;
+        files whose mtime changed but whose content hash did not are copied
+        as well. Everything else is read on a thread pool, and the output
+        keeps walk order.
+        """
+        output = self.config["output_file"]
+        delimiter = self.config["delimiter"]
+        previous = self.load_manifest()
+        paths = self.collect_files()
+        stats = {}
+        for rel_path in paths:
+            try:
+                stats[rel_path] = os.stat(rel_path)
+            except OSError:
+                pass
+
+        def unchanged(rel_path: str) -> bool:
+            entry, stat = previous.get(rel_path), stats.get(rel_path)
+            return (entry is not None and stat is not None
+                    and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size)
+
+        files = {}
+        reused = 0
+        tmp_output = f"{output}.tmp"
+        old = open(output, 'rb') if previous else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool, open(tmp_output, 'wb') as f:
+                reads = {p: pool.submit(self.read_file, p) for p in paths if not unchanged(p)}
+                f.write(BOM)
+                for rel_path in paths:
+                    f.write(self._encode(f'{delimiter}\n{rel_path}\n\n'))
+                    entry = previous.get(rel_path)
+                    stat = stats.get(rel_path)
+                    if rel_path in reads:
+                        raw, text = reads[rel_path].result()
+                        digest = hashlib.sha256(raw).hexdigest() if raw is not None else None
+                        if entry is None or digest != entry["sha256"]:
+                            content = self._encode(text + '\n') if text is not None else b''
+                            entry = None
+                    else:
+                        digest = entry["sha256"]
+                    if entry is not None:
+                        # Same content as last time: copy it from the previous output
+                        old.seek(entry["offset"])
+                        content = old.read(entry["length"])
+                        reused += 1
+                    offset = f.tell()
+                    f.write(content)
+                    if stat is not None and digest is not None:
+                        files[rel_path] = {
+                            "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest,
+                            "offset": offset, "length": len(content)
+                        }
+        finally:
+            if old is not None:
+                old.close()
+        os.replace(tmp_output, output)
+
+        stat = os.stat(output)
+        manifest = {"output": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, "files": files}
+        with open(self.manifest_file, 'w') as f:
+            json.dump(manifest, f)
+
+        print(f'Project files saved to {output} ({len(paths)} files, {len(paths) - reused} read, {reused} unchanged)')
+
+    @staticmethod
+    def _encode(text: str) -> bytes:
+        # Same bytes as a text-mode write: platform newlines, UTF-8
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)
+        return text.encode('utf-8')
 
     def update_config(self, new_config: dict) -> None:
         """Update configuration with new values."""
         self.config.update(new_config)
+        self._exclude = self.compile_excludes()
         with open(self.config_file, 'w') as f:
             json.dump(self.default_config, f, indent=4, sort_keys=True)
 
@@ -126,4 +245,4 @@ def main():
     exporter.export_project()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,227 @@
+"""Preallocated rollout storage with vectorized GAE for on-policy agents."""
+from typing import Dict, Iterator, Optional, Union
+import logging
+
+import numpy as np
+from gymnasium import spaces
+
+logger = logging.getLogger(__name__)
+
+Observation = Union[np.ndarray, Dict[str, np.ndarray]]
+
+
+class RolloutBuffer:
+    """Fixed-size (T, N, ...) storage for num_steps steps of num_envs envs.
+
+    Every array is allocated once. add() writes one vector-env step in
+    place; compute_returns_and_advantages() runs GAE over the whole buffer
+    as a log-depth scan over the time axis (about log2(T) vectorized passes
+    instead of a T-iteration Python loop); minibatches() gathers shuffled
+    samples from flat (T * N, ...) views into reused minibatch buffers with
+    np.take(out=...), so an epoch allocates nothing per minibatch.
+
+    dones[t] marks that observations[t] is the first observation of a new
+    episode (the env was reset after step t - 1), the layout produced by the
+    autoresetting vector envs in src/env/vector_env.py.
+    """
+
+    def __init__(
+        self,
+        num_steps: int,
+        num_envs: int,
+        observation_space: spaces.Space,
+        action_space: spaces.Space,
+        gamma: float = 0.99,
+        gae_lambda: float = 0.95
+    ):
+        """
+        Args:
+            num_steps: Steps T stored per env between updates
+            num_envs: Number of environments N
+            observation_space: Single-env observation space (Box or Dict of Boxes)
+            action_space: Single-env action space
+            gamma: Discount factor
+            gae_lambda: GAE lambda
+        """
+        self.num_steps = num_steps
+        self.num_envs = num_envs
+        self.gamma = gamma
+        self.gae_lambda = gae_lambda
+        shape = (num_steps, num_envs)
+
+        self.observations = _allocate(observation_space, shape)
+        action_dtype = np.int64 if isinstance(action_space, spaces.Discrete) else action_space.dtype
+        self.actions = np.zeros(shape + action_space.shape, dtype=action_dtype)
+        self.rewards = np.zeros(shape, dtype=np.float32)
+        self.dones = np.zeros(shape, dtype=np.float32)
+        self.values = np.zeros(shape, dtype=np.float32)
+        self.log_probs = np.zeros(shape, dtype=np.float32)
+        self.advantages = np.zeros(shape, dtype=np.float32)
+        self.returns = np.zeros(shape, dtype=np.float32)
+        # Scan scratch space, in float64 so long products of gamma * lambda stay accurate
+        self._scan_coef = np.zeros(shape, dtype=np.float64)
+        self._scan_value = np.zeros(shape, dtype=np.float64)
+        self._scan_tmp = np.zeros(shape, dtype=np.float64)
+        self.step = 0
+
+    @property
+    def full(self) -> bool:
+        return self.step == self.num_steps
+
+    def reset(self) -> None:
+        """Start filling from the first step again (nothing is cleared)."""
+        self.step = 0
+
+    def add(
+        self,
+        observations: Observation,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        dones: np.ndarray,
+        values: np.ndarray,
+        log_probs: np.ndarray
+    ) -> None:
+        """
+        Store one step of every env.
+
+        Args:
+            observations: Batched observations (N, ...) the actions were taken in
+            actions: Actions taken, (N, ...)
+            rewards: Rewards received for the actions, (N,)
+            dones: Whether observations start a new episode, (N,)
+            values: Value estimates of observations, (N,)
+            log_probs: Log-probabilities of actions under the acting policy, (N,)
+        """
+        if self.full:
+            raise IndexError(f"Rollout buffer is full ({self.num_steps} steps); call reset()")
+        t = self.step
+        if isinstance(self.observations, dict):
+            for key, array in self.observations.items():
+                array[t] = observations[key]
+        else:
+            self.observations[t] = observations
+        self.actions[t] = actions
+        self.rewards[t] = rewards
+        self.dones[t] = dones
+        self.values[t] = values
+        self.log_probs[t] = log_probs
+        self.step = t + 1
+
+    def compute_returns_and_advantages(self, last_values: np.ndarray, last_dones: np.ndarray) -> None:
+        """
+        Fill advantages (GAE) and returns (advantages + values) for the stored steps.
+
+        GAE is the backward linear recurrence
+            A[t] = delta[t] + c[t] * A[t + 1],  c[t] = gamma * lambda * (1 - dones[t + 1])
+        Composing x -> delta + c * x is associative, so instead of iterating
+        over t, each pass combines every step with the one `shift` steps
+        later and doubles shift (a Hillis-Steele scan): ceil(log2(T)) passes
+        of whole-array operations.
+
+        Args:
+            last_values: Value estimates of the observations after the last stored step, (N,)
+            last_dones: Whether those observations start a new episode, (N,)
+        """
+        steps = self.step
+        if not steps:
+            raise ValueError("Rollout buffer is empty")
+        coef = self._scan_coef[:steps]
+        value = self._scan_value[:steps]
+        tmp = self._scan_tmp[:steps]
+
+        # Non-terminal masks of the following observation, into coef
+        coef[:-1] = self.dones[1:steps]
+        coef[-1] = last_dones
+        np.subtract(1.0, coef, out=coef)
+        # delta[t] = r[t] + gamma * V[t + 1] * nonterminal - V[t], into value
+        value[:-1] = self.values[1:steps]
+        value[-1] = last_values
+        value *= coef
+        value *= self.gamma
+        value += self.rewards[:steps]
+        value -= self.values[:steps]
+        coef *= self.gamma * self.gae_lambda
+
+        shift = 1
+        while shift < steps:
+            head = steps - shift
+            np.multiply(coef[:head], value[shift:], out=tmp[:head])
+            value[:head] += tmp[:head]
+            np.multiply(coef[:head], coef[shift:], out=tmp[:head])
+            coef[:head] = tmp[:head]
+            shift *= 2
+
+        self.advantages[:steps] = value
+        np.add(self.advantages[:steps], self.values[:steps], out=self.returns[:steps])
+
+    def minibatches(
+        self,
+        minibatch_size: int,
+        rng: Optional[np.random.Generator] = None,
+        normalize_advantages: bool = False
+    ) -> Iterator[Dict[str, Observation]]:
+        """
+        One epoch of shuffled minibatches over the stored steps.
+
+        The same arrays are refilled for every minibatch; copy them to keep
+        them past the next iteration. A trailing partial minibatch is dropped.
+
+        Args:
+            minibatch_size: Samples per minibatch
+            rng: Random generator for the permutation; defaults to a fresh unseeded one
+            normalize_advantages: Standardise advantages over the whole buffer first
+
+        Yields:
+            Dict with 'observations', 'actions', 'log_probs', 'values',
+            'advantages' and 'returns', each with leading size minibatch_size
+        """
+        samples = self.step * self.num_envs
+        if minibatch_size > samples:
+            raise ValueError(f"Minibatch of {minibatch_size} is larger than the {samples} stored samples")
+        rng = rng if rng is not None else np.random.default_rng()
+        flat = self._flat()
+        if normalize_advantages:
+            advantages = flat['advantages']
+            flat['advantages'] = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+        out = _map_arrays(lambda a: np.empty((minibatch_size,) + a.shape[1:], dtype=a.dtype), flat)
+        permutation = rng.permutation(samples)
+        for start in range(0, samples - minibatch_size + 1, minibatch_size):
+            indices = permutation[start:start + minibatch_size]
+            _take(flat, indices, out)
+            yield out
+
+    def _flat(self) -> Dict[str, Observation]:
+        """(T * N, ...) views of the filled part of every array."""
+        steps = self.step
+
+        def flatten(array: np.ndarray) -> np.ndarray:
+            return array[:steps].reshape((-1,) + array.shape[2:])
+
+        return _map_arrays(flatten, {
+            'observations': self.observations,
+            'actions': self.actions,
+            'log_probs': self.log_probs,
+            'values': self.values,
+            'advantages': self.advantages,
+            'returns': self.returns,
+        })
+
+
+def _allocate(space: spaces.Space, shape: tuple) -> Observation:
+    if isinstance(space, spaces.Dict):
+        return {key: _allocate(sub, shape) for key, sub in space.spaces.items()}
+    return np.zeros(shape + space.shape, dtype=space.dtype)
+
+
+def _map_arrays(fn, tree):
+    if isinstance(tree, dict):
+        return {key: _map_arrays(fn, value) for key, value in tree.items()}
+    return fn(tree)
+
+
+def _take(source, indices: np.ndarray, out) -> None:
+    if isinstance(source, dict):
+        for key, value in source.items():
+            _take(value, indices, out[key])
+    else:
+        np.take(source, indices, axis=0, out=out)
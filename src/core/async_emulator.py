@@ -0,0 +1,288 @@
+"""Asyncio client for the BizHawk Lua controller with pipelined requests."""
+from typing import Dict, Optional, Union
+import asyncio
+import logging
+import socket
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from .emulator import BizHawkEmulator, EmulatorError, lua_env
+from .protocol import (
+    HEADER, MAGIC, KIND_FRAME, FRAME_SHAPE, FRAME_BYTES, FRAME_CHUNKS, CHUNK_BYTES,
+    MAX_REQUEST_ID, tag_command, split_reply
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _FrameAssembly:
+    """Collects the chunks of one in-flight screen request."""
+
+    __slots__ = ('frame', 'view', 'seen', 'remaining', 'future')
+
+    def __init__(self, future: asyncio.Future):
+        self.frame = np.empty(FRAME_SHAPE, dtype=np.uint8)
+        self.view = memoryview(self.frame).cast('B')
+        self.seen = bytearray(FRAME_CHUNKS)
+        self.remaining = FRAME_CHUNKS
+        self.future = future
+
+
+class _EmulatorProtocol(asyncio.DatagramProtocol):
+    """Routes incoming datagrams to the futures of the requests they answer."""
+
+    def __init__(self, client: 'AsyncBizHawkEmulator'):
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        client = self.client
+        if data.startswith(MAGIC):
+            client._on_binary(data)
+        elif data == b"ready":
+            client.peer_addr = addr
+            if not client._ready.done():
+                client._ready.set_result(addr)
+        else:
+            client._on_text(data)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.error("UDP error from Lua script: %s", exc)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.client._fail_pending(EmulatorError("Connection to Lua script lost"))
+
+
+class AsyncBizHawkEmulator:
+    """Asyncio counterpart of BizHawkEmulator.
+
+    Every command is tagged with a request id and its reply resolves the
+    matching future, so several commands can be in flight at once (bounded by
+    `max_in_flight`) and replies that arrive after a timeout are discarded
+    instead of being mistaken for the answer to a later command. One event
+    loop can drive many instances concurrently.
+
+    Use `await AsyncBizHawkEmulator.create(...)` to construct one.
+    """
+
+    def __init__(
+        self,
+        bizhawk_path: Union[str, Path],
+        rom_path: Union[str, Path],
+        lua_path: Union[str, Path],
+        save_state: Optional[Union[str, Path]] = None,
+        lockstep: bool = True,
+        port: int = 0,
+        max_in_flight: int = 8,
+        timeout: float = 1.0,
+        turbo: bool = False
+    ):
+        """
+        Args:
+            bizhawk_path: Path to BizHawk executable (EmuHawk.exe)
+            rom_path: Path to Pokemon FireRed ROM
+            lua_path: Path to Lua control script
+            save_state: Optional path to savestate file
+            lockstep: Only advance frames on step() (see BizHawkEmulator)
+            port: UDP port to listen on; 0 lets the OS pick a free one
+            max_in_flight: Maximum number of unanswered commands
+            timeout: Seconds to wait for each reply
+            turbo: Run uncapped with rendering off (see BizHawkEmulator)
+        """
+        self.bizhawk_path = Path(bizhawk_path)
+        self.rom_path = Path(rom_path)
+        self.lua_path = Path(lua_path)
+        self.save_state = Path(save_state) if save_state else None
+        self.lockstep = lockstep
+        self.turbo = turbo
+        self.host = '127.0.0.1'
+        self.port = port
+        self.timeout = timeout
+        self.process = None
+        self.peer_addr = None
+        self.transport = None
+        self.frame_count = 0
+
+        self.max_in_flight = max_in_flight
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._frames: Dict[int, _FrameAssembly] = {}
+        self._request_id = 0
+        self._ready: Optional[asyncio.Future] = None
+
+    @classmethod
+    async def create(cls, *args, **kwargs) -> 'AsyncBizHawkEmulator':
+        """Bind the socket, launch BizHawk and wait for the Lua script to connect."""
+        emulator = cls(*args, **kwargs)
+        try:
+            await emulator._start_emulator()
+        except Exception:
+            await emulator.close()
+            raise
+        return emulator
+
+    async def _start_emulator(self) -> None:
+        """Start BizHawk with the ROM and Lua script"""
+        self._validate_paths()
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _EmulatorProtocol(self), local_addr=(self.host, self.port)
+        )
+        self.port = self.transport.get_extra_info('sockname')[1]
+        # Room for every in-flight frame, so pipelined screens are not dropped
+        self.transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, self.max_in_flight * 2 * FRAME_BYTES
+        )
+
+        cmd = [
+            str(self.bizhawk_path),
+            str(self.rom_path),
+            "--lua=" + str(self.lua_path)
+        ]
+        logger.info("Starting BizHawk with command: %s", " ".join(cmd))
+        self._launch_process(cmd)
+
+        try:
+            await asyncio.wait_for(self._ready, 10.0)
+        except asyncio.TimeoutError:
+            raise EmulatorError("Timeout waiting for Lua script connection")
+        logger.info("Lua script connected successfully on port %d", self.port)
+
+        if self.save_state:
+            await self.load_state(self.save_state)
+
+    def _validate_paths(self) -> None:
+        """Validate all required paths exist"""
+        BizHawkEmulator._validate_paths(self)
+
+    def _launch_process(self, cmd: list) -> None:
+        """Spawn the emulator process"""
+        self.process = subprocess.Popen(cmd, env=self._lua_env())
+
+    def _lua_env(self) -> dict:
+        """Environment passed to BizHawk; this client always listens on UDP"""
+        return lua_env({"FIRERED_TRANSPORT": "udp", "FIRERED_PORT": str(self.port)}, self.lockstep, self.turbo)
+
+    def _next_request(self) -> int:
+        self._request_id = (self._request_id + 1) & MAX_REQUEST_ID
+        return self._request_id
+
+    async def _request(self, command: str, timeout: Optional[float] = None) -> str:
+        """Send a tagged command and wait for its text reply."""
+        if self.transport is None:
+            raise EmulatorError("Emulator is closed")
+        async with self._window:
+            req_id = self._next_request()
+            future = asyncio.get_running_loop().create_future()
+            self._pending[req_id] = future
+            try:
+                self.transport.sendto(tag_command(req_id, command), self.peer_addr)
+                return await asyncio.wait_for(future, timeout or self.timeout)
+            except asyncio.TimeoutError:
+                logger.error("Timeout while sending command: %s", command)
+                raise EmulatorError("Communication timeout with Lua script")
+            finally:
+                self._pending.pop(req_id, None)
+
+    def _on_text(self, data: bytes) -> None:
+        req_id, text = split_reply(data)
+        future = self._pending.get(req_id)
+        if future is None or future.done():
+            logger.debug("Dropping stale reply to request %s: %s", req_id, text)
+            return
+        future.set_result(text)
+
+    def _on_binary(self, data: bytes) -> None:
+        if len(data) < HEADER.size:
+            return
+        _, kind, _, seq, index, count, length, _ = HEADER.unpack_from(data)
+        assembly = self._frames.get(seq)
+        if kind != KIND_FRAME or assembly is None or assembly.future.done():
+            return
+        if count != FRAME_CHUNKS or index >= count or len(data) != HEADER.size + length:
+            assembly.future.set_exception(
+                EmulatorError(f"Malformed frame chunk {index}/{count} ({len(data)} bytes)")
+            )
+            return
+        if assembly.seen[index]:
+            return
+        offset = index * CHUNK_BYTES
+        assembly.view[offset:offset + length] = data[HEADER.size:]
+        assembly.seen[index] = 1
+        assembly.remaining -= 1
+        if not assembly.remaining:
+            assembly.future.set_result(assembly.frame)
+
+    def _fail_pending(self, exc: Exception) -> None:
+        for future in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(exc)
+        for assembly in list(self._frames.values()):
+            if not assembly.future.done():
+                assembly.future.set_exception(exc)
+
+    async def step(self, button: Optional[str], frames: int) -> int:
+        """
+        Hold a button for exactly `frames` emulated frames and wait for the ack
+
+        Args:
+            button: Button to hold, or None to advance without input
+            frames: Number of emu.frameadvance() calls to run
+
+        Returns:
+            Emulator frame counter after the step
+        """
+        if frames < 1:
+            raise ValueError(f"frames must be >= 1, got {frames}")
+        response = await self._request(
+            f"step {button or 'none'} {frames}", timeout=self.timeout + frames / 30.0
+        )
+        status, _, frame = response.partition(' ')
+        if status != "ok":
+            raise EmulatorError(f"Failed to step: {response}")
+        self.frame_count = int(frame)
+        return self.frame_count
+
+    async def get_screen(self) -> np.ndarray:
+        """Get the current screen as a new (160, 240, 3) uint8 RGB array"""
+        if self.transport is None:
+            raise EmulatorError("Emulator is closed")
+        async with self._window:
+            req_id = self._next_request()
+            assembly = _FrameAssembly(asyncio.get_running_loop().create_future())
+            self._frames[req_id] = assembly
+            try:
+                self.transport.sendto(tag_command(req_id, "screen"), self.peer_addr)
+                return await asyncio.wait_for(assembly.future, self.timeout)
+            except asyncio.TimeoutError:
+                logger.error("Timeout receiving frame %d (%d chunks missing)", req_id, assembly.remaining)
+                raise EmulatorError("Communication timeout with Lua script")
+            finally:
+                self._frames.pop(req_id, None)
+
+    async def load_state(self, state_path: Union[str, Path]) -> None:
+        """Load a savestate file"""
+        state_path = Path(state_path)
+        if not state_path.exists():
+            raise FileNotFoundError(f"Save state not found: {state_path}")
+        response = await self._request(f"loadstate {state_path}")
+        if response != "ok":
+            raise EmulatorError(f"Failed to load state: {response}")
+        logger.info("Successfully loaded save state: %s", state_path)
+
+    async def close(self) -> None:
+        """Clean up resources and close emulator"""
+        try:
+            if self.transport:
+                if self.peer_addr:
+                    self.transport.sendto(tag_command(self._next_request(), "exit"), self.peer_addr)
+                self.transport.close()
+            if self.process:
+                self.process.terminate()
+                await asyncio.get_running_loop().run_in_executor(None, self.process.wait, 5.0)
+            logger.info("Emulator closed successfully")
+        finally:
+            self.process = None
+            self.transport = None
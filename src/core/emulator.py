@@ -1,20 +1,41 @@
-from typing import Optional, Union
+from typing import Dict, Optional, Tuple, Union
 import subprocess
 import time
 import socket
-import json
 import logging
 from pathlib import Path
-from dotenv import load_dotenv
 import os
+import numpy as np
+
+from .memory_map import MemoryMap
+from .transport import Transport, make_transport
+from ..utils.metrics import Metrics, PhaseTimer, BYTE_BUCKETS
+from .protocol import (
+    HEADER, MAGIC, KIND_FRAME, KIND_MEMORY, FLAG_UNCHANGED, FRAME_SHAPE, FRAME_BYTES,
+    FRAME_CHUNKS, MAX_REQUEST_ID, tag_command, split_reply
+)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class EmulatorError(Exception):
     """Base exception for emulator-related errors"""
     pass
 
+def lua_env(endpoint: Dict[str, str], lockstep: bool, turbo: bool) -> dict:
+    """
+    Environment passed to BizHawk; controller.lua reads its settings from it
+    
+    Args:
+        endpoint: Transport variables (FIRERED_TRANSPORT, FIRERED_PORT, FIRERED_ADDRESS)
+        lockstep: Value of FIRERED_LOCKSTEP
+        turbo: Value of FIRERED_TURBO
+    """
+    env = dict(os.environ)
+    env.update(endpoint)
+    env["FIRERED_LOCKSTEP"] = "1" if lockstep else "0"
+    env["FIRERED_TURBO"] = "1" if turbo else "0"
+    return env
+
 class BizHawkEmulator:
     """Controls BizHawk emulator for Pokemon FireRed"""
     
@@ -23,7 +44,13 @@ class BizHawkEmulator:
         bizhawk_path: Union[str, Path],
         rom_path: Union[str, Path],
         lua_path: Union[str, Path],
-        save_state: Optional[Union[str, Path]] = None
+        save_state: Optional[Union[str, Path]] = None,
+        lockstep: bool = False,
+        port: int = 0,
+        start: bool = True,
+        ready_timeout: float = 10.0,
+        turbo: bool = False,
+        transport: Union[str, Transport] = 'udp'
     ):
         """
         Initialize BizHawk emulator controller
@@ -33,27 +60,98 @@ class BizHawkEmulator:
             rom_path: Path to Pokemon FireRed ROM
             lua_path: Path to Lua control script
             save_state: Optional path to savestate file
+            lockstep: If True, the emulator only advances frames when told to
+                by step(), instead of free-running between commands
+            port: Port to listen on (udp and tcp); 0 lets the OS pick a free
+                one, so any number of emulators can run side by side
+            start: Launch BizHawk and wait for the Lua script now. With False
+                the caller drives launch() / poll_ready() / finish_start(),
+                as EmulatorLauncher does to start many instances at once
+            ready_timeout: Seconds to wait for the Lua script's "ready"
+            turbo: Run BizHawk uncapped with sound and rendering off; only
+                the last frame of each step is drawn, so get_screen() still
+                returns the frame the step ended on. Meant for lockstep
+                mode, where it makes steps as fast as the CPU allows
+            transport: 'udp' (default), 'tcp' or 'unix', or a Transport
+                instance; see src/core/transport.py. The stream transports
+                send each frame as one message instead of FRAME_CHUNKS datagrams
         """
         self.bizhawk_path = Path(bizhawk_path)
         self.rom_path = Path(rom_path)
         self.lua_path = Path(lua_path)
         self.save_state = Path(save_state) if save_state else None
+        self.lockstep = lockstep
+        self.turbo = turbo
+        if turbo and not lockstep:
+            logger.warning("Turbo mode without lockstep free-runs the emulator at full speed")
         self.process = None
+        self.timeout = 1.0
+        # Times a screen whose reply timed out (e.g. a lost UDP chunk) is
+        # requested again; screen is read-only, steps are never resent
+        self.screen_retransmits = 1
+        self.ready_timeout = ready_timeout
+        self.frame_count = 0
         
-        # Set up socket configuration
-        self.port = 65432  # Fixed port
-        self.host = '127.0.0.1'
-        
-        # Create UDP socket for server
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((self.host, self.port))
-        logger.info(f"Socket bound to {self.host}:{self.port}")
+        # Listening endpoint; its address is handed to controller.lua
+        self.transport = make_transport(transport, port)
+        self.port = getattr(self.transport, 'port', None)
+        logger.info(f"Listening on {self.transport.address}")
 
+        # Reused receive buffers: frames are reassembled in place and exposed
+        # through a fixed NumPy view, so get_screen never allocates.
+        self._datagram = bytearray(self.transport.max_message)
+        self._datagram_view = memoryview(self._datagram)
+        self._frame_buffer = bytearray(FRAME_BYTES)
+        self._frame_view = memoryview(self._frame_buffer)
+        self._frame = np.frombuffer(self._frame_buffer, dtype=np.uint8).reshape(FRAME_SHAPE)
+        self._chunk_seen = bytearray(FRAME_CHUNKS)
+        # Hash of the frame currently in the buffer (0 = none); lets the Lua
+        # side skip resending a screen that has not changed
+        self._frame_hash = 0
+        self.frame_changed = True
+        self._request_id = 0
+        # Binary replies a pending request still expects, keyed (seq, kind):
+        # None until one arrives while another reply is being waited for
+        self._held: Dict[Tuple[int, int], Optional[bytes]] = {}
+        # Bytes received for the last screen (header + pixels)
+        self.frame_bytes = 0
+        self.metrics: Optional[Metrics] = None
 
         # Validate paths and initialize
         self._validate_paths()
-        self._start_emulator()
+        if start:
+            self._start_emulator()
+        
+    def set_metrics(self, metrics: Optional[Metrics]) -> None:
+        """
+        Record command latencies, timeouts and transfer sizes into `metrics`
         
+        Args:
+            metrics: Registry to record into, or None to stop recording
+        """
+        self.metrics = metrics
+        self._command_seconds = {}
+        if metrics is None:
+            return
+        self._m_commands = metrics.counter('commands_total', "Commands sent to the Lua script")
+        self._m_timeouts = metrics.counter('timeouts_total', "Commands that timed out")
+        self._m_retransmits = metrics.counter('retransmits_total', "Screens requested again after a timeout")
+        self._m_stale = metrics.counter('stale_replies_total', "Replies to abandoned requests that were dropped")
+        self._m_duplicates = metrics.counter('duplicate_chunks_total', "Frame chunks received more than once")
+        self._m_unchanged = metrics.counter('frames_unchanged_total', "Screens skipped because the hash matched")
+        self._m_bytes = metrics.counter('received_bytes_total', "Bytes received for screens and RAM reads")
+        self._m_frame_bytes = metrics.histogram('frame_bytes', BYTE_BUCKETS, "Bytes received per screen")
+    
+    def _observe_command(self, command: str, start: float) -> None:
+        """Record the round trip of a command started at perf_counter() `start`"""
+        verb = command.partition(' ')[0]
+        hist = self._command_seconds.get(verb)
+        if hist is None:
+            hist = self._command_seconds[verb] = self.metrics.histogram(
+                'command_seconds', help="Round trip per command", command=verb
+            )
+        hist.observe(time.perf_counter() - start)
+    
     def _validate_paths(self) -> None:
         """Validate all required paths exist"""
         if not self.bizhawk_path.exists():
@@ -66,50 +164,190 @@ class BizHawkEmulator:
             raise FileNotFoundError(f"Save state file not found at {self.save_state}")
     
     def _start_emulator(self) -> None:
-        """Start BizHawk with the ROM and Lua script"""
+        """Start BizHawk with the ROM and Lua script and wait until it is ready"""
         try:
-            cmd = [
-                str(self.bizhawk_path),
-                str(self.rom_path),
-                "--lua=" + str(self.lua_path)
-            ]
-            
-            logger.info("Starting BizHawk with command: %s", " ".join(cmd))
-            self.process = subprocess.Popen(cmd)
+            self.launch()
             
             # Wait for Lua script to connect
-            self.socket.settimeout(10.0)
+            deadline = time.monotonic() + self.ready_timeout
             try:
-                data, addr = self.socket.recvfrom(1024)
-                if data.decode() == "ready":
-                    logger.info("Lua script connected successfully")
-                    self.socket.settimeout(1.0)  # Reset to shorter timeout for normal operation
+                while True:
+                    self.transport.settimeout(max(deadline - time.monotonic(), 1e-3))
+                    if self.poll_ready():
+                        break
             except socket.timeout:
                 raise EmulatorError("Timeout waiting for Lua script connection")
             
-            # Load save state if provided
-            if self.save_state:
-                self.load_state(self.save_state)
+            self.finish_start()
                 
         except Exception as e:
             logger.error("Failed to start emulator: %s", str(e))
             self.close()
             raise
     
+    def launch(self) -> None:
+        """Spawn BizHawk without waiting for the Lua script to connect"""
+        cmd = [
+            str(self.bizhawk_path),
+            str(self.rom_path),
+            "--lua=" + str(self.lua_path)
+        ]
+        
+        logger.info("Starting BizHawk with command: %s", " ".join(cmd))
+        self._launch_process(cmd)
+    
+    def poll_ready(self) -> bool:
+        """
+        Handle one incoming connection or message while waiting for the Lua script
+        
+        Returns:
+            True once the script has sent its "ready" handshake
+        """
+        if not self.transport.handshake():
+            return False
+        self.transport.settimeout(self.timeout)  # Reset to shorter timeout for normal operation
+        logger.info("Lua script connected successfully")
+        return True
+    
+    def finish_start(self) -> None:
+        """Post-handshake setup: load the save state if one was given"""
+        if self.save_state:
+            self.load_state(self.save_state)
+    
+    def kill(self) -> None:
+        """Terminate the emulator process, keeping the listening endpoint for a relaunch"""
+        if self.process:
+            self.process.kill()
+            self.process.wait(timeout=5.0)
+            self.process = None
+        self.transport.disconnect()
+    
+    def _launch_process(self, cmd: list) -> None:
+        """Spawn the emulator process"""
+        self.process = subprocess.Popen(cmd, env=self._lua_env())
+    
+    def _lua_env(self) -> dict:
+        """Environment passed to BizHawk; controller.lua reads its settings from it"""
+        return lua_env(self.transport.lua_env(), self.lockstep, self.turbo)
+    
     def _send_command(self, command: str, wait_response: bool = True) -> Optional[str]:
         """Send command to Lua script and optionally wait for response"""
+        metrics = self.metrics
         try:
-            self.socket.sendto(command.encode(), ('localhost', self.port))
+            self._request_id = (self._request_id + 1) & MAX_REQUEST_ID
+            req_id = self._request_id
+            if metrics is not None:
+                start = time.perf_counter()
+                self._m_commands.inc()
+            self.transport.send(tag_command(req_id, command))
             if wait_response:
-                data, _ = self.socket.recvfrom(1024)
-                return data.decode()
+                while True:
+                    size = self.transport.recv_into(self._datagram)
+                    # Only the bytes just received count; the buffer keeps older, longer messages
+                    if self._datagram_view[:min(size, len(MAGIC))] == MAGIC:
+                        continue
+                    reply_id, text = split_reply(self._datagram_view[:size].tobytes())
+                    # Skip late replies to requests that already timed out
+                    if reply_id == req_id:
+                        if metrics is not None:
+                            self._observe_command(command, start)
+                        return text
+                    logger.debug("Dropping stale reply to request %s: %s", reply_id, text)
+                    if metrics is not None:
+                        self._m_stale.inc()
         except socket.timeout:
             logger.error("Timeout while sending command: %s", command)
+            if metrics is not None:
+                self._m_timeouts.inc()
             raise EmulatorError("Communication timeout with Lua script")
         except Exception as e:
             logger.error("Failed to send command: %s", str(e))
             raise EmulatorError("Failed to communicate with Lua script")
     
+    def step(self, button: Optional[str], frames: int) -> int:
+        """
+        Hold a button for exactly `frames` emulated frames and wait for the ack
+        
+        Args:
+            button: Button to hold (up, down, left, right, a, b, start, select),
+                or None to advance without input
+            frames: Number of emu.frameadvance() calls to run
+            
+        Returns:
+            Emulator frame counter after the step
+        """
+        self.step_observe(button, frames, screen=False)
+        return self.frame_count
+    
+    def step_observe(
+        self,
+        button: Optional[str],
+        frames: int,
+        screen: bool = True,
+        memory_map: Optional[MemoryMap] = None,
+        timer: Optional[PhaseTimer] = None
+    ) -> Tuple[Optional[np.ndarray], Optional[np.void]]:
+        """
+        step(), with the screen and/or a RAM record sent right after the ack
+        
+        Everything comes back from a single command, saving the round trips
+        of separate get_screen() and read_memory() calls.
+        
+        Args:
+            button: Button to hold, or None to advance without input
+            frames: Number of emu.frameadvance() calls to run
+            screen: Also return the screen the step ended on (see get_screen)
+            memory_map: Also read this memory map after the step
+            timer: Started PhaseTimer to lap 'emulate' (up to the ack),
+                'screen' and 'ram' (the replies that follow it) on
+            
+        Returns:
+            (screen or None, RAM record or None)
+        """
+        if frames < 1:
+            raise ValueError(f"frames must be >= 1, got {frames}")
+        command = f"step {button or 'none'} {frames}"
+        if screen:
+            command += f" screen {self._frame_hash}"
+        if memory_map is not None:
+            command += f" readmem {memory_map.spec}"
+        try:
+            # Allow the emulator to run at half speed before giving up
+            self.transport.settimeout(self.timeout + frames / 30.0)
+            response = self._send_command(command)
+        finally:
+            if self.transport:
+                self.transport.settimeout(self.timeout)
+        
+        status, _, frame_count = response.partition(' ')
+        if status != "ok":
+            raise EmulatorError(f"Failed to step: {response}")
+        self.frame_count = int(frame_count)
+        if timer is not None:
+            timer.lap('emulate')
+        
+        seq = self._request_id
+        image = ram = None
+        try:
+            if screen:
+                if memory_map is not None:
+                    # The RAM reply follows the frame; keep it if it arrives
+                    # while a lost frame chunk is being re-requested
+                    self._held[(seq, KIND_MEMORY)] = None
+                self._receive_screen(seq)
+                if self.metrics is not None:
+                    self._record_frame()
+                image = self._frame
+            if timer is not None:
+                timer.lap('screen')
+            if memory_map is not None:
+                ram = self._receive_memory(seq, memory_map)
+            if timer is not None:
+                timer.lap('ram')
+        finally:
+            self._held.clear()
+        return image, ram
+    
     def press_button(self, button: str, duration: float = 0.1) -> None:
         """
         Press a button for specified duration
@@ -119,8 +357,8 @@ class BizHawkEmulator:
             duration: How long to hold the button in seconds
         """
         try:
-            self._send_command(f"press {button} {duration}", wait_response=False)
-            time.sleep(duration + 0.05)  # Add small buffer for processing
+            # Block on the emulator's ack rather than sleeping on the wall clock
+            self.step(button, max(1, round(duration * 60)))
         except Exception as e:
             logger.error("Failed to press button %s: %s", button, str(e))
             raise
@@ -142,24 +380,190 @@ class BizHawkEmulator:
             logger.error("Failed to load save state: %s", str(e))
             raise
     
-    def get_screen(self) -> bytes:
-        """Get current screen content as bytes"""
+    def write_state(self, state_path: Union[str, Path]) -> None:
+        """Write a savestate file, loadable with load_state (the directory must exist)"""
         try:
-            response = self._send_command("screen")
-            return response.encode()  # You'll need to implement proper image handling
+            response = self._send_command(f"savestate {Path(state_path).resolve()}")
+            if response != "ok":
+                raise EmulatorError(f"Failed to save state: {response}")
+        except Exception as e:
+            logger.error("Failed to save state to %s: %s", state_path, str(e))
+            raise
+    
+    def save_memory_state(self) -> str:
+        """Snapshot the emulator core into BizHawk's memory and return the snapshot id"""
+        response = self._send_command("savemem")
+        status, _, state_id = response.partition(' ')
+        if status != "ok" or not state_id:
+            raise EmulatorError(f"Failed to save memory state: {response}")
+        return state_id
+    
+    def load_memory_state(self, state_id: str) -> None:
+        """Restore a snapshot taken with save_memory_state"""
+        response = self._send_command(f"loadmem {state_id}")
+        if response != "ok":
+            raise EmulatorError(f"Failed to load memory state {state_id}: {response}")
+    
+    def drop_memory_state(self, state_id: str) -> None:
+        """Free a snapshot taken with save_memory_state"""
+        response = self._send_command(f"dropmem {state_id}")
+        if response != "ok":
+            raise EmulatorError(f"Failed to drop memory state {state_id}: {response}")
+    
+    def get_screen(self) -> np.ndarray:
+        """
+        Get the current screen as a (160, 240, 3) uint8 RGB array
+        
+        The array is a view over a receive buffer that is reused by every call,
+        so it is overwritten by the next get_screen(). Copy it to keep it.
+        
+        The Lua side hashes the video state first and only sends pixels when
+        the hash differs from the frame already held here; `frame_changed`
+        tells whether this call received a new frame.
+        """
+        try:
+            if self.metrics is not None:
+                start = time.perf_counter()
+            self._send_command(f"screen {self._frame_hash}", wait_response=False)
+            self._receive_screen(self._request_id)
+            if self.metrics is not None:
+                self._observe_command("screen", start)
+                self._record_frame()
+            return self._frame
         except Exception as e:
             logger.error("Failed to get screen content: %s", str(e))
             raise
     
+    def _record_frame(self) -> None:
+        """Record the transfer of the screen just received"""
+        self._m_frame_bytes.observe(self.frame_bytes)
+        self._m_bytes.inc(self.frame_bytes)
+        if not self.frame_changed:
+            self._m_unchanged.inc()
+    
+    def read_memory(self, memory_map: MemoryMap) -> np.void:
+        """
+        Read every field of a memory map in a single round trip
+        
+        Args:
+            memory_map: Declarative address map, e.g. FIRERED_MEMORY_MAP
+            
+        Returns:
+            Packed structured record with one entry per field
+        """
+        if self.metrics is not None:
+            start = time.perf_counter()
+        self._send_command(f"readmem {memory_map.spec}", wait_response=False)
+        record = self._receive_memory(self._request_id, memory_map)
+        if self.metrics is not None:
+            self._observe_command("readmem", start)
+        return record
+    
+    def _receive_memory(self, seq: int, memory_map: MemoryMap) -> np.void:
+        """Receive and decode the RAM read tagged with seq"""
+        try:
+            _, _, _, _, size = self._receive_binary(seq, KIND_MEMORY)
+        except socket.timeout:
+            logger.error("Timeout reading memory for request %d", seq)
+            if self.metrics is not None:
+                self._m_timeouts.inc()
+            raise EmulatorError("Communication timeout with Lua script")
+        if self.metrics is not None:
+            self._m_bytes.inc(size)
+        return memory_map.decode(self._datagram_view[HEADER.size:size])
+    
+    def _receive_binary(self, seq: int, kind: int) -> tuple:
+        """
+        Receive the next binary message of `kind` tagged with seq into the message buffer
+        
+        Returns:
+            (flags, chunk index, chunk count, frame hash, message size)
+        """
+        while True:
+            held = self._held.pop((seq, kind), None)
+            if held is not None:
+                size = len(held)
+                self._datagram[:size] = held
+            else:
+                size = self.transport.recv_into(self._datagram)
+                if size < HEADER.size:
+                    continue
+            magic, msg_kind, flags, msg_seq, index, count, length, digest = HEADER.unpack_from(self._datagram)
+            if magic != MAGIC:
+                continue
+            if msg_kind != kind or msg_seq != seq:
+                if self._held.get((msg_seq, msg_kind), b"") is None:
+                    self._held[(msg_seq, msg_kind)] = bytes(self._datagram_view[:size])
+                # Otherwise a stray reply or one for a request we already gave up on
+                continue
+            if index >= count or size != HEADER.size + length:
+                raise EmulatorError(f"Malformed message chunk {index}/{count} ({size} bytes)")
+            return flags, index, count, digest, size
+    
+    def _receive_frame(self, seq: int) -> None:
+        """Reassemble the frame tagged with seq (FRAME_CHUNKS chunks, or one whole message) into the frame buffer"""
+        seen = self._chunk_seen
+        seen[:] = bytes(FRAME_CHUNKS)
+        remaining = None
+        self.frame_bytes = 0
+        try:
+            while remaining != 0:
+                flags, index, count, digest, size = self._receive_binary(seq, KIND_FRAME)
+                self.frame_bytes += size
+                if flags & FLAG_UNCHANGED:
+                    # Buffer already holds this frame
+                    self.frame_changed = False
+                    return
+                if remaining is None:
+                    if count not in (1, FRAME_CHUNKS):
+                        raise EmulatorError(f"Frame has {count} chunks, expected 1 or {FRAME_CHUNKS}")
+                    # The buffer is about to be partially overwritten
+                    self._frame_hash = 0
+                    remaining = expected = count
+                    chunk_bytes = FRAME_BYTES // count
+                elif count != expected:
+                    raise EmulatorError(f"Frame chunk count changed from {expected} to {count}")
+                if seen[index]:
+                    if self.metrics is not None:
+                        self._m_duplicates.inc()
+                    continue
+                offset = index * chunk_bytes
+                self._frame_view[offset:offset + size - HEADER.size] = self._datagram_view[HEADER.size:size]
+                seen[index] = 1
+                remaining -= 1
+            self._frame_hash = digest
+            self.frame_changed = True
+        except socket.timeout:
+            logger.warning("Timeout receiving frame %d (%s chunks missing)", seq, "all" if remaining is None else remaining)
+            raise
+    
+    def _receive_screen(self, seq: int) -> None:
+        """_receive_frame(seq), requesting the screen again after a timeout up to `screen_retransmits` times"""
+        for attempt in range(self.screen_retransmits + 1):
+            try:
+                self._receive_frame(seq)
+                return
+            except socket.timeout:
+                if self.metrics is not None:
+                    self._m_timeouts.inc()
+                if attempt == self.screen_retransmits:
+                    raise EmulatorError("Communication timeout with Lua script")
+            if self.metrics is not None:
+                self._m_retransmits.inc()
+            # Late chunks of the abandoned request carry the old seq and are dropped
+            self._send_command(f"screen {self._frame_hash}", wait_response=False)
+            seq = self._request_id
+    
     def close(self) -> None:
         """Clean up resources and close emulator"""
         try:
-            if self.socket:
+            if self.transport:
                 try:
-                    self._send_command("exit", wait_response=False)
+                    if self.transport.connected:
+                        self._send_command("exit", wait_response=False)
                 except:
                     pass
-                self.socket.close()
+                self.transport.close()
             
             if self.process:
                 self.process.terminate()
@@ -172,4 +576,4 @@ class BizHawkEmulator:
             raise
         finally:
             self.process = None
-            self.socket = None
\ No newline at end of file
+            self.transport = None
\ No newline at end of file
@@ -0,0 +1,399 @@
+"""Headless stand-in for BizHawk + controller.lua, for benchmarks and offline runs.
+
+FakeLuaPeer is a thread that speaks the same protocol as controller.lua over
+any of its transports (tagged commands, frames with hash-based skipping,
+bulk RAM reads, savestates), backed by a tiny simulated game: the d-pad moves the player
+around a map, the screen is a synthetic tile picture chosen by the player's
+position, and position, map and party data sit at the addresses
+FIRERED_MEMORY_MAP reads. FakeBizHawkEmulator and FakeAsyncBizHawkEmulator
+are the real clients with the process launch replaced by that thread, so
+everything above the socket runs unchanged.
+"""
+from typing import Dict, Optional, Tuple
+import logging
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .emulator import BizHawkEmulator
+from .async_emulator import AsyncBizHawkEmulator
+from .memory_map import SAVE_BLOCK1_PTR, SAVE_BLOCK2_PTR, PLAYER_PARTY
+from .protocol import (
+    FRAME_SHAPE, FRAME_BYTES, FRAME_CHUNKS, KIND_FRAME, KIND_MEMORY, FLAG_UNCHANGED,
+    pack_header, split_reply
+)
+from .transport import LENGTH
+
+logger = logging.getLogger(__name__)
+
+# Simulated memory: EWRAM and IWRAM; everything else on the bus reads as zero
+EWRAM = 0x02000000
+IWRAM = 0x03000000
+REGIONS = ((EWRAM, 0x40000), (IWRAM, 0x8000))
+
+# Where the fake save blocks live (the pointers to them sit in IWRAM)
+SAVE_BLOCK1 = 0x0202552C
+SAVE_BLOCK2 = 0x02024588
+PARTY_COUNT = 0x02024029
+
+# Header of the savestate files written by FakeLuaPeer
+STATE_MAGIC = b'FAKESTATE1'
+
+MOVES = {'up': (0, -1), 'down': (0, 1), 'left': (-1, 0), 'right': (1, 0)}
+BUTTONS = {'none', 'a', 'b', 'start', 'select'} | set(MOVES)
+
+
+def make_frame(seed: int = 0) -> np.ndarray:
+    """Build a synthetic overworld-like frame out of repeated 16x16 tiles."""
+    rng = np.random.default_rng(seed)
+    tiles = rng.integers(0, 256, size=(8, 16, 16, 3), dtype=np.uint8)
+    layout = rng.integers(0, len(tiles), size=(10, 15))
+    return tiles[layout].transpose(0, 2, 1, 3, 4).reshape(FRAME_SHAPE)
+
+
+class FakeLuaPeer(threading.Thread):
+    """Pure-Python controller.lua answering on a client's port.
+
+    Commands are dispatched to `_cmd_<name>` methods, so subclasses can add
+    commands of their own. Every reply can be delayed by a fixed `latency`
+    to model a slower link, and `fps` caps emulation speed like a real
+    emulator would (None runs frames instantly).
+    """
+
+    def __init__(
+        self,
+        port: int,
+        fps: Optional[float] = None,
+        latency: float = 0.0,
+        num_screens: int = 16,
+        map_size: Tuple[int, int] = (32, 32),
+        startup_delay: float = 0.0,
+        host: str = '127.0.0.1',
+        transport: str = 'udp',
+        address: Optional[str] = None
+    ):
+        """
+        Args:
+            port: Client port to connect to (FIRERED_PORT)
+            fps: Emulated frames per second, or None for unlimited
+            latency: Seconds added before every reply
+            num_screens: Distinct synthetic frames; the one shown depends on
+                the player's position
+            map_size: (width, height) the player is clamped to
+            startup_delay: Seconds before sending "ready", to model BizHawk boot time
+            host: Client address
+            transport: 'udp', 'tcp' or 'unix' (FIRERED_TRANSPORT)
+            address: Socket path for the unix transport (FIRERED_ADDRESS)
+        """
+        super().__init__(name=f'fake-lua-{address or port}', daemon=True)
+        self.fps = fps
+        self.latency = latency
+        self.map_size = map_size
+        self.startup_delay = startup_delay
+        self.screens = [make_frame(seed).tobytes() for seed in range(num_screens)]
+        self.frame_count = 0
+        self.commands = 0
+
+        self._memory = {base: bytearray(size) for base, size in REGIONS}
+        self._states: Dict[str, tuple] = {}
+        self._next_state = 0
+        self._reset_game()
+
+        self.transport = transport
+        if transport == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect((host, port))
+        elif transport == 'tcp':
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        elif transport == 'unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        else:
+            raise ValueError(f"Unknown transport {transport!r}")
+        self.stream = transport != 'udp'
+        # Streams carry a frame as one message, datagrams as FRAME_CHUNKS
+        self.frame_messages = 1 if self.stream else FRAME_CHUNKS
+        self._reader = self.sock.makefile('rb') if self.stream else None
+
+    # -- simulated game -------------------------------------------------
+
+    def _region(self, address: int) -> Tuple[Optional[bytearray], int]:
+        for base, size in REGIONS:
+            if base <= address < base + size:
+                return self._memory[base], address - base
+        return None, 0
+
+    def read(self, address: int, length: int) -> bytes:
+        """Read bytes from the simulated system bus."""
+        region, offset = self._region(address)
+        if region is None:
+            return bytes(length)
+        data = bytes(region[offset:offset + length])
+        return data + bytes(length - len(data))
+
+    def write(self, address: int, data: bytes) -> None:
+        """Write bytes to the simulated system bus (outside RAM is ignored)."""
+        region, offset = self._region(address)
+        if region is not None:
+            region[offset:offset + len(data)] = data
+
+    def _reset_game(self) -> None:
+        for region in self._memory.values():
+            region[:] = bytes(len(region))
+        self.write(SAVE_BLOCK1_PTR, struct.pack('<I', SAVE_BLOCK1))
+        self.write(SAVE_BLOCK2_PTR, struct.pack('<I', SAVE_BLOCK2))
+        # Start in the middle of map 3.0 with 3000 money and one level 5 mon
+        self.write(SAVE_BLOCK1, struct.pack('<hhBB', self.map_size[0] // 2, self.map_size[1] // 2, 3, 0))
+        self.write(SAVE_BLOCK1 + 0x0290, struct.pack('<I', 3000))
+        self.write(PARTY_COUNT, b'\x01')
+        self.write(PLAYER_PARTY + 84, struct.pack('<BxHH', 5, 20, 20))
+        self.frame_count = 0
+
+    def position(self) -> Tuple[int, int]:
+        return struct.unpack('<hh', self.read(SAVE_BLOCK1, 4))
+
+    def _move(self, button: str) -> None:
+        dx, dy = MOVES.get(button, (0, 0))
+        if not (dx or dy):
+            return
+        x, y = self.position()
+        x = min(max(x + dx, 0), self.map_size[0] - 1)
+        y = min(max(y + dy, 0), self.map_size[1] - 1)
+        self.write(SAVE_BLOCK1, struct.pack('<hh', x, y))
+
+    def screen_index(self) -> int:
+        x, y = self.position()
+        return (x * 31 + y) % len(self.screens)
+
+    # -- protocol -------------------------------------------------------
+
+    def _send(self, data: bytes) -> None:
+        if self.stream:
+            self.sock.sendall(LENGTH.pack(len(data)) + data)
+        else:
+            self.sock.send(data)
+
+    def _recv(self) -> Optional[bytes]:
+        """Next command, or None once the client has closed the connection."""
+        if not self.stream:
+            return self.sock.recv(1024)
+        prefix = self._reader.read(LENGTH.size)
+        if len(prefix) < LENGTH.size:
+            return None
+        return self._reader.read(LENGTH.unpack(prefix)[0])
+
+    def run(self) -> None:
+        if self.startup_delay:
+            time.sleep(self.startup_delay)
+        self._send(b"ready")
+        try:
+            while True:
+                message = self._recv()
+                if message is None:
+                    break
+                req_id, data = split_reply(message)
+                cmd, _, args = data.partition(' ')
+                if cmd == 'exit':
+                    break
+                self.commands += 1
+                if self.latency:
+                    time.sleep(self.latency)
+                handler = getattr(self, f'_cmd_{cmd}', None)
+                if handler is None:
+                    self._reply(req_id, f"error: unknown command {cmd}")
+                else:
+                    handler(req_id or 0, args)
+        except OSError as e:
+            logger.debug("Fake Lua peer stopped: %s", e)
+        finally:
+            if self._reader is not None:
+                self._reader.close()
+            self.sock.close()
+
+    def _reply(self, req_id: Optional[int], text: str) -> None:
+        self._send(f"#{req_id or 0} {text}".encode())
+
+    def _cmd_step(self, req_id: int, args: str) -> None:
+        button, _, rest = args.partition(' ')
+        frames, _, rest = rest.partition(' ')
+        if not frames.isdigit() or button not in BUTTONS:
+            self._reply(req_id, "error: invalid step")
+            return
+        frames = int(frames)
+        if self.fps:
+            time.sleep(frames / self.fps)
+        self.frame_count += frames
+        self._move(button)
+        self._reply(req_id, f"ok {self.frame_count}")
+        # Optional "screen <hash>" and "readmem <spec>" riders, answered after the ack
+        rest, _, spec = rest.partition('readmem ')
+        if rest.startswith('screen'):
+            self._cmd_screen(req_id, rest[len('screen '):].strip())
+        if spec:
+            self._cmd_readmem(req_id, spec)
+
+    def _cmd_screen(self, req_id: int, args: str) -> None:
+        index = self.screen_index()
+        digest = index + 1
+        known = int(args) if args.isdigit() else None
+        if known == digest:
+            self._send(pack_header(KIND_FRAME, req_id, 0, 1, 0, FLAG_UNCHANGED, digest))
+            return
+        raw = self.screens[index]
+        count = self.frame_messages
+        size = FRAME_BYTES // count
+        for chunk in range(count):
+            payload = raw[chunk * size:(chunk + 1) * size]
+            self._send(pack_header(KIND_FRAME, req_id, chunk, count, len(payload), 0, digest) + payload)
+
+    def _cmd_readmem(self, req_id: int, args: str) -> None:
+        parts = []
+        for token in args.split():
+            target, _, length = token.partition(':')
+            if target.startswith('*'):
+                ptr, _, offset = target[1:].partition('+')
+                address = struct.unpack('<I', self.read(int(ptr, 16), 4))[0] + int(offset, 16)
+            else:
+                address = int(target, 16)
+            parts.append(self.read(address, int(length)))
+        payload = b''.join(parts)
+        self._send(pack_header(KIND_MEMORY, req_id, 0, 1, len(payload)) + payload)
+
+    def _cmd_loadstate(self, req_id: int, args: str) -> None:
+        if not args:
+            self._reply(req_id, "error: invalid path")
+            return
+        try:
+            with open(args, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        if data.startswith(STATE_MAGIC):
+            self._restore(data[len(STATE_MAGIC):])
+        else:
+            # Not written by _cmd_savestate (e.g. a real BizHawk state): start a new game
+            self._reset_game()
+        self._reply(req_id, "ok")
+
+    def _cmd_savestate(self, req_id: int, args: str) -> None:
+        if not args:
+            self._reply(req_id, "error: invalid path")
+            return
+        with open(args, 'wb') as f:
+            f.write(STATE_MAGIC + struct.pack('<Q', self.frame_count))
+            for base, _ in REGIONS:
+                f.write(self._memory[base])
+        self._reply(req_id, "ok")
+
+    def _restore(self, data: bytes) -> None:
+        (self.frame_count,) = struct.unpack_from('<Q', data)
+        offset = 8
+        for base, size in REGIONS:
+            self._memory[base][:] = data[offset:offset + size]
+            offset += size
+
+    def _cmd_savemem(self, req_id: int, args: str) -> None:
+        self._next_state += 1
+        state_id = f"fake-{self._next_state}"
+        self._states[state_id] = (self.frame_count, {base: bytes(m) for base, m in self._memory.items()})
+        self._reply(req_id, f"ok {state_id}")
+
+    def _cmd_loadmem(self, req_id: int, args: str) -> None:
+        state = self._states.get(args)
+        if state is None:
+            self._reply(req_id, "error: invalid snapshot id")
+            return
+        self.frame_count, memory = state
+        for base, data in memory.items():
+            self._memory[base][:] = data
+        self._reply(req_id, "ok")
+
+    def _cmd_dropmem(self, req_id: int, args: str) -> None:
+        if self._states.pop(args, None) is None:
+            self._reply(req_id, "error: invalid snapshot id")
+        else:
+            self._reply(req_id, "ok")
+
+
+# The clients keep their path arguments for signature compatibility; nothing is launched from them
+_PLACEHOLDER_PATHS = ('EmuHawk.exe', 'firered.gba', 'controller.lua')
+
+
+class _FakePeerLauncher:
+    """Replaces the BizHawk process of an emulator client with a FakeLuaPeer thread."""
+
+    peer_class = FakeLuaPeer
+
+    def _validate_paths(self) -> None:
+        pass
+
+    def _launch_process(self, cmd: list) -> None:
+        # Connect where controller.lua would, from the same environment variables
+        env = self._lua_env()
+        self.peer = self.peer_class(
+            int(env.get("FIRERED_PORT", 0)), transport=env["FIRERED_TRANSPORT"],
+            address=env.get("FIRERED_ADDRESS"), **self._peer_kwargs
+        )
+        self.peer.start()
+
+
+class FakeBizHawkEmulator(_FakePeerLauncher, BizHawkEmulator):
+    """BizHawkEmulator talking to a FakeLuaPeer; the paths are ignored.
+
+    Drop-in for PokemonFireRedEnv(emulator_factory=...), which is why it
+    accepts (and ignores) the path arguments. Peer options are
+    passed through, e.g. functools.partial(FakeBizHawkEmulator, latency=1e-3).
+    """
+
+    def __init__(
+        self,
+        bizhawk_path=None,
+        rom_path=None,
+        lua_path=None,
+        save_state=None,
+        lockstep: bool = True,
+        port: int = 0,
+        start: bool = True,
+        ready_timeout: float = 10.0,
+        turbo: bool = False,
+        transport='udp',
+        **peer_kwargs
+    ):
+        self._peer_kwargs = peer_kwargs
+        self.peer = None
+        super().__init__(
+            *_PLACEHOLDER_PATHS, None, lockstep=lockstep, port=port, start=start,
+            ready_timeout=ready_timeout, turbo=turbo, transport=transport
+        )
+
+    def close(self) -> None:
+        super().close()
+        if self.peer is not None:
+            self.peer.join(timeout=1.0)
+
+
+class FakeAsyncBizHawkEmulator(_FakePeerLauncher, AsyncBizHawkEmulator):
+    """AsyncBizHawkEmulator talking to a FakeLuaPeer; build with `await create()`."""
+
+    def __init__(
+        self,
+        bizhawk_path=None,
+        rom_path=None,
+        lua_path=None,
+        save_state=None,
+        lockstep: bool = True,
+        port: int = 0,
+        max_in_flight: int = 8,
+        timeout: float = 1.0,
+        turbo: bool = False,
+        **peer_kwargs
+    ):
+        self._peer_kwargs = peer_kwargs
+        super().__init__(
+            *_PLACEHOLDER_PATHS, None, lockstep=lockstep, port=port,
+            max_in_flight=max_in_flight, timeout=timeout, turbo=turbo
+        )
@@ -1,12 +1,16 @@
-"""Utilities for processing emulator screen captures."""
+"""Utilities for processing emulator screen captures.
+
+OpenCV and PIL are imported on first use: together they dominate import
+time, and the default full-resolution RGB pipeline needs neither.
+"""
 import numpy as np
-import cv2
-from PIL import Image
 import io
 import base64
 import logging
 from typing import Tuple, Optional
 
+from .protocol import FRAME_SHAPE
+
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
@@ -17,6 +21,8 @@ class ImageProcessor:
     @staticmethod
     def decode_screenshot(screen_data: bytes) -> np.ndarray:
         """Convert raw screenshot data to numpy array."""
+        import cv2
+        from PIL import Image
         try:
             # BizHawk provides PNG data
             image = Image.open(io.BytesIO(screen_data))
@@ -30,12 +36,14 @@ class ImageProcessor:
     def normalize_size(image: np.ndarray) -> np.ndarray:
         """Ensure image is at GBA resolution."""
         if image.shape[:2] != ImageProcessor.GBA_RESOLUTION[::-1]:
+            import cv2
             return cv2.resize(image, ImageProcessor.GBA_RESOLUTION)
         return image
     
     @staticmethod
     def to_base64(image: np.ndarray) -> str:
         """Convert image to base64 string."""
+        import cv2
         try:
             success, buffer = cv2.imencode('.png', image)
             if not success:
@@ -48,6 +56,7 @@ class ImageProcessor:
     @staticmethod
     def save_screenshot(image: np.ndarray, path: str) -> None:
         """Save screenshot to file."""
+        import cv2
         try:
             cv2.imwrite(path, image)
         except Exception as e:
@@ -61,4 +70,107 @@ class ImageProcessor:
             return tuple(image[y, x])  # OpenCV uses (y,x) indexing
         except IndexError:
             logger.error(f"Pixel coordinates ({x},{y}) out of bounds")
-            raise
\ No newline at end of file
+            raise
+
+
+class PreprocessConfig:
+    """Observation preprocessing settings for FramePipeline."""
+    
+    def __init__(
+        self,
+        grayscale: bool = False,
+        downscale: int = 1,
+        crop: Optional[Tuple[int, int, int, int]] = None,
+        frame_stack: int = 1
+    ):
+        """
+        Args:
+            grayscale: Convert RGB to luma (ITU-R BT.601 weights)
+            downscale: Integer box-filter factor, e.g. 2 turns 160x240 into 80x120
+            crop: (top, bottom, left, right) pixels removed before downscaling
+            frame_stack: Number of most recent frames stacked along a new leading axis
+        """
+        if downscale < 1 or frame_stack < 1:
+            raise ValueError("downscale and frame_stack must be >= 1")
+        self.grayscale = grayscale
+        self.downscale = downscale
+        self.crop = crop or (0, 0, 0, 0)
+        self.frame_stack = frame_stack
+
+
+class FramePipeline:
+    """Crop, downscale, grayscale and frame-stack screens without per-step allocation.
+    
+    Every stage writes into buffers allocated once in __init__ (cv2 `dst=`
+    arguments and NumPy `out=`). Stacked frames live in a ring buffer of twice
+    the stack depth where each frame is written to two slots, so the k most
+    recent frames are always one contiguous, chronologically ordered view. The
+    returned observation is that view and is overwritten by later calls; copy
+    it to keep it.
+    """
+    
+    def __init__(self, config: PreprocessConfig, input_shape: Tuple[int, int, int] = FRAME_SHAPE):
+        self.config = config
+        top, bottom, left, right = config.crop
+        height = input_shape[0] - top - bottom
+        width = input_shape[1] - left - right
+        f = config.downscale
+        if height <= 0 or width <= 0 or height % f or width % f:
+            raise ValueError(
+                f"Cropped size {height}x{width} must be positive and divisible by downscale {f}"
+            )
+        self._rows = slice(top, input_shape[0] - bottom)
+        self._cols = slice(left, input_shape[1] - right)
+        self._size = (width // f, height // f)  # cv2 order
+        
+        rgb_shape = (height // f, width // f, input_shape[2])
+        self.frame_shape = rgb_shape[:2] if config.grayscale else rgb_shape
+        k = config.frame_stack
+        self.observation_shape = (k,) + self.frame_shape if k > 1 else self.frame_shape
+        
+        # Downscaled RGB scratch, only needed when grayscale follows a resize
+        self._scaled = np.empty(rgb_shape, dtype=np.uint8) if f > 1 and config.grayscale else None
+        self._ring = np.zeros((2 * k,) + self.frame_shape, dtype=np.uint8)
+        self._head = 0
+        self._cv2 = None
+        if f > 1 or config.grayscale:
+            import cv2
+            self._cv2 = cv2
+    
+    def reset(self, frame: np.ndarray) -> np.ndarray:
+        """Start a new episode: fill the whole stack with this frame."""
+        self._process(frame, self._ring[0])
+        self._ring[1:] = self._ring[0]
+        self._head = 0
+        return self._observation()
+    
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        """Push a new frame and return the stacked observation."""
+        k = self.config.frame_stack
+        self._head = (self._head + 1) % k
+        slot = self._ring[self._head]
+        self._process(frame, slot)
+        if k > 1:
+            np.copyto(self._ring[self._head + k], slot)
+        return self._observation()
+    
+    def _observation(self) -> np.ndarray:
+        k = self.config.frame_stack
+        if k == 1:
+            return self._ring[0]
+        # Slots head+1 .. head+k hold the k latest frames, oldest first
+        return self._ring[self._head + 1:self._head + 1 + k]
+    
+    def _process(self, frame: np.ndarray, out: np.ndarray) -> None:
+        """Run crop -> downscale -> grayscale from frame into out."""
+        pixels = frame[self._rows, self._cols]
+        if self.config.downscale > 1:
+            # INTER_AREA with an integer factor is an exact box filter
+            dst = self._scaled if self.config.grayscale else out
+            cv2 = self._cv2
+            pixels = cv2.resize(pixels, self._size, dst=dst, interpolation=cv2.INTER_AREA)
+        if self.config.grayscale:
+            cv2 = self._cv2
+            cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY, dst=out)
+        elif pixels is not out:
+            np.copyto(out, pixels)
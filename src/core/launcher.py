@@ -0,0 +1,252 @@
+"""Concurrent startup of many emulators and a warm pool of ready instances."""
+from typing import Callable, Dict, List, Optional, Union
+from pathlib import Path
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from .emulator import BizHawkEmulator, EmulatorError
+
+logger = logging.getLogger(__name__)
+
+
+class EmulatorLauncher:
+    """Starts N emulators at once instead of one after another.
+
+    Every instance binds its socket and spawns BizHawk immediately; the
+    readiness handshakes are then awaited together with one selector, so
+    bringing up N instances takes about as long as the slowest one rather
+    than the sum of all of them. Instances that miss their deadline are
+    killed and relaunched on the same endpoint up to `retries` times.
+    """
+
+    def __init__(
+        self,
+        bizhawk_path: Union[str, Path],
+        rom_path: Union[str, Path],
+        lua_path: Union[str, Path],
+        save_state: Optional[Union[str, Path]] = None,
+        lockstep: bool = True,
+        ready_timeout: float = 10.0,
+        retries: int = 2,
+        emulator_factory: Callable[..., BizHawkEmulator] = BizHawkEmulator,
+        turbo: bool = False,
+        transport: str = 'udp'
+    ):
+        """
+        Args:
+            bizhawk_path: Path to BizHawk executable
+            rom_path: Path to Pokemon FireRed ROM
+            lua_path: Path to Lua control script
+            save_state: Optional savestate loaded into every instance
+            lockstep: Only advance frames on step() (see BizHawkEmulator)
+            ready_timeout: Seconds each launch attempt may take to send "ready"
+            retries: Relaunches per instance after a timed-out attempt
+            emulator_factory: Emulator class (or partial); must accept start=False
+            turbo: Run the instances uncapped with rendering off
+            transport: 'udp', 'tcp' or 'unix'; each instance gets its own endpoint
+        """
+        self.bizhawk_path = bizhawk_path
+        self.rom_path = rom_path
+        self.lua_path = lua_path
+        self.save_state = save_state
+        self.lockstep = lockstep
+        self.ready_timeout = ready_timeout
+        self.retries = retries
+        self.emulator_factory = emulator_factory
+        self.turbo = turbo
+        self.transport = transport
+
+    def launch(self, count: int) -> List[BizHawkEmulator]:
+        """
+        Start `count` emulators concurrently and wait until all are ready.
+
+        Returns:
+            The ready emulators, save state loaded
+
+        Raises:
+            EmulatorError: If an instance failed all its attempts; the ones
+                that did start are closed first
+        """
+        emulators = [
+            self.emulator_factory(
+                self.bizhawk_path, self.rom_path, self.lua_path, self.save_state,
+                lockstep=self.lockstep, start=False, ready_timeout=self.ready_timeout, turbo=self.turbo,
+                transport=self.transport
+            )
+            for _ in range(count)
+        ]
+        start = time.monotonic()
+        try:
+            self._await_ready(emulators)
+            for emulator in emulators:
+                emulator.finish_start()
+        except Exception:
+            for emulator in emulators:
+                try:
+                    emulator.close()
+                except Exception as e:
+                    logger.error(f"Failed to close emulator at {_address(emulator)}: {e}")
+            raise
+        logger.info(f"Started {count} emulators in {time.monotonic() - start:.2f}s")
+        return emulators
+
+    def _await_ready(self, emulators: List[BizHawkEmulator]) -> None:
+        """Launch every emulator and multiplex their handshakes until all are ready."""
+        selector = selectors.DefaultSelector()
+        deadlines: Dict[BizHawkEmulator, float] = {}
+        attempts: Dict[BizHawkEmulator, int] = {}
+
+        # Stream transports switch from the listening socket to the accepted
+        # connection mid-handshake, so descriptors are re-registered each time
+        def watch(emulator: BizHawkEmulator) -> None:
+            selector.register(emulator.transport.fileno(), selectors.EVENT_READ, emulator)
+
+        try:
+            for emulator in emulators:
+                emulator.transport.settimeout(emulator.timeout)
+                emulator.launch()
+                deadlines[emulator] = time.monotonic() + emulator.ready_timeout
+                attempts[emulator] = 1
+                watch(emulator)
+
+            while deadlines:
+                timeout = max(min(deadlines.values()) - time.monotonic(), 0.0)
+                for key, _ in selector.select(timeout):
+                    emulator = key.data
+                    selector.unregister(key.fd)
+                    try:
+                        ready = emulator.poll_ready()
+                    except socket.timeout:
+                        ready = False
+                    if ready:
+                        del deadlines[emulator]
+                    else:
+                        watch(emulator)
+
+                now = time.monotonic()
+                for emulator, deadline in list(deadlines.items()):
+                    if now < deadline:
+                        continue
+                    if attempts[emulator] > self.retries:
+                        raise EmulatorError(
+                            f"Emulator at {_address(emulator)} not ready after {attempts[emulator]} attempts"
+                        )
+                    logger.warning(
+                        f"Emulator at {_address(emulator)} not ready after {emulator.ready_timeout}s, relaunching"
+                    )
+                    selector.unregister(emulator.transport.fileno())
+                    emulator.kill()
+                    emulator.launch()
+                    watch(emulator)
+                    attempts[emulator] += 1
+                    deadlines[emulator] = time.monotonic() + emulator.ready_timeout
+        finally:
+            selector.close()
+
+
+class WarmPool:
+    """Keeps `size` started emulators ready so creating an env is instant.
+
+    A background thread launches instances through an EmulatorLauncher
+    (several at once) and tops the pool up whenever one is taken. Pass
+    `pool.emulator_factory` as PokemonFireRedEnv's emulator_factory; the
+    env's own path, lockstep, turbo and transport arguments are then ignored
+    in favour of the launcher's. Instances live in this process, so the pool
+    serves in-process (synchronous) envs.
+    """
+
+    def __init__(self, launcher: EmulatorLauncher, size: int, refill: bool = True, retry_delay: float = 1.0):
+        """
+        Args:
+            launcher: Launcher the instances are started with
+            size: Number of ready instances to keep
+            refill: Replace instances as they are acquired
+            retry_delay: Seconds to wait after a failed launch before retrying
+        """
+        self.launcher = launcher
+        self.size = size
+        self.refill = refill
+        self.retry_delay = retry_delay
+        self._ready: 'queue.Queue[BizHawkEmulator]' = queue.Queue()
+        self._missing = size
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._fill_loop, name='emulator-warm-pool', daemon=True)
+        self._thread.start()
+
+    def _fill_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._missing:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                count, self._missing = self._missing, 0
+            try:
+                emulators = self.launcher.launch(count)
+            except Exception as e:
+                logger.error(f"Warm pool failed to start {count} emulators: {e}")
+                with self._cond:
+                    self._missing += count
+                    self._cond.wait(self.retry_delay)
+                continue
+            for emulator in emulators:
+                self._ready.put(emulator)
+            with self._cond:
+                if self._closed:
+                    break
+        self._drain()
+
+    def acquire(self, timeout: Optional[float] = None) -> BizHawkEmulator:
+        """
+        Take a ready emulator, waiting up to `timeout` seconds if none is.
+
+        Raises:
+            EmulatorError: If the pool is closed or no instance became ready in time
+        """
+        if self._closed:
+            raise EmulatorError("Warm pool is closed")
+        try:
+            emulator = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise EmulatorError(f"No warm emulator ready within {timeout}s") from None
+        if self.refill:
+            with self._cond:
+                self._missing += 1
+                self._cond.notify()
+        return emulator
+
+    def emulator_factory(self, *args, **kwargs) -> BizHawkEmulator:
+        """emulator_factory for PokemonFireRedEnv; ignores its arguments."""
+        return self.acquire(timeout=self.launcher.ready_timeout * (self.launcher.retries + 1))
+
+    def __len__(self) -> int:
+        """Instances ready right now."""
+        return self._ready.qsize()
+
+    def close(self) -> None:
+        """Stop refilling and close every instance still in the pool."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                emulator = self._ready.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                emulator.close()
+            except Exception as e:
+                logger.error(f"Failed to close pooled emulator: {e}")
+
+
+def _address(emulator: BizHawkEmulator) -> str:
+    return emulator.transport.address if emulator.transport else '<closed>'
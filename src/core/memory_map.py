@@ -0,0 +1,110 @@
+"""Declarative RAM address maps read in bulk from the emulator."""
+from typing import List, Optional, Sequence
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryField:
+    """One named value (or fixed-length array of values) in GBA memory."""
+
+    def __init__(
+        self,
+        name: str,
+        address: int,
+        dtype: str,
+        count: int = 1,
+        stride: Optional[int] = None,
+        pointer: Optional[int] = None
+    ):
+        """
+        Args:
+            name: Field name in the returned record
+            address: System bus address, or offset from the pointer target
+            dtype: NumPy scalar dtype of one element, e.g. '<u2'
+            count: Number of elements; >1 yields an array-valued field
+            stride: Bytes between consecutive elements (defaults to packed)
+            pointer: Address of a u32 pointer that `address` is relative to,
+                for data in FireRed's relocating save blocks
+        """
+        self.name = name
+        self.address = address
+        self.dtype = np.dtype(dtype)
+        self.count = count
+        self.stride = stride or self.dtype.itemsize
+        self.pointer = pointer
+
+    @property
+    def nbytes(self) -> int:
+        return self.dtype.itemsize * self.count
+
+    def tokens(self) -> List[str]:
+        """Read ranges for controller.lua: '<addr>:<len>' or '*<ptr>+<offset>:<len>'."""
+        size = self.dtype.itemsize
+        if self.stride == size:
+            ranges = [(self.address, self.nbytes)]
+        else:
+            ranges = [(self.address + i * self.stride, size) for i in range(self.count)]
+        prefix = f"*{self.pointer:x}+" if self.pointer is not None else ""
+        return [f"{prefix}{address:x}:{length}" for address, length in ranges]
+
+
+class MemoryMap:
+    """A set of fields fetched in one round trip and decoded as a packed record."""
+
+    def __init__(self, fields: Sequence[MemoryField]):
+        self.fields = list(fields)
+        self.dtype = np.dtype([
+            (f.name, f.dtype) if f.count == 1 else (f.name, f.dtype, (f.count,))
+            for f in self.fields
+        ])
+        self.nbytes = self.dtype.itemsize
+        self.spec = " ".join(token for f in self.fields for token in f.tokens())
+
+    def decode(self, data) -> np.void:
+        """Turn the bytes returned by controller.lua into a structured record."""
+        if len(data) != self.nbytes:
+            raise ValueError(f"Expected {self.nbytes} bytes of RAM, got {len(data)}")
+        return np.frombuffer(data, dtype=self.dtype, count=1)[0].copy()
+
+
+# Pokemon FireRed (US) addresses, following the pokefirered decompilation.
+# Player position, map and money live in save blocks that move around in EWRAM,
+# so they are read relative to gSaveBlock1Ptr / gSaveBlock2Ptr.
+SAVE_BLOCK1_PTR = 0x03005008
+SAVE_BLOCK2_PTR = 0x0300500C
+PLAYER_PARTY = 0x02024284
+PARTY_MON_SIZE = 100
+PARTY_SIZE = 6
+
+FIRERED_MEMORY_MAP = MemoryMap([
+    MemoryField('x', 0x0000, '<i2', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('y', 0x0002, '<i2', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('map_bank', 0x0004, 'u1', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('map_number', 0x0005, 'u1', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('money', 0x0290, '<u4', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('badges', 0x0FE4, 'u1', pointer=SAVE_BLOCK1_PTR),
+    MemoryField('security_key', 0x0F20, '<u4', pointer=SAVE_BLOCK2_PTR),
+    MemoryField('party_count', 0x02024029, 'u1'),
+    MemoryField('party_level', PLAYER_PARTY + 84, 'u1', count=PARTY_SIZE, stride=PARTY_MON_SIZE),
+    MemoryField('party_hp', PLAYER_PARTY + 86, '<u2', count=PARTY_SIZE, stride=PARTY_MON_SIZE),
+    MemoryField('party_max_hp', PLAYER_PARTY + 88, '<u2', count=PARTY_SIZE, stride=PARTY_MON_SIZE),
+    MemoryField('battle_flags', 0x02022B4C, '<u4'),
+])
+
+
+def money(record: np.void) -> int:
+    """Decrypt the money field (stored XORed with the save's security key)."""
+    return int(record['money']) ^ int(record['security_key'])
+
+
+def badge_count(record: np.void) -> int:
+    """Number of gym badges earned."""
+    return bin(int(record['badges'])).count('1')
+
+
+def in_battle(record: np.void) -> bool:
+    """Whether a battle is in progress."""
+    return int(record['battle_flags']) != 0
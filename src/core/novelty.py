@@ -0,0 +1,205 @@
+"""Array-backed visit counts over (map bank, map number, x, y) cells for exploration rewards."""
+from typing import Dict, Optional, Tuple, Union
+from pathlib import Path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (bank, number) packs into 16 bits
+MAP_KEYS = 1 << 16
+
+
+class VisitCounter:
+    """Visit counts and per-episode visited bits for a vector of environments.
+
+    Every map gets a dense slot the first time it is entered. Global visit
+    counts live in one (maps, height, width) uint32 array shared by all
+    environments; per-episode visits are bit-packed, (envs, maps, height,
+    width / 8) uint8, so a cell costs one bit per env. Updates are a handful
+    of vectorized index operations regardless of how many cells exist, and
+    nothing grows per visited cell.
+
+    The reward for a step is
+        episode_bonus * [cell not yet visited this episode]
+        + count_bonus / sqrt(global visits of the cell)
+    """
+
+    def __init__(
+        self,
+        num_envs: int = 1,
+        map_height: int = 128,
+        map_width: int = 128,
+        episode_bonus: float = 1.0,
+        count_bonus: float = 0.0,
+        initial_maps: int = 16
+    ):
+        """
+        Args:
+            num_envs: Number of environments sharing this counter
+            map_height: Largest y coordinate + 1 tracked per map
+            map_width: Largest x coordinate + 1 tracked per map (multiple of 8)
+            episode_bonus: Reward for the first visit to a cell in an episode
+            count_bonus: Scale of the global 1/sqrt(count) bonus
+            initial_maps: Map slots allocated up front (doubles as needed)
+        """
+        if map_width % 8:
+            raise ValueError(f"map_width must be a multiple of 8, got {map_width}")
+        self.num_envs = num_envs
+        self.map_height = map_height
+        self.map_width = map_width
+        self.episode_bonus = episode_bonus
+        self.count_bonus = count_bonus
+
+        self._slots = np.full(MAP_KEYS, -1, dtype=np.int32)
+        self._keys = np.zeros(initial_maps, dtype=np.int32)
+        self.num_maps = 0
+        self._counts = np.zeros((initial_maps, map_height, map_width), dtype=np.uint32)
+        self._bits = np.zeros((num_envs, initial_maps, map_height, map_width // 8), dtype=np.uint8)
+        self._env_ids = np.arange(num_envs)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._keys)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == len(self._keys):
+            return
+        extra = capacity - len(self._keys)
+        self._keys = np.concatenate([self._keys, np.zeros(extra, dtype=np.int32)])
+        self._counts = np.concatenate(
+            [self._counts, np.zeros((extra,) + self._counts.shape[1:], dtype=np.uint32)]
+        )
+        self._bits = np.concatenate(
+            [self._bits, np.zeros(self._bits.shape[:1] + (extra,) + self._bits.shape[2:], dtype=np.uint8)],
+            axis=1
+        )
+
+    def _slot_for(self, keys: np.ndarray) -> np.ndarray:
+        slots = self._slots[keys]
+        missing = slots < 0
+        if missing.any():
+            new_keys = np.unique(keys[missing])
+            start = self.num_maps
+            self._grow(start + len(new_keys))
+            self._slots[new_keys] = np.arange(start, start + len(new_keys), dtype=np.int32)
+            self._keys[start:start + len(new_keys)] = new_keys
+            self.num_maps += len(new_keys)
+            slots = self._slots[keys]
+        return slots
+
+    def update(self, bank, number, x, y, env_ids=None) -> np.ndarray:
+        """
+        Record one visit per environment and return the exploration rewards.
+
+        Args:
+            bank, number, x, y: Position of each environment (scalars or arrays)
+            env_ids: Environments the positions belong to (defaults to all)
+
+        Returns:
+            float32 rewards, one per position
+        """
+        env_ids = self._env_ids if env_ids is None else np.atleast_1d(env_ids)
+        bank = np.atleast_1d(bank).astype(np.int64)
+        number = np.atleast_1d(number).astype(np.int64)
+        x = np.atleast_1d(x).astype(np.int64)
+        y = np.atleast_1d(y).astype(np.int64)
+        rewards = np.zeros(len(env_ids), dtype=np.float32)
+
+        valid = (x >= 0) & (x < self.map_width) & (y >= 0) & (y < self.map_height)
+        if not valid.all():
+            env_ids, bank, number, x, y = env_ids[valid], bank[valid], number[valid], x[valid], y[valid]
+        if not len(env_ids):
+            return rewards
+        slots = self._slot_for(((bank & 0xFF) << 8) | (number & 0xFF))
+
+        # Global counts (np.add.at handles several envs on the same cell)
+        np.add.at(self._counts, (slots, y, x), 1)
+        counts = self._counts[slots, y, x]
+
+        # Per-episode bits
+        byte = x >> 3
+        mask = (1 << (x & 7)).astype(np.uint8)
+        cells = self._bits[env_ids, slots, y, byte]
+        first = (cells & mask) == 0
+        self._bits[env_ids, slots, y, byte] = cells | mask
+
+        bonus = self.episode_bonus * first
+        if self.count_bonus:
+            bonus = bonus + self.count_bonus / np.sqrt(counts)
+        rewards[valid] = bonus
+        return rewards
+
+    def visits(self, bank: int, number: int, x: int, y: int) -> int:
+        """Global visit count of one cell."""
+        slot = self._slots[((bank & 0xFF) << 8) | (number & 0xFF)]
+        if slot < 0 or not (0 <= x < self.map_width and 0 <= y < self.map_height):
+            return 0
+        return int(self._counts[slot, y, x])
+
+    def cells_visited(self, env_id: Optional[int] = None) -> int:
+        """Distinct cells visited: ever (env_id=None) or in env_id's current episode."""
+        if env_id is None:
+            return int(np.count_nonzero(self._counts[:self.num_maps]))
+        return int(np.unpackbits(self._bits[env_id, :self.num_maps]).sum())
+
+    def reset_episode(self, env_ids=None) -> None:
+        """Clear the per-episode bits of some (default: all) environments."""
+        env_ids = self._env_ids if env_ids is None else np.atleast_1d(env_ids)
+        self._bits[env_ids, :self.num_maps] = 0
+
+    def episode_state(self, env_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Copy of one environment's episode bits, to store next to a savestate.
+
+        Returns:
+            (map keys, bits): the (bank << 8 | number) key of each map row of
+            bits, so restore_episode() works on a counter whose slots differ
+        """
+        n = self.num_maps
+        return self._keys[:n].copy(), self._bits[env_id, :n].copy()
+
+    def restore_episode(self, env_id: int, keys: np.ndarray, bits: np.ndarray) -> None:
+        """Restore bits saved with episode_state(), mapping them onto this counter's slots."""
+        if bits.shape[1:] != self._bits.shape[2:] or len(keys) != len(bits):
+            raise ValueError("Episode state does not match this counter's map size")
+        slots = self._slot_for(np.asarray(keys, dtype=np.int64))
+        self._bits[env_id] = 0
+        self._bits[env_id, slots] = bits
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Copies of all arrays, trimmed to the maps in use."""
+        n = self.num_maps
+        return {
+            'keys': self._keys[:n].copy(),
+            'counts': self._counts[:n].copy(),
+            'bits': self._bits[:, :n].copy(),
+        }
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays from state_dict()."""
+        keys = state['keys']
+        if state['counts'].shape[1:] != self._counts.shape[1:] or state['bits'].shape[0] != self.num_envs:
+            raise ValueError("State does not match this counter's map size or number of envs")
+        self._slots[:] = -1
+        self.num_maps = 0
+        self._grow(len(keys))
+        self._counts[:] = 0
+        self._bits[:] = 0
+        n = len(keys)
+        self._keys[:n] = keys
+        self._slots[keys] = np.arange(n, dtype=np.int32)
+        self._counts[:n] = state['counts']
+        self._bits[:, :n] = state['bits']
+        self.num_maps = n
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write state_dict() to an .npz file."""
+        np.savez(path, **self.state_dict())
+        logger.info(f"Saved visit counts for {self.num_maps} maps to {path}")
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Load a file written by save()."""
+        with np.load(path) as data:
+            self.load_state_dict({k: data[k] for k in data.files})
+        logger.info(f"Loaded visit counts for {self.num_maps} maps from {path}")
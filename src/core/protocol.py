@@ -0,0 +1,58 @@
+"""Binary wire format shared by the Python emulator clients and controller.lua."""
+import struct
+from typing import Optional, Tuple
+
+# Native GBA framebuffer, delivered row-major as packed RGB bytes
+SCREEN_WIDTH = 240
+SCREEN_HEIGHT = 160
+SCREEN_CHANNELS = 3
+FRAME_SHAPE = (SCREEN_HEIGHT, SCREEN_WIDTH, SCREEN_CHANNELS)
+FRAME_BYTES = SCREEN_HEIGHT * SCREEN_WIDTH * SCREEN_CHANNELS
+
+# Every binary message from the Lua side starts with this header:
+#   magic (2s) | kind (B) | flags (B) | seq (I) | chunk index (H) | chunk count (H)
+#   | payload length (I) | frame hash (Q)
+# All fields are little-endian; controller.lua packs it with "<c2BBI4I2I2I4I8".
+HEADER = struct.Struct("<2sBBIHHIQ")
+MAGIC = b"FR"
+
+# Message kinds
+KIND_FRAME = 1
+KIND_MEMORY = 2
+
+# Header flags
+FLAG_UNCHANGED = 0x01  # frame hash matched the one the client already holds; no pixels follow
+
+# Frames are split into row-aligned chunks so each datagram stays well under
+# the UDP payload limit on every platform BizHawk runs on.
+CHUNK_ROWS = 20
+CHUNK_BYTES = CHUNK_ROWS * SCREEN_WIDTH * SCREEN_CHANNELS
+FRAME_CHUNKS = FRAME_BYTES // CHUNK_BYTES
+MAX_DATAGRAM = HEADER.size + CHUNK_BYTES
+
+# Text commands are tagged "#<id> <command>"; controller.lua echoes the tag on
+# its text replies and uses the id as the seq of any binary reply, so late
+# answers to abandoned requests can be told apart from current ones.
+MAX_REQUEST_ID = 0xFFFFFFFF
+
+
+def tag_command(req_id: int, command: str) -> bytes:
+    """Encode a command with its request id."""
+    return f"#{req_id} {command}".encode()
+
+
+def split_reply(data: bytes) -> Tuple[Optional[int], str]:
+    """Split a tagged text reply into (request id, text); untagged replies get None."""
+    text = data.decode(errors='replace')
+    if text.startswith('#'):
+        tag, _, body = text.partition(' ')
+        if tag[1:].isdigit():
+            return int(tag[1:]), body
+    return None, text
+
+
+def pack_header(
+    kind: int, seq: int, index: int, count: int, length: int, flags: int = 0, frame_hash: int = 0
+) -> bytes:
+    """Build a message header (used by test peers; the Lua script packs its own)."""
+    return HEADER.pack(MAGIC, kind, flags, seq & 0xFFFFFFFF, index, count, length, frame_hash)
@@ -0,0 +1,86 @@
+"""LRU pool of in-memory emulator savestates for fast resets."""
+from typing import Hashable, Iterator, Optional
+from collections import OrderedDict
+import logging
+
+from .emulator import BizHawkEmulator
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotPool:
+    """Named in-memory savestates with least-recently-used eviction.
+
+    Snapshots live in BizHawk's memorysavestate store, so saving and restoring
+    never touches disk. When the pool is full, the snapshot used least
+    recently is freed on the emulator side to make room.
+    """
+
+    def __init__(self, emulator: BizHawkEmulator, max_size: int = 16):
+        """
+        Args:
+            emulator: Emulator whose core state is snapshotted
+            max_size: Maximum number of snapshots kept alive
+        """
+        if max_size < 1:
+            raise ValueError(f"max_size must be >= 1, got {max_size}")
+        self.emulator = emulator
+        self.max_size = max_size
+        self._states: 'OrderedDict[Hashable, str]' = OrderedDict()
+
+    def snapshot(self, key: Optional[Hashable] = None) -> Hashable:
+        """
+        Save the current emulator state.
+
+        Args:
+            key: Name for the snapshot; replaces any snapshot with the same
+                name. Defaults to the emulator's snapshot id.
+
+        Returns:
+            The key to pass to restore()
+        """
+        state_id = self.emulator.save_memory_state()
+        key = state_id if key is None else key
+        if key in self._states:
+            self._drop(self._states.pop(key))
+        self._states[key] = state_id
+        while len(self._states) > self.max_size:
+            evicted, evicted_id = self._states.popitem(last=False)
+            logger.debug(f"Evicting snapshot {evicted!r}")
+            self._drop(evicted_id)
+        return key
+
+    def restore(self, key: Hashable) -> None:
+        """Restore a snapshot; raises KeyError if it was never taken or was evicted."""
+        try:
+            state_id = self._states[key]
+        except KeyError:
+            raise KeyError(f"Unknown snapshot: {key!r}") from None
+        self.emulator.load_memory_state(state_id)
+        self._states.move_to_end(key)
+
+    def discard(self, key: Hashable) -> None:
+        """Free one snapshot if present."""
+        state_id = self._states.pop(key, None)
+        if state_id is not None:
+            self._drop(state_id)
+
+    def clear(self) -> None:
+        """Free every snapshot."""
+        while self._states:
+            self._drop(self._states.popitem()[1])
+
+    def _drop(self, state_id: str) -> None:
+        try:
+            self.emulator.drop_memory_state(state_id)
+        except Exception as e:
+            logger.error(f"Failed to free snapshot {state_id}: {e}")
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._states
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._states)
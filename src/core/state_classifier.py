@@ -0,0 +1,216 @@
+"""Detects the current GameState from a handful of screen region signatures."""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import logging
+
+import numpy as np
+
+from .protocol import FRAME_SHAPE, SCREEN_WIDTH
+from .state_manager import GameState
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[slice, slice]
+
+# Approximate FireRed UI regions (rows, cols), sampled every `step` pixels.
+# Listed in priority order: the first matching signature wins.
+DEFAULT_REGIONS: Dict[GameState, Region] = {
+    # Player HP box, bottom right of the battle scene
+    GameState.BATTLE: (slice(74, 106), slice(136, 232)),
+    # Start menu window on the right edge
+    GameState.MENU: (slice(8, 96), slice(176, 232)),
+    # Message box interior along the bottom of the screen
+    GameState.DIALOG: (slice(120, 148), slice(16, 224)),
+}
+
+# Flat colours the regions above are compared against until calibrated
+DEFAULT_COLORS: Dict[GameState, Tuple[int, int, int]] = {
+    GameState.BATTLE: (248, 248, 216),
+    GameState.MENU: (248, 248, 248),
+    GameState.DIALOG: (248, 248, 248),
+}
+
+
+class RegionSignature:
+    """Reference pixels for one screen region that identify a game state."""
+
+    def __init__(self, state: GameState, region: Region, reference: np.ndarray, tolerance: float):
+        """
+        Args:
+            state: State this signature detects
+            region: (rows, cols) slices of the downsampled region
+            reference: Expected RGB samples, shape (n, 3)
+            tolerance: Maximum mean absolute difference still counted as a match
+        """
+        self.state = state
+        self.region = region
+        self.reference = np.asarray(reference, dtype=np.int16).reshape(-1, 3)
+        self.tolerance = float(tolerance)
+
+
+class GameStateClassifier:
+    """Classifies frames by comparing downsampled regions against signatures.
+
+    All signature samples are gathered from the frame with one fancy-index
+    read and scored together with np.add.reduceat, so a classification costs a
+    few microseconds. Results are cached by the hash of the sampled pixels,
+    which repeat constantly on static screens.
+    """
+
+    def __init__(
+        self,
+        signatures: Sequence[RegionSignature],
+        step: int = 4,
+        default_state: GameState = GameState.OVERWORLD,
+        cache_size: int = 1024
+    ):
+        """
+        Args:
+            signatures: Signatures in priority order
+            step: Pixel stride used to downsample each region
+            default_state: State reported when no signature matches
+            cache_size: Number of recent classifications to remember
+        """
+        self.signatures = list(signatures)
+        self.step = step
+        self.default_state = default_state
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[int, GameState]' = OrderedDict()
+
+        # Flat byte indices of every sampled channel, plus per-signature boundaries
+        indices = [self._region_indices(sig.region) for sig in self.signatures]
+        for sig, idx in zip(self.signatures, indices):
+            if len(sig.reference) != len(idx):
+                raise ValueError(
+                    f"{sig.state.name} reference has {len(sig.reference)} samples, region has {len(idx)}"
+                )
+        pixels = np.concatenate(indices) if indices else np.zeros(0, dtype=np.intp)
+        self._byte_indices = (pixels[:, None] * 3 + np.arange(3)).ravel()
+        sizes = np.array([len(idx) * 3 for idx in indices], dtype=np.int64)
+        self._offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.intp)
+        self._sizes = sizes.astype(np.float32)
+        self._reference = (
+            np.concatenate([sig.reference.ravel() for sig in self.signatures])
+            if self.signatures else np.zeros(0, dtype=np.int16)
+        )
+        self._tolerances = np.array([sig.tolerance for sig in self.signatures], dtype=np.float32)
+        self._states = [sig.state for sig in self.signatures]
+
+        # Scratch buffers reused by every call
+        self._samples = np.empty(len(self._byte_indices), dtype=np.uint8)
+        self._diff = np.empty(len(self._byte_indices), dtype=np.int16)
+
+    def _region_indices(self, region: Region) -> np.ndarray:
+        rows = np.arange(FRAME_SHAPE[0])[region[0]][::self.step]
+        cols = np.arange(FRAME_SHAPE[1])[region[1]][::self.step]
+        return (rows[:, None] * SCREEN_WIDTH + cols[None, :]).ravel()
+
+    def samples(self, frame: np.ndarray) -> np.ndarray:
+        """Gather every signature's sampled bytes from a (160, 240, 3) frame."""
+        return np.take(frame.reshape(-1), self._byte_indices, out=self._samples)
+
+    def scores(self, frame: np.ndarray) -> np.ndarray:
+        """Mean absolute difference of each signature against the frame."""
+        return self._score(self.samples(frame))
+
+    def _score(self, samples: np.ndarray) -> np.ndarray:
+        if not self._states:
+            return np.zeros(0, dtype=np.float32)
+        np.subtract(samples, self._reference, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        return np.add.reduceat(self._diff, self._offsets, dtype=np.int32) / self._sizes
+
+    def classify(self, frame: np.ndarray) -> GameState:
+        """Return the highest-priority state whose signature matches the frame."""
+        if not self._states:
+            return self.default_state
+        samples = self.samples(frame)
+        key = hash(samples.tobytes())
+        state = self._cache.get(key)
+        if state is not None:
+            self._cache.move_to_end(key)
+            return state
+
+        matches = np.flatnonzero(self._score(samples) <= self._tolerances)
+        state = self._states[matches[0]] if len(matches) else self.default_state
+
+        self._cache[key] = state
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return state
+
+    @classmethod
+    def default(cls, tolerance: float = 24.0, **kwargs) -> 'GameStateClassifier':
+        """Classifier using approximate flat-colour signatures of FireRed's UI boxes."""
+        classifier = cls([], **kwargs)
+        signatures = []
+        for state, region in DEFAULT_REGIONS.items():
+            n = len(classifier._region_indices(region))
+            reference = np.tile(np.array(DEFAULT_COLORS[state], dtype=np.int16), (n, 1))
+            signatures.append(RegionSignature(state, region, reference, tolerance))
+        return cls(signatures, **kwargs)
+
+    @classmethod
+    def calibrate(
+        cls,
+        labeled_frames: Dict[GameState, Iterable[np.ndarray]],
+        regions: Optional[Dict[GameState, Region]] = None,
+        margin: float = 1.5,
+        **kwargs
+    ) -> 'GameStateClassifier':
+        """
+        Build signatures from example frames of each state.
+
+        The reference is the per-pixel median of the examples; the tolerance is
+        `margin` times the worst example's distance from it (at least 4).
+
+        Args:
+            labeled_frames: Example (160, 240, 3) frames for each state
+            regions: Regions to use per state (defaults to DEFAULT_REGIONS),
+                in priority order
+            margin: Tolerance multiplier over the examples' spread
+        """
+        regions = regions or DEFAULT_REGIONS
+        probe = cls([], **kwargs)
+        signatures = []
+        for state, region in regions.items():
+            frames = list(labeled_frames.get(state, ()))
+            if not frames:
+                continue
+            idx = probe._region_indices(region)
+            stack = np.stack([f.reshape(-1, 3)[idx] for f in frames]).astype(np.int16)
+            reference = np.median(stack, axis=0).astype(np.int16)
+            spread = np.abs(stack - reference).mean(axis=(1, 2)).max()
+            signatures.append(RegionSignature(state, region, reference, max(4.0, spread * margin)))
+        return cls(signatures, **kwargs)
+
+    def save(self, path: Path) -> None:
+        """Save signatures to an .npz file."""
+        arrays = {}
+        for i, sig in enumerate(self.signatures):
+            rows, cols = sig.region
+            arrays[f'sig{i}_meta'] = np.array(
+                [sig.state.value, rows.start, rows.stop, cols.start, cols.stop], dtype=np.int64
+            )
+            arrays[f'sig{i}_reference'] = sig.reference
+            arrays[f'sig{i}_tolerance'] = np.array(sig.tolerance)
+        np.savez(path, step=np.array(self.step), default_state=np.array(self.default_state.value), **arrays)
+        logger.info(f"Saved {len(self.signatures)} state signatures to {path}")
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> 'GameStateClassifier':
+        """Load signatures saved with save()."""
+        with np.load(path) as data:
+            signatures: List[RegionSignature] = []
+            i = 0
+            while f'sig{i}_meta' in data:
+                value, r0, r1, c0, c1 = (int(v) for v in data[f'sig{i}_meta'])
+                signatures.append(RegionSignature(
+                    GameState(value), (slice(r0, r1), slice(c0, c1)),
+                    data[f'sig{i}_reference'], float(data[f'sig{i}_tolerance'])
+                ))
+                i += 1
+            kwargs.setdefault('step', int(data['step']))
+            kwargs.setdefault('default_state', GameState(int(data['default_state'])))
+        return cls(signatures, **kwargs)
@@ -1,10 +1,11 @@
 """Manages game state tracking and transitions."""
 from enum import Enum, auto
-from typing import Optional, Dict, Any
+from typing import Dict, Any, Tuple, Union
 import logging
-import json
 from pathlib import Path
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 class GameState(Enum):
@@ -18,67 +19,165 @@ class GameState(Enum):
     MENU = auto()
     INVENTORY = auto()
 
+# States are stored as dense codes 0..N_STATES-1 (GameState.value - 1)
+N_STATES = len(GameState)
+
 class StateManager:
-    """Tracks and manages game state."""
-    
-    def __init__(self):
-        """Initialize state manager."""
+    """Tracks the game state and cheap statistics about its transitions.
+
+    update_state() is meant to be called once per env step. While the state
+    is unchanged it only bumps a counter; array work happens on transitions,
+    and nothing is logged:
+
+    - `transitions[i, j]` counts changes from state code i to code j
+    - `time_in_state[i]` counts updates spent in state code i (time in the
+      current state is added on exit, the property includes it)
+    - a ring buffer keeps the last `history_size` state entries as
+      (update number, state code) pairs, see history()
+
+    Codes are GameState.value - 1. save_state()/load_state() round-trip
+    everything through an .npz file.
+    """
+
+    __slots__ = (
+        'current_state', 'previous_state', 'updates', 'entered_at',
+        'transitions', '_time_in_state', '_history_steps', '_history_codes', '_head', '_filled'
+    )
+
+    def __init__(self, history_size: int = 1024):
+        """
+        Initialize state manager.
+
+        Args:
+            history_size: State entries kept in the history ring buffer
+        """
+        if history_size < 1:
+            raise ValueError(f"history_size must be >= 1, got {history_size}")
         self.current_state = GameState.UNKNOWN
         self.previous_state = GameState.UNKNOWN
-        self.state_data: Dict[str, Any] = {}
-        
-    def update_state(self, new_state: GameState, **kwargs) -> None:
+        # Number of update_state() calls, and how many preceded the current state
+        self.updates = 0
+        self.entered_at = 0
+        self.transitions = np.zeros((N_STATES, N_STATES), dtype=np.int64)
+        self._time_in_state = np.zeros(N_STATES, dtype=np.int64)
+        self._history_steps = np.zeros(history_size, dtype=np.int64)
+        self._history_codes = np.zeros(history_size, dtype=np.uint8)
+        self._head = 0
+        self._filled = 0
+
+    def update_state(self, new_state: GameState) -> None:
         """
-        Update current game state and associated data.
-        
+        Record the state observed at this step.
+
         Args:
             new_state: New game state
-            **kwargs: Additional state-specific data
         """
-        self.previous_state = self.current_state
+        previous = self.current_state
+        self.previous_state = previous
+        self.updates += 1
+        if new_state is previous:
+            return
+        updates = self.updates
+        code = new_state.value - 1
+        # The update that observed new_state counts towards new_state
+        self._time_in_state[previous.value - 1] += updates - 1 - self.entered_at
         self.current_state = new_state
-        self.state_data.update(kwargs)
-        
-        logger.info(f"State transition: {self.previous_state.name} -> {self.current_state.name}")
-        
+        self.entered_at = updates - 1
+        self.transitions[previous.value - 1, code] += 1
+        head = self._head
+        self._history_steps[head] = updates
+        self._history_codes[head] = code
+        self._head = (head + 1) % len(self._history_codes)
+        if self._filled < len(self._history_codes):
+            self._filled += 1
+
+    @property
+    def time_in_state(self) -> np.ndarray:
+        """Updates spent in each state code, including the current stay."""
+        totals = self._time_in_state.copy()
+        totals[self.current_state.value - 1] += self.updates - self.entered_at
+        return totals
+
+    def history(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Most recent state entries, oldest first.
+
+        Returns:
+            (update numbers, state codes) at which each state was entered
+        """
+        size = len(self._history_codes)
+        order = np.arange(self._head - self._filled, self._head) % size
+        return self._history_steps[order], self._history_codes[order]
+
+    def transition_probabilities(self) -> np.ndarray:
+        """Row-normalised transition matrix (rows without exits are zero)."""
+        exits = self.transitions.sum(axis=1, keepdims=True)
+        return np.divide(self.transitions, exits, out=np.zeros(self.transitions.shape), where=exits > 0)
+
     def get_state_data(self) -> Dict[str, Any]:
-        """Get current state data."""
+        """Get current state summary."""
         return {
             'current_state': self.current_state.name,
             'previous_state': self.previous_state.name,
-            'data': self.state_data
+            'steps_in_state': self.updates - self.entered_at
+        }
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Copies of all counters and the history, as arrays."""
+        steps, codes = self.history()
+        return {
+            'meta': np.array([
+                self.current_state.value, self.previous_state.value, self.updates, self.entered_at,
+                len(self._history_codes)
+            ], dtype=np.int64),
+            'transitions': self.transitions.copy(),
+            'time_in_state': self._time_in_state.copy(),
+            'history_steps': steps,
+            'history_codes': codes,
         }
-        
-    def save_state(self, path: Path) -> None:
-        """Save state data to file."""
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore everything from state_dict()."""
+        current, previous, updates, entered_at, history_size = (int(v) for v in state['meta'])
+        if state['transitions'].shape != (N_STATES, N_STATES):
+            raise ValueError(f"Transition matrix has shape {state['transitions'].shape}, expected {(N_STATES, N_STATES)}")
+        self.current_state = GameState(current)
+        self.previous_state = GameState(previous)
+        self.updates = updates
+        self.entered_at = entered_at
+        self.transitions[:] = state['transitions']
+        self._time_in_state[:] = state['time_in_state']
+        n = len(state['history_codes'])
+        self._history_steps = np.zeros(history_size, dtype=np.int64)
+        self._history_codes = np.zeros(history_size, dtype=np.uint8)
+        self._history_steps[:n] = state['history_steps']
+        self._history_codes[:n] = state['history_codes']
+        self._filled = n
+        self._head = n % history_size
+
+    def save_state(self, path: Union[str, Path]) -> None:
+        """Save counters and history to an .npz file."""
         try:
-            state_data = self.get_state_data()
-            with open(path, 'w') as f:
-                json.dump(state_data, f, indent=2)
-            logger.info(f"Saved state data to {path}")
+            np.savez(path, **self.state_dict())
+            logger.info(f"Saved state statistics for {self.updates} updates to {path}")
         except Exception as e:
             logger.error(f"Failed to save state data: {e}")
             raise
-            
-    def load_state(self, path: Path) -> None:
-        """Load state data from file."""
+
+    def load_state(self, path: Union[str, Path]) -> None:
+        """Load a file written by save_state()."""
         try:
-            with open(path, 'r') as f:
-                state_data = json.load(f)
-            
-            self.current_state = GameState[state_data['current_state']]
-            self.previous_state = GameState[state_data['previous_state']]
-            self.state_data = state_data['data']
-            
-            logger.info(f"Loaded state data from {path}")
+            with np.load(path) as data:
+                self.load_state_dict({k: data[k] for k in data.files})
+            logger.info(f"Loaded state statistics for {self.updates} updates from {path}")
         except Exception as e:
             logger.error(f"Failed to load state data: {e}")
             raise
-            
+
     def is_in_state(self, state: GameState) -> bool:
         """Check if currently in specified state."""
         return self.current_state == state
-        
+
     def has_transitioned(self) -> bool:
         """Check if state has changed since last update."""
-        return self.current_state != self.previous_state
\ No newline at end of file
+        return self.current_state != self.previous_state
@@ -0,0 +1,112 @@
+"""Zero-copy overworld tile views and per-tile hashes.
+
+The overworld shows 15 x 10.5 tiles of 16x16 pixels: a half-height row at the
+top and bottom with 9 full rows between them (the layout src/scripts/sc_to_grid.py
+assumes). Frames are kept in a canvas padded by half a tile above and below,
+which lets all 11 rows be addressed as one strided (11, 15, 16, 16, 3) view;
+the padding of the two half rows stays zero.
+"""
+from typing import Optional
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .protocol import SCREEN_HEIGHT, SCREEN_WIDTH, SCREEN_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 16
+GRID_ROWS = 11
+GRID_COLS = SCREEN_WIDTH // TILE_SIZE
+HALF_TILE = TILE_SIZE // 2
+CANVAS_SHAPE = (GRID_ROWS * TILE_SIZE, SCREEN_WIDTH, SCREEN_CHANNELS)
+
+# A tile row is 16 px * 3 B = 48 B, i.e. 12 whole uint32 words
+_TILE_WORDS = TILE_SIZE * SCREEN_CHANNELS // 4
+
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def tile_view(canvas: np.ndarray) -> np.ndarray:
+    """
+    Strided (11, 15, 16, 16, 3) view of a padded (176, 240, 3) canvas.
+
+    No data is copied: tiles[i, j] aliases canvas rows 16i..16i+15 and
+    columns 16j..16j+15.
+    """
+    if canvas.shape != CANVAS_SHAPE:
+        raise ValueError(f"Expected canvas of shape {CANVAS_SHAPE}, got {canvas.shape}")
+    s0, s1, s2 = canvas.strides
+    return as_strided(
+        canvas,
+        shape=(GRID_ROWS, GRID_COLS, TILE_SIZE, TILE_SIZE, SCREEN_CHANNELS),
+        strides=(TILE_SIZE * s0, TILE_SIZE * s1, s0, s1, s2),
+        writeable=False
+    )
+
+
+class TileGrid:
+    """Owns a padded canvas and exposes the current frame as tiles and tile hashes.
+
+    Write frames straight into `frame` (e.g. np.copyto(grid.frame, screen))
+    or pass them to update(). `tiles` always views the canvas, and hashes()
+    computes a 64-bit hash of every tile in one vectorized pass.
+    """
+
+    def __init__(self, seed: int = 0x5EED):
+        """
+        Args:
+            seed: Seed for the hash coefficients; hashes are only comparable
+                between grids built with the same seed
+        """
+        self.canvas = np.zeros(CANVAS_SHAPE, dtype=np.uint8)
+        self.frame = self.canvas[HALF_TILE:HALF_TILE + SCREEN_HEIGHT]
+        self.tiles = tile_view(self.canvas)
+
+        # Same canvas as uint32 words: (11, 15, 16, 12) words per tile
+        words = self.canvas.reshape(CANVAS_SHAPE[0], -1).view(np.uint32)
+        w0, w1 = words.strides
+        self._words = as_strided(
+            words,
+            shape=(GRID_ROWS, GRID_COLS, TILE_SIZE, _TILE_WORDS),
+            strides=(TILE_SIZE * w0, _TILE_WORDS * w1, w0, w1),
+            writeable=False
+        )
+
+        # Random odd multipliers make the weighted word sum a universal hash
+        rng = np.random.default_rng(seed)
+        self._coeffs = rng.integers(0, 2**63, size=(TILE_SIZE, _TILE_WORDS), dtype=np.uint64) * 2 + 1
+        self._products = np.empty((GRID_ROWS, GRID_COLS, TILE_SIZE, _TILE_WORDS), dtype=np.uint64)
+        self._hashes = np.empty((GRID_ROWS, GRID_COLS), dtype=np.uint64)
+        self._shift = np.empty_like(self._hashes)
+
+    def update(self, frame: np.ndarray) -> np.ndarray:
+        """Load a (160, 240, 3) frame into the canvas (no-op if it already is the canvas) and return the tiles."""
+        if not np.shares_memory(frame, self.canvas):
+            np.copyto(self.frame, frame)
+        return self.tiles
+
+    def hashes(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        64-bit hash of every tile of the current canvas, shape (11, 15).
+
+        The returned array is reused by the next call unless `out` is given.
+        Half-height rows hash their visible half plus zero padding.
+        """
+        h = self._hashes if out is None else out
+        products = self._products
+        np.multiply(self._words, self._coeffs, out=products)
+        products.reshape(GRID_ROWS * GRID_COLS, -1).sum(axis=1, out=h.reshape(-1))
+        # splitmix64 finalizer so nearby sums spread across all bits
+        shift = self._shift
+        np.right_shift(h, 30, out=shift)
+        h ^= shift
+        h *= _MIX1
+        np.right_shift(h, 27, out=shift)
+        h ^= shift
+        h *= _MIX2
+        np.right_shift(h, 31, out=shift)
+        h ^= shift
+        return h
@@ -0,0 +1,82 @@
+"""Persistent mapping from tile hashes to small integer tile IDs."""
+from typing import Optional, Union
+from pathlib import Path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TileIndex:
+    """Assigns every distinct tile hash a stable uint16 ID.
+
+    IDs start at 1 in order of first sighting; 0 is returned for new tiles
+    once the index is full. The on-disk table is just the hashes in ID order
+    (.npy, 8 bytes per tile), so loading is one read plus one argsort.
+    Lookups are a vectorized searchsorted over a sorted copy of the hashes.
+    """
+
+    MAX_TILES = np.iinfo(np.uint16).max
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            path: .npy table to load from (if it exists) and save() to
+        """
+        self.path = Path(path) if path else None
+        hashes = np.zeros(0, dtype=np.uint64)
+        if self.path and self.path.exists():
+            hashes = np.load(self.path)
+            logger.info(f"Loaded {len(hashes)} tiles from {self.path}")
+        self._hashes = np.asarray(hashes, dtype=np.uint64)
+        self._rebuild()
+        self.dirty = False
+
+    def _rebuild(self) -> None:
+        order = np.argsort(self._hashes, kind='stable')
+        self._sorted = self._hashes[order]
+        self._sorted_ids = (order + 1).astype(np.uint16)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def lookup(self, hashes: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Map hashes to IDs without assigning new ones; unknown tiles get 0."""
+        flat = np.ravel(hashes)
+        ids = np.zeros(flat.shape, dtype=np.uint16) if out is None else out.reshape(-1)
+        if len(self._sorted):
+            pos = np.searchsorted(self._sorted, flat)
+            np.minimum(pos, len(self._sorted) - 1, out=pos)
+            found = self._sorted[pos] == flat
+            ids[:] = np.where(found, self._sorted_ids[pos], 0)
+        else:
+            ids[:] = 0
+        return ids.reshape(np.shape(hashes))
+
+    def encode(self, hashes: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Map hashes to IDs, assigning IDs to tiles seen for the first time."""
+        ids = self.lookup(hashes, out)
+        if ids.all():
+            return ids
+        unknown = np.unique(np.ravel(hashes)[ids.reshape(-1) == 0])
+        room = self.MAX_TILES - len(self._hashes)
+        if room <= 0:
+            return ids
+        if len(unknown) > room:
+            logger.warning(f"Tile index full, {len(unknown) - room} tiles left unassigned")
+            unknown = unknown[:room]
+        self._hashes = np.concatenate([self._hashes, unknown])
+        self._rebuild()
+        self.dirty = True
+        return self.lookup(hashes, out)
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Write the hash table (in ID order) to disk."""
+        path = Path(path) if path else self.path
+        if path is None:
+            raise ValueError("No path given for tile index")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, self._hashes)
+        self.dirty = False
+        logger.info(f"Saved {len(self._hashes)} tiles to {path}")
@@ -0,0 +1,320 @@
+"""Interchangeable message transports between the Python clients and controller.lua.
+
+Every transport carries the same messages (tagged text commands and replies,
+binary messages with a protocol.HEADER); they differ in how messages are
+delimited and addressed:
+
+- udp:  one message per datagram; frames are split into FRAME_CHUNKS chunks
+        to stay under datagram limits. Default, works everywhere.
+- tcp:  loopback stream, each message prefixed with its u32 length; a frame
+        is a single message.
+- unix: the tcp framing over a Unix domain socket, for co-located
+        instances (POSIX only).
+
+The client side listens; controller.lua connects to the endpoint described
+by lua_env() (FIRERED_TRANSPORT, FIRERED_PORT, FIRERED_ADDRESS) and
+announces itself with a "ready" message.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Union
+import itertools
+import logging
+import os
+import socket
+import struct
+import tempfile
+
+from .protocol import HEADER, FRAME_BYTES, FRAME_CHUNKS, MAX_DATAGRAM
+
+logger = logging.getLogger(__name__)
+
+# Length prefix of stream messages
+LENGTH = struct.Struct("<I")
+
+_unix_ids = itertools.count()
+
+
+class Transport(ABC):
+    """Listening endpoint for one Lua script.
+
+    Subclasses implement handshake() (accept the script's "ready"), send(),
+    recv_into() (one whole message per call) and lua_env(). Timeouts raise
+    socket.timeout; a lost connection raises ConnectionError.
+    """
+
+    name = ''
+    # Largest message the Lua side sends on this transport
+    max_message = MAX_DATAGRAM
+    # Messages a full frame is split into
+    frame_messages = FRAME_CHUNKS
+
+    def __init__(self):
+        self.timeout: Optional[float] = None
+
+    @property
+    @abstractmethod
+    def address(self) -> str:
+        """Human-readable endpoint, e.g. udp://127.0.0.1:50000"""
+
+    @property
+    @abstractmethod
+    def connected(self) -> bool:
+        """True once the Lua script has completed the handshake."""
+
+    @abstractmethod
+    def lua_env(self) -> Dict[str, str]:
+        """Environment variables telling controller.lua where to connect."""
+
+    @abstractmethod
+    def fileno(self) -> int:
+        """Descriptor that becomes readable when a handshake can proceed (for selectors)."""
+
+    @abstractmethod
+    def settimeout(self, timeout: Optional[float]) -> None:
+        """Set the timeout of handshake() and recv_into(); None blocks."""
+
+    @abstractmethod
+    def handshake(self) -> bool:
+        """Process one incoming connection or message; True if it was the Lua script's "ready"."""
+
+    @abstractmethod
+    def send(self, data: bytes) -> None:
+        """Send one whole message to the connected Lua script."""
+
+    @abstractmethod
+    def recv_into(self, buffer) -> int:
+        """Receive one message into buffer and return its size."""
+
+    @abstractmethod
+    def disconnect(self) -> None:
+        """Forget the current peer so a relaunched script can connect again."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the listening socket and any connection."""
+
+
+class UdpTransport(Transport):
+    """Datagrams on a loopback UDP port (the original transport)."""
+
+    name = 'udp'
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind; 0 lets the OS pick a free one
+        """
+        super().__init__()
+        self.host = host
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * FRAME_BYTES)
+        self.peer_addr = None
+
+    @property
+    def address(self) -> str:
+        return f"udp://{self.host}:{self.port}"
+
+    @property
+    def connected(self) -> bool:
+        return self.peer_addr is not None
+
+    def lua_env(self) -> Dict[str, str]:
+        return {"FIRERED_TRANSPORT": self.name, "FIRERED_PORT": str(self.port)}
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.timeout = timeout
+        self.sock.settimeout(timeout)
+
+    def handshake(self) -> bool:
+        data, addr = self.sock.recvfrom(1024)
+        if data != b"ready":
+            return False
+        # Replies go back to the Lua client's ephemeral port
+        self.peer_addr = addr
+        return True
+
+    def send(self, data: bytes) -> None:
+        self.sock.sendto(data, self.peer_addr)
+
+    def recv_into(self, buffer) -> int:
+        return self.sock.recv_into(buffer)
+
+    def disconnect(self) -> None:
+        self.peer_addr = None
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class StreamTransport(Transport):
+    """Length-prefixed messages over a connected stream socket.
+
+    Incoming bytes are read in large blocks into an internal buffer and
+    split into messages there, so a message cut by a timeout is completed
+    by the next call instead of desynchronising the stream.
+    """
+
+    max_message = HEADER.size + FRAME_BYTES
+    frame_messages = 1
+
+    def __init__(self, listener: socket.socket):
+        super().__init__()
+        self.listener = listener
+        self.listener.listen(1)
+        self.conn: Optional[socket.socket] = None
+        self._buffer = bytearray(4 * (LENGTH.size + self.max_message))
+        self._view = memoryview(self._buffer)
+        self._start = self._end = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None
+
+    def fileno(self) -> int:
+        return (self.conn or self.listener).fileno()
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.timeout = timeout
+        (self.conn or self.listener).settimeout(timeout)
+
+    def _configure(self, conn: socket.socket) -> None:
+        """Socket options for a freshly accepted connection."""
+
+    def handshake(self) -> bool:
+        if self.conn is None:
+            conn, _ = self.listener.accept()
+            self._configure(conn)
+            conn.settimeout(self.timeout)
+            self.conn = conn
+            self._start = self._end = 0
+            # "ready" follows on the connection; a selector waits on fileno() for it
+            return False
+        message = bytearray(16)
+        size = self.recv_into(message)
+        return message[:size] == b"ready"
+
+    def send(self, data: bytes) -> None:
+        self.conn.sendall(LENGTH.pack(len(data)) + data)
+
+    def recv_into(self, buffer) -> int:
+        while True:
+            available = self._end - self._start
+            if available >= LENGTH.size:
+                (length,) = LENGTH.unpack_from(self._buffer, self._start)
+                if LENGTH.size + length > len(self._buffer):
+                    raise ConnectionError(f"Message of {length} bytes exceeds the receive buffer")
+                if available >= LENGTH.size + length:
+                    start = self._start + LENGTH.size
+                    buffer[:length] = self._view[start:start + length]
+                    self._start = start + length
+                    return length
+            if self._start:
+                # Move the partial message to the front to make room
+                self._buffer[:available] = self._view[self._start:self._end]
+                self._start, self._end = 0, available
+            received = self.conn.recv_into(self._view[self._end:])
+            if not received:
+                raise ConnectionError("Lua script closed the connection")
+            self._end += received
+
+    def disconnect(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self._start = self._end = 0
+
+    def close(self) -> None:
+        self.disconnect()
+        self.listener.close()
+
+
+class TcpTransport(StreamTransport):
+    """Length-prefixed stream on a loopback TCP port."""
+
+    name = 'tcp'
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port to listen on; 0 lets the OS pick a free one
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind((host, port))
+        self.host = host
+        self.port = listener.getsockname()[1]
+        super().__init__(listener)
+
+    @property
+    def address(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+    def lua_env(self) -> Dict[str, str]:
+        return {"FIRERED_TRANSPORT": self.name, "FIRERED_PORT": str(self.port)}
+
+    def _configure(self, conn: socket.socket) -> None:
+        # Replies are small and latency-bound; never wait to coalesce them
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixTransport(StreamTransport):
+    """Length-prefixed stream on a Unix domain socket (local instances only)."""
+
+    name = 'unix'
+
+    def __init__(self, path: Optional[Union[str, os.PathLike]] = None):
+        """
+        Args:
+            path: Socket file to create; defaults to a fresh name in the temp directory
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix domain sockets are not available on this platform")
+        self.path = os.fspath(path) if path else os.path.join(
+            tempfile.gettempdir(), f"firered-{os.getpid()}-{next(_unix_ids)}.sock"
+        )
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        self.port = None
+        super().__init__(listener)
+
+    @property
+    def address(self) -> str:
+        return f"unix://{self.path}"
+
+    def lua_env(self) -> Dict[str, str]:
+        return {"FIRERED_TRANSPORT": self.name, "FIRERED_ADDRESS": self.path}
+
+    def close(self) -> None:
+        super().close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+TRANSPORTS = {cls.name: cls for cls in (UdpTransport, TcpTransport, UnixTransport)}
+
+
+def make_transport(transport: Union[str, Transport] = 'udp', port: int = 0) -> Transport:
+    """
+    Build a transport by name ('udp', 'tcp' or 'unix'), or pass one through.
+
+    Args:
+        transport: Transport name or an existing Transport
+        port: Port for the network transports (0 = OS-assigned)
+    """
+    if isinstance(transport, Transport):
+        return transport
+    try:
+        cls = TRANSPORTS[transport]
+    except KeyError:
+        raise ValueError(f"Unknown transport {transport!r}, expected one of {sorted(TRANSPORTS)}") from None
+    return cls() if cls is UnixTransport else cls(port=port)
@@ -0,0 +1,430 @@
+"""Go-Explore cell archive: the best savestate for every discretized game state."""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+import hashlib
+import logging
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from .checkpoint import BlobStore
+from .game_env import PokemonFireRedEnv
+
+logger = logging.getLogger(__name__)
+
+# Bit layout of a cell key (int64): party size | badge count | map bank | map number | cell x | cell y
+CELL_Y_SHIFT = 0
+CELL_X_SHIFT = 12
+MAP_NUMBER_SHIFT = 24
+MAP_BANK_SHIFT = 32
+BADGES_SHIFT = 40
+PARTY_SHIFT = 44
+# Coarse coordinates are clipped to 12 bits
+CELL_COORD_MAX = (1 << 12) - 1
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def cell_keys(ram: np.ndarray, cell_size: int = 4) -> np.ndarray:
+    """
+    Discretize RAM records into cell keys.
+
+    A cell is (map bank, map number, x // cell_size, y // cell_size, badge
+    count, party size), packed into one int64.
+
+    Args:
+        ram: Record (np.void) or array of records from FIRERED_MEMORY_MAP
+        cell_size: Tiles per cell side
+
+    Returns:
+        int64 array of keys, one per record
+    """
+    ram = np.atleast_1d(ram)
+    cx = np.clip(ram['x'].astype(np.int64) // cell_size, 0, CELL_COORD_MAX)
+    cy = np.clip(ram['y'].astype(np.int64) // cell_size, 0, CELL_COORD_MAX)
+    return (
+        (np.minimum(ram['party_count'].astype(np.int64), 7) << PARTY_SHIFT)
+        | (_POPCOUNT[ram['badges']] << BADGES_SHIFT)
+        | (ram['map_bank'].astype(np.int64) << MAP_BANK_SHIFT)
+        | (ram['map_number'].astype(np.int64) << MAP_NUMBER_SHIFT)
+        | (cx << CELL_X_SHIFT)
+        | (cy << CELL_Y_SHIFT)
+    )
+
+
+def decode_cell_key(key: int) -> Dict[str, int]:
+    """Split a cell key back into its components."""
+    key = int(key)
+    return {
+        'map_bank': (key >> MAP_BANK_SHIFT) & 0xFF,
+        'map_number': (key >> MAP_NUMBER_SHIFT) & 0xFF,
+        'cell_x': (key >> CELL_X_SHIFT) & CELL_COORD_MAX,
+        'cell_y': (key >> CELL_Y_SHIFT) & CELL_COORD_MAX,
+        'badges': (key >> BADGES_SHIFT) & 0xF,
+        'party_count': (key >> PARTY_SHIFT) & 0x7,
+    }
+
+
+class CellArchive:
+    """Cells reached during exploration, each with the best savestate that reached it.
+
+    Per-cell data lives in parallel arrays indexed by a dense slot (key,
+    visits, times chosen, best score, savestate digest), about 60 bytes a
+    cell; keys are found through a sorted key index with searchsorted, so
+    10^5+ cells cost a few MB and update() is a handful of vectorized
+    operations plus one savestate per cell that was found or improved.
+
+    Savestates are identified by their sha256 digest and shared between
+    cells with identical content. The most recently used ones are kept in
+    memory up to max_memory_bytes; older ones are spilled, least recently
+    used first, to a BlobStore under <root>/savestates. Restoring a cell
+    starts a new episode from its savestate (env.reset(options={'savestate': ...})),
+    and restore_many() does so for a fleet of envs concurrently.
+
+    The envs must live in this process (e.g. SyncFireRedVectorEnv.envs) and
+    read the position fields of FIRERED_MEMORY_MAP every step.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        cell_size: int = 4,
+        max_memory_bytes: int = 256 << 20,
+        score_weight: float = 1.0,
+        initial_capacity: int = 1024,
+        max_workers: int = 16
+    ):
+        """
+        Args:
+            root: Directory for spilled savestates and saved archives
+            cell_size: Tiles per cell side, see cell_keys()
+            max_memory_bytes: Savestate bytes kept in memory before spilling to disk
+            score_weight: Weight of the normalised cell score in select()
+            initial_capacity: Cell slots allocated up front (doubles as needed)
+            max_workers: Threads used to save and restore envs
+        """
+        self.root = Path(root)
+        self.blobs = BlobStore(self.root / 'savestates', suffix='.State')
+        self.tmp_dir = self.root / 'tmp'
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.cell_size = cell_size
+        self.max_memory_bytes = max_memory_bytes
+        self.score_weight = score_weight
+        self.max_workers = max_workers
+
+        self.size = 0
+        self.keys = np.zeros(initial_capacity, dtype=np.int64)
+        self.visits = np.zeros(initial_capacity, dtype=np.uint32)
+        self.chosen = np.zeros(initial_capacity, dtype=np.uint32)
+        self.scores = np.full(initial_capacity, -np.inf, dtype=np.float64)
+        self.digests = np.zeros((initial_capacity, 32), dtype=np.uint8)
+        # Sorted keys and their slots
+        self._index_keys = np.zeros(0, dtype=np.int64)
+        self._index_slots = np.zeros(0, dtype=np.int64)
+
+        # Savestate blobs: reference counts, the in-memory LRU tier, and
+        # spilled blobs a saved archive still refers to
+        self._refs: Dict[bytes, int] = {}
+        self._memory: 'OrderedDict[bytes, bytes]' = OrderedDict()
+        self._memory_bytes = 0
+        self._persisted: Set[bytes] = set()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def memory_bytes(self) -> int:
+        """Savestate bytes currently held in memory."""
+        return self._memory_bytes
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Slots of cell keys, -1 for cells not in the archive."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self._index_keys):
+            return np.full(keys.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._index_keys, keys), len(self._index_keys) - 1)
+        return np.where(self._index_keys[pos] == keys, self._index_slots[pos], -1)
+
+    def cell(self, slot: int) -> Dict[str, Any]:
+        """Components and statistics of one cell."""
+        info = decode_cell_key(self.keys[slot])
+        info.update(visits=int(self.visits[slot]), chosen=int(self.chosen[slot]), score=float(self.scores[slot]))
+        return info
+
+    def update(self, envs: Sequence[PokemonFireRedEnv], scores: Sequence[float]) -> np.ndarray:
+        """
+        Record the cells envs are in now.
+
+        Each env visits its cell once. A cell that is new, or that an env
+        reached with a higher score than its best so far, takes a savestate
+        from that env (the best-scoring env when several share a cell).
+
+        Args:
+            envs: Envs whose current RAM is up to date (after reset() or step())
+            scores: Score of each env's trajectory so far, e.g. its episode return
+
+        Returns:
+            Slot of each env's cell
+        """
+        if len(envs) != len(scores):
+            raise ValueError(f"Got {len(envs)} envs but {len(scores)} scores")
+        if any(env.ram is None for env in envs):
+            raise ValueError("CellArchive needs envs that read RAM every step")
+        keys = cell_keys(np.stack([env.ram for env in envs]), self.cell_size)
+        scores = np.asarray(scores, dtype=np.float64)
+        slots = self.lookup(keys)
+        if (slots < 0).any():
+            self._insert(np.unique(keys[slots < 0]))
+            slots = self.lookup(keys)
+        np.add.at(self.visits, slots, 1)
+
+        # Best env per cell in this batch, then only those beating the archive
+        order = np.lexsort((-scores, slots))
+        _, first = np.unique(slots[order], return_index=True)
+        candidates = order[first]
+        improved = candidates[scores[candidates] > self.scores[slots[candidates]]]
+        if len(improved):
+            states = self._map(self._read_savestate, [envs[i] for i in improved])
+            for i, data in zip(improved, states):
+                slot = slots[i]
+                had_state = np.isfinite(self.scores[slot])
+                old = self.digests[slot].tobytes()
+                self.digests[slot] = np.frombuffer(self._acquire(data), dtype=np.uint8)
+                self.scores[slot] = scores[i]
+                if had_state:
+                    self._release(old)
+        return slots
+
+    def select(self, n: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Pick cells to return to, favouring rarely visited, rarely chosen and high-scoring cells.
+
+        The weight of a cell is
+            1 / sqrt(1 + chosen) + 1 / sqrt(1 + visits) + score_weight * normalised score
+        Picked cells count as chosen.
+
+        Args:
+            n: Number of cells (drawn with replacement)
+            rng: Random generator; defaults to a fresh unseeded one
+
+        Returns:
+            Slots of the selected cells
+        """
+        if not self.size:
+            raise ValueError("The archive is empty")
+        rng = rng if rng is not None else np.random.default_rng()
+        size = self.size
+        weights = 1.0 / np.sqrt(1.0 + self.chosen[:size]) + 1.0 / np.sqrt(1.0 + self.visits[:size])
+        if self.score_weight:
+            scores = self.scores[:size]
+            low, high = scores.min(), scores.max()
+            if high > low:
+                weights += self.score_weight * (scores - low) / (high - low)
+        slots = rng.choice(size, size=n, p=weights / weights.sum())
+        np.add.at(self.chosen, slots, 1)
+        return slots
+
+    def restore(self, env: PokemonFireRedEnv, slot: int) -> Tuple[Any, Dict[str, Any]]:
+        """Start a new episode of env from a cell's savestate; returns (observation, info)."""
+        return self.restore_many([env], [slot])[0]
+
+    def restore_many(
+        self, envs: Sequence[PokemonFireRedEnv], slots: Sequence[int]
+    ) -> List[Tuple[Any, Dict[str, Any]]]:
+        """
+        Start a new episode of envs[i] from the savestate of cell slots[i], concurrently.
+
+        Returns:
+            (observation, info) per env, as from env.reset()
+        """
+        if len(envs) != len(slots):
+            raise ValueError(f"Got {len(envs)} envs but {len(slots)} cells")
+        paths = []
+        temporary = []
+        try:
+            # In-memory savestates go through a temp file BizHawk can load
+            for slot in slots:
+                if not 0 <= slot < self.size or not np.isfinite(self.scores[slot]):
+                    raise KeyError(f"No savestate for cell slot {slot}")
+                digest = self.digests[slot].tobytes()
+                data = self._memory.get(digest)
+                if data is None:
+                    paths.append(self.blobs.path(digest.hex()))
+                    continue
+                self._memory.move_to_end(digest)
+                path = self.tmp_dir / f"{uuid.uuid4().hex}.State"
+                path.write_bytes(data)
+                temporary.append(path)
+                paths.append(path)
+            return self._map(lambda env, path: env.reset(options={'savestate': path}), envs, paths)
+        except Exception as e:
+            logger.error(f"Failed to restore cells: {e}")
+            raise
+        finally:
+            for path in temporary:
+                path.unlink(missing_ok=True)
+
+    def spill(self, max_bytes: int = 0) -> int:
+        """
+        Move least recently used savestates to disk until at most max_bytes stay in memory.
+
+        Returns:
+            Number of savestates spilled
+        """
+        spilled = 0
+        while self._memory_bytes > max_bytes:
+            digest, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            if digest.hex() not in self.blobs:
+                tmp = self.tmp_dir / f"{uuid.uuid4().hex}.State"
+                tmp.write_bytes(data)
+                self.blobs.put_file(tmp)
+            spilled += 1
+        if spilled:
+            logger.debug(f"Spilled {spilled} savestates to {self.blobs.root}")
+        return spilled
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Copies of the per-cell arrays (savestates are referenced by digest)."""
+        size = self.size
+        return {
+            'meta': np.array([self.cell_size], dtype=np.int64),
+            'keys': self.keys[:size].copy(),
+            'visits': self.visits[:size].copy(),
+            'chosen': self.chosen[:size].copy(),
+            'scores': self.scores[:size].copy(),
+            'digests': self.digests[:size].copy(),
+        }
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Replace the archive with state_dict() output; its savestates must be in the blob store."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        (self.cell_size,) = (int(v) for v in state['meta'])
+        size = len(state['keys'])
+        capacity = max(len(self.keys), 1)
+        while capacity < size:
+            capacity *= 2
+        self.size = size
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.visits = np.zeros(capacity, dtype=np.uint32)
+        self.chosen = np.zeros(capacity, dtype=np.uint32)
+        self.scores = np.full(capacity, -np.inf, dtype=np.float64)
+        self.digests = np.zeros((capacity, 32), dtype=np.uint8)
+        for name in ('keys', 'visits', 'chosen', 'scores', 'digests'):
+            getattr(self, name)[:size] = state[name]
+        order = np.argsort(self.keys[:size], kind='stable')
+        self._index_keys = self.keys[:size][order]
+        self._index_slots = order.astype(np.int64)
+        self._refs = {}
+        for slot in np.flatnonzero(np.isfinite(self.scores[:size])):
+            digest = self.digests[slot].tobytes()
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+        missing = [d.hex() for d in self._refs if d.hex() not in self.blobs]
+        if missing:
+            raise FileNotFoundError(f"{len(missing)} savestates are missing from {self.blobs.root}, e.g. {missing[0]}")
+        self._persisted = set(self._refs)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Spill every savestate to the blob store and write the cell arrays to an .npz file."""
+        try:
+            self.spill(0)
+            np.savez(path, **self.state_dict())
+            self._persisted = set(self._refs)
+            logger.info(f"Saved archive of {self.size} cells to {path}")
+        except Exception as e:
+            logger.error(f"Failed to save archive: {e}")
+            raise
+
+    def load(self, path: Union[str, Path]) -> None:
+        """Load a file written by save() with the same root."""
+        try:
+            with np.load(path) as data:
+                self.load_state_dict({k: data[k] for k in data.files})
+            logger.info(f"Loaded archive of {self.size} cells from {path}")
+        except Exception as e:
+            logger.error(f"Failed to load archive: {e}")
+            raise
+
+    def collect_garbage(self) -> int:
+        """
+        Delete spilled savestates no cell refers to, including ones kept for earlier save() calls.
+
+        Returns:
+            Number of blobs removed
+        """
+        referenced = {d.hex() for d in self._refs}
+        removed = 0
+        for digest in self.blobs.digests():
+            if digest not in referenced:
+                self.blobs.remove(digest)
+                removed += 1
+        self._persisted &= set(self._refs)
+        logger.info(f"Removed {removed} unreferenced savestates")
+        return removed
+
+    def _insert(self, new_keys: np.ndarray) -> None:
+        """Add cells for sorted, unique keys not yet in the archive."""
+        start, end = self.size, self.size + len(new_keys)
+        self._grow(end)
+        self.keys[start:end] = new_keys
+        pos = np.searchsorted(self._index_keys, new_keys)
+        self._index_keys = np.insert(self._index_keys, pos, new_keys)
+        self._index_slots = np.insert(self._index_slots, pos, np.arange(start, end))
+        self.size = end
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.keys)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == len(self.keys):
+            return
+        extra = capacity - len(self.keys)
+        self.keys = np.concatenate([self.keys, np.zeros(extra, dtype=np.int64)])
+        self.visits = np.concatenate([self.visits, np.zeros(extra, dtype=np.uint32)])
+        self.chosen = np.concatenate([self.chosen, np.zeros(extra, dtype=np.uint32)])
+        self.scores = np.concatenate([self.scores, np.full(extra, -np.inf)])
+        self.digests = np.concatenate([self.digests, np.zeros((extra, 32), dtype=np.uint8)])
+
+    def _read_savestate(self, env: PokemonFireRedEnv) -> bytes:
+        path = self.tmp_dir / f"{uuid.uuid4().hex}.State"
+        try:
+            env.emulator.write_state(path)
+            return path.read_bytes()
+        finally:
+            path.unlink(missing_ok=True)
+
+    def _acquire(self, data: bytes) -> bytes:
+        """Reference a savestate, storing it in memory if new; returns its digest."""
+        digest = hashlib.sha256(data).digest()
+        refs = self._refs.get(digest, 0)
+        self._refs[digest] = refs + 1
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+        elif not refs:
+            self._memory[digest] = data
+            self._memory_bytes += len(data)
+            self.spill(self.max_memory_bytes)
+        return digest
+
+    def _release(self, digest: bytes) -> None:
+        """Drop a reference; unreferenced savestates are freed unless a saved archive needs them."""
+        refs = self._refs[digest] - 1
+        if refs:
+            self._refs[digest] = refs
+            return
+        del self._refs[digest]
+        data = self._memory.pop(digest, None)
+        if data is not None:
+            self._memory_bytes -= len(data)
+        elif digest not in self._persisted:
+            self.blobs.remove(digest.hex())
+
+    def _map(self, fn, *iterables) -> list:
+        items = list(zip(*iterables))
+        if len(items) == 1:
+            return [fn(*items[0])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(items), 1))) as pool:
+            return list(pool.map(fn, *iterables))
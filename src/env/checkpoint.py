@@ -0,0 +1,194 @@
+"""Persistent env checkpoints with content-addressed, deduplicated savestates."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple, Union
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from .game_env import PokemonFireRedEnv
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Files stored under the hash of their content.
+
+    A blob lives at <root>/<digest[:2]>/<digest>. Storing content that is
+    already present only deletes the new copy, so any number of checkpoints
+    that share a savestate keep a single file on disk.
+    """
+
+    def __init__(self, root: Union[str, Path], suffix: str = ''):
+        """
+        Args:
+            root: Directory holding the blobs
+            suffix: File extension appended to every blob, e.g. '.State'
+        """
+        self.root = Path(root)
+        self.suffix = suffix
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        """Location of a blob (whether or not it exists)."""
+        return self.root / digest[:2] / f"{digest}{self.suffix}"
+
+    def __contains__(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put_file(self, source: Union[str, Path]) -> str:
+        """
+        Move a file into the store.
+
+        Args:
+            source: File on the same filesystem; it is consumed
+
+        Returns:
+            Hex digest naming the blob
+        """
+        source = Path(source)
+        digest = _file_digest(source)
+        target = self.path(digest)
+        if target.exists():
+            source.unlink()
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.replace(source, target)
+        return digest
+
+    def digests(self) -> List[str]:
+        """Every stored blob."""
+        return sorted(p.name[:len(p.name) - len(self.suffix)] for p in self.root.glob(f"??/*{self.suffix}"))
+
+    def remove(self, digest: str) -> None:
+        self.path(digest).unlink(missing_ok=True)
+
+
+class CheckpointStore:
+    """Saves and restores whole PokemonFireRedEnv states by name.
+
+    A checkpoint is a small .npz under <root>/checkpoints holding the env's
+    checkpoint_state() (step counter, RNG, StateManager data) plus the
+    digest of its emulator savestate, which goes into a BlobStore under
+    <root>/savestates. save_many()/restore_many() handle a fleet of envs
+    concurrently on a thread pool; each env talks to its own emulator, so
+    the work is I/O bound and the threads overlap.
+
+    The envs must live in this process (e.g. SyncFireRedVectorEnv.envs).
+    """
+
+    def __init__(self, root: Union[str, Path], max_workers: int = 16):
+        """
+        Args:
+            root: Directory for checkpoints and savestates
+            max_workers: Threads used by save_many() and restore_many()
+        """
+        self.root = Path(root)
+        self.blobs = BlobStore(self.root / 'savestates', suffix='.State')
+        self.checkpoint_dir = self.root / 'checkpoints'
+        self.tmp_dir = self.root / 'tmp'
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(exist_ok=True)
+        self.max_workers = max_workers
+
+    def _checkpoint_path(self, name: str) -> Path:
+        if not name or Path(name).name != name:
+            raise ValueError(f"Invalid checkpoint name: {name!r}")
+        return self.checkpoint_dir / f"{name}.npz"
+
+    def save(self, env: PokemonFireRedEnv, name: str) -> str:
+        """
+        Checkpoint one env, replacing any checkpoint with the same name.
+
+        Returns:
+            Digest of the emulator savestate
+        """
+        path = self._checkpoint_path(name)
+        tmp_state = self.tmp_dir / f"{uuid.uuid4().hex}.State"
+        try:
+            env.emulator.write_state(tmp_state)
+            digest = self.blobs.put_file(tmp_state)
+            state = env.checkpoint_state()
+            state['savestate'] = np.array(digest)
+            # Write next to the target and rename, so a crash never leaves a torn checkpoint
+            tmp = self.tmp_dir / f"{name}.{uuid.uuid4().hex}.npz"
+            np.savez(tmp, **state)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.error(f"Failed to save checkpoint {name}: {e}")
+            tmp_state.unlink(missing_ok=True)
+            raise
+        return digest
+
+    def restore(self, env: PokemonFireRedEnv, name: str) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Restore one env from a checkpoint.
+
+        Returns:
+            Observation and info, as from env.reset()
+        """
+        try:
+            with np.load(self._checkpoint_path(name)) as data:
+                state = {k: data[k] for k in data.files}
+            env.emulator.load_state(self.blobs.path(str(state.pop('savestate'))))
+            return env.restore_checkpoint_state(state)
+        except Exception as e:
+            logger.error(f"Failed to restore checkpoint {name}: {e}")
+            raise
+
+    def save_many(self, envs: Sequence[PokemonFireRedEnv], names: Sequence[str]) -> List[str]:
+        """Checkpoint envs[i] as names[i], concurrently; returns the savestate digests."""
+        return self._map(self.save, envs, names)
+
+    def restore_many(
+        self, envs: Sequence[PokemonFireRedEnv], names: Sequence[str]
+    ) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Restore envs[i] from names[i], concurrently; returns (observation, info) per env."""
+        return self._map(self.restore, envs, names)
+
+    def _map(self, fn, envs: Sequence[PokemonFireRedEnv], names: Sequence[str]) -> list:
+        if len(envs) != len(names):
+            raise ValueError(f"Got {len(envs)} envs but {len(names)} checkpoint names")
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(envs), 1))) as pool:
+            return list(pool.map(fn, envs, names))
+
+    def names(self) -> List[str]:
+        """Names of all checkpoints."""
+        return sorted(p.stem for p in self.checkpoint_dir.glob("*.npz"))
+
+    def delete(self, name: str) -> None:
+        """Remove a checkpoint; its savestate stays until collect_garbage()."""
+        self._checkpoint_path(name).unlink(missing_ok=True)
+
+    def collect_garbage(self) -> int:
+        """
+        Delete savestates no checkpoint refers to.
+
+        Returns:
+            Number of blobs removed
+        """
+        referenced = set()
+        for name in self.names():
+            with np.load(self._checkpoint_path(name)) as data:
+                referenced.add(str(data['savestate']))
+        removed = 0
+        for digest in self.blobs.digests():
+            if digest not in referenced:
+                self.blobs.remove(digest)
+                removed += 1
+        logger.info(f"Removed {removed} unreferenced savestates")
+        return removed
+
+
+def _file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
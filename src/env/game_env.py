@@ -1,14 +1,23 @@
 """Pokemon FireRed environment for reinforcement learning."""
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, Optional, Hashable, Union, Callable, Sequence
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
+import json
 import logging
 from pathlib import Path
 
 from ..core.emulator import BizHawkEmulator
 from ..core.state_manager import StateManager, GameState
-from ..core.image_utils import ImageProcessor
+from ..core.image_utils import ImageProcessor, PreprocessConfig, FramePipeline
+from ..core.memory_map import MemoryMap, FIRERED_MEMORY_MAP, in_battle
+from ..core.state_classifier import GameStateClassifier
+from ..core.snapshot_pool import SnapshotPool
+from ..core.tile_grid import TileGrid
+from ..core.tile_index import TileIndex
+from ..core.novelty import VisitCounter
+from .observation import ObservationConfig, ObservationComposer
+from ..utils.metrics import Metrics, PhaseTimer
 
 logger = logging.getLogger(__name__)
 
@@ -29,12 +38,31 @@ class PokemonFireRedEnv(gym.Env):
         7: 'select'
     }
     
+    # Phases of step() timed when metrics are enabled; 'emulate' ends at the
+    # step's ack, 'screen' and 'ram' are the replies that follow it
+    PHASES = ('emulate', 'screen', 'ram', 'decode', 'state', 'tiles', 'reward', 'compose')
+    
     def __init__(
         self,
         bizhawk_path: Path,
         rom_path: Path,
         lua_path: Path,
-        save_state: Optional[Path] = None
+        save_state: Optional[Path] = None,
+        frameskip: int = 6,
+        lockstep: bool = True,
+        turbo: bool = False,
+        transport: str = 'udp',
+        memory_map: Optional[MemoryMap] = FIRERED_MEMORY_MAP,
+        state_classifier: Optional[GameStateClassifier] = None,
+        snapshot_pool_size: int = 16,
+        preprocess: Optional[PreprocessConfig] = None,
+        tile_index: Optional[Union[TileIndex, str, Path]] = None,
+        visit_counter: Optional[VisitCounter] = None,
+        novelty_reward: bool = True,
+        env_index: int = 0,
+        emulator_factory: Callable[..., BizHawkEmulator] = BizHawkEmulator,
+        metrics: Optional[Metrics] = None,
+        observation: Optional[Union[ObservationConfig, Sequence[str]]] = None
     ):
         """
         Initialize Pokemon FireRed environment.
@@ -44,40 +72,135 @@ class PokemonFireRedEnv(gym.Env):
             rom_path: Path to Pokemon FireRed ROM
             lua_path: Path to Lua control script
             save_state: Optional path to starting save state
+            frameskip: Emulated frames each action is held for (action repeat)
+            lockstep: Pause emulation between steps so steps are frame-accurate
+            turbo: Emulate as fast as the CPU allows instead of at 60 fps, with
+                sound and rendering off except for the last frame of each step
+            transport: Link to controller.lua: 'udp', 'tcp' or 'unix' (see
+                src/core/transport.py)
+            memory_map: RAM fields read every step (None disables RAM reads)
+            state_classifier: Screen classifier driving the state manager
+                (defaults to GameStateClassifier.default())
+            snapshot_pool_size: Maximum number of in-memory snapshots kept
+                for reset(options={"snapshot": key})
+            preprocess: Observation preprocessing (grayscale, downscale, crop,
+                frame stacking); defaults to full-resolution RGB
+            tile_index: Tile index (or path to its .npy table) used to encode
+                each screen as an (11, 15) uint16 tile-ID grid in info["tile_ids"]
+            visit_counter: Exploration counter rewarding new (map, x, y) cells;
+                may be shared by several envs. Defaults to a private one when
+                novelty_reward is on and the memory map has position fields.
+            novelty_reward: Reward new cells with visit_counter. The reward
+                reads RAM every step; turn it off for observations without RAM
+            env_index: This env's row in a shared visit_counter
+            emulator_factory: Called with the paths, save_state, lockstep, turbo
+                and transport to build the emulator; e.g. FakeBizHawkEmulator to run headless
+            metrics: Registry for per-phase step timings and emulator
+                transport counters (also reported as info["timings"]);
+                None disables all instrumentation
+            observation: Channels of a Dict observation (ObservationConfig or
+                names from 'pixels', 'ram', 'tiles', 'state'). Only what they
+                need is fetched: no screen without pixels/tiles/state, no RAM
+                read without 'ram' or novelty_reward. None keeps the
+                plain pixel Box observation.
         """
         super().__init__()
         
         # Initialize components
-        self.emulator = BizHawkEmulator(bizhawk_path, rom_path, lua_path, save_state)
+        self.emulator = emulator_factory(
+            bizhawk_path, rom_path, lua_path, save_state, lockstep=lockstep, turbo=turbo,
+            transport=transport
+        )
+        self.frameskip = frameskip
+        self.memory_map = memory_map
+        self.state_classifier = state_classifier or GameStateClassifier.default()
         self.state_manager = StateManager()
         self.image_processor = ImageProcessor()
+        self.pipeline = FramePipeline(preprocess or PreprocessConfig())
+        if tile_index is not None and not isinstance(tile_index, TileIndex):
+            tile_index = TileIndex(tile_index)
+        self.tile_index = tile_index
+        self.tile_grid = TileGrid() if tile_index is not None else None
+        if visit_counter is not None and not novelty_reward:
+            raise ValueError("visit_counter is only used with novelty_reward=True")
+        position_fields = {'map_bank', 'map_number', 'x', 'y'}
+        if (novelty_reward and visit_counter is None and memory_map is not None
+                and position_fields <= set(memory_map.dtype.names)):
+            visit_counter = VisitCounter()
+        self.visit_counter = visit_counter
+        self.env_index = env_index
+        self.snapshots = SnapshotPool(self.emulator, max_size=snapshot_pool_size)
+        self.metrics = metrics
+        self._timer = None
+        if metrics is not None:
+            self.emulator.set_metrics(metrics)
+            self._timer = PhaseTimer(metrics, 'step_phase_seconds', self.PHASES)
         
         # Define action and observation spaces
         self.action_space = spaces.Discrete(len(self.ACTIONS))
-        self.observation_space = spaces.Box(
-            low=0,
-            high=255,
-            shape=(160, 240, 3),  # GBA resolution, RGB
-            dtype=np.uint8
-        )
+        self.composer = None
+        if observation is None:
+            self.observation_space = spaces.Box(
+                low=0,
+                high=255,
+                shape=self.pipeline.observation_shape,  # (160, 240, 3) RGB unless preprocessed
+                dtype=np.uint8
+            )
+        else:
+            if not isinstance(observation, ObservationConfig):
+                observation = ObservationConfig(observation)
+            if 'tiles' in observation.channels and tile_index is None:
+                raise ValueError("The 'tiles' channel needs a tile_index")
+            self.composer = ObservationComposer(observation, self.pipeline.observation_shape, memory_map)
+            self.observation_space = self.composer.space
+        
+        # What each step fetches from the emulator, in one round trip
+        self._fetch_screen = self.composer is None or observation.needs_screen
+        self._preprocess = self.composer is None or 'pixels' in observation.channels
+        fetch_ram = self.composer is None or observation.needs_ram or visit_counter is not None
+        self._step_memory_map = memory_map if fetch_ram else None
         
         # Environment state
+        self.current_frame = None
         self.current_screen = None
+        self.tile_ids = np.zeros((11, 15), dtype=np.uint16)
+        self.ram = None
         self.steps_taken = 0
         self.max_steps = 1000  # Configurable
         
     def reset(self, *, seed=None, options=None) -> Tuple[np.ndarray, Dict[str, Any]]:
-        """Reset environment to initial state."""
+        """
+        Reset environment to initial state.
+        
+        Pass options={"snapshot": key} to restore a snapshot taken with
+        snapshot() first; this happens in memory and takes milliseconds.
+        Pass options={"savestate": path} to start from a savestate file.
+        """
         super().reset(seed=seed)
         
+        if options and options.get("snapshot") is not None:
+            self.snapshots.restore(options["snapshot"])
+        elif options and options.get("savestate") is not None:
+            self.emulator.load_state(options["savestate"])
+        
         # Reset internal state
         self.steps_taken = 0
         self.state_manager = StateManager()
         
         # Get initial observation
-        self.current_screen = self._get_observation()
+        self._observe_current()
+        self._update_game_state()
+        self._update_tile_ids()
         
-        return self.current_screen, {}
+        # New episode: forget per-episode visits and mark the start cell
+        if self.visit_counter is not None:
+            self.visit_counter.reset_episode(self.env_index)
+            self._calculate_reward()
+        
+        info = {'ram': self.ram}
+        if self.tile_index is not None:
+            info['tile_ids'] = self.tile_ids
+        return self._observation(), info
         
     def step(self, action: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
         """
@@ -93,15 +216,38 @@ class PokemonFireRedEnv(gym.Env):
             truncated: Whether episode was truncated
             info: Additional information
         """
-        # Execute action
-        if action in self.ACTIONS:
-            self.emulator.press_button(self.ACTIONS[action])
+        timer = self._timer
+        if timer is not None:
+            timer.start()
+        
+        # Execute action for exactly `frameskip` frames; the screen and RAM
+        # this step needs come back with the emulator's ack
+        frame, ram = self.emulator.step_observe(
+            self.ACTIONS.get(action), self.frameskip,
+            screen=self._fetch_screen, memory_map=self._step_memory_map, timer=timer
+        )
         
         # Get new observation
-        self.current_screen = self._get_observation()
+        if frame is not None:
+            self._process_frame(frame)
+        if ram is not None:
+            self.ram = ram
+        if timer is not None:
+            timer.lap('decode')
         
         # Update state and get reward
+        self._update_game_state()
+        if timer is not None:
+            timer.lap('state')
+        self._update_tile_ids()
+        if timer is not None:
+            timer.lap('tiles')
         reward = self._calculate_reward()
+        if timer is not None:
+            timer.lap('reward')
+        observation = self._observation()
+        if timer is not None:
+            timer.lap('compose')
         
         # Check if episode is done
         self.steps_taken += 1
@@ -111,27 +257,128 @@ class PokemonFireRedEnv(gym.Env):
         # Additional info
         info = {
             'steps': self.steps_taken,
-            'state': self.state_manager.get_state_data()
+            'frame': self.emulator.frame_count,
+            'state': self.state_manager.get_state_data(),
+            'ram': self.ram
         }
+        if self.tile_index is not None:
+            info['tile_ids'] = self.tile_ids
+        if timer is not None:
+            info['timings'] = dict(timer.timings, total=timer.stop())
+            self.metrics.maybe_write()
         
-        return self.current_screen, reward, terminated, truncated, info
+        return observation, reward, terminated, truncated, info
+    
+    def snapshot(self, key: Optional[Hashable] = None) -> Hashable:
+        """Save the current emulator state in memory; returns the key for reset()."""
+        return self.snapshots.snapshot(key)
+    
+    def checkpoint_state(self) -> Dict[str, np.ndarray]:
+        """
+        Everything an env checkpoint holds besides the emulator savestate.
+        
+        Returns:
+            Arrays for the step counter, the RNG state (as JSON), the
+            StateManager data (keys prefixed 'state_') and, with a visit
+            counter, this env's per-episode visits and the map keys they
+            belong to
+        """
+        state = {f'state_{k}': v for k, v in self.state_manager.state_dict().items()}
+        state['steps_taken'] = np.array(self.steps_taken)
+        state['rng'] = np.array(json.dumps(self.np_random.bit_generator.state))
+        if self.visit_counter is not None:
+            state['episode_map_keys'], state['episode_visits'] = self.visit_counter.episode_state(self.env_index)
+        return state
+    
+    def restore_checkpoint_state(self, state: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Apply checkpoint_state() output once the emulator savestate is loaded.
+        
+        Returns:
+            Observation and info, as from reset()
+        """
+        self.state_manager = StateManager()
+        self.state_manager.load_state_dict({k[len('state_'):]: v for k, v in state.items() if k.startswith('state_')})
+        self.steps_taken = int(state['steps_taken'])
+        rng_state = json.loads(str(state['rng']))
+        generator = np.random.Generator(getattr(np.random, rng_state['bit_generator'])())
+        generator.bit_generator.state = rng_state
+        self.np_random = generator
+        if self.visit_counter is not None and 'episode_visits' in state:
+            self.visit_counter.restore_episode(self.env_index, state['episode_map_keys'], state['episode_visits'])
+        
+        self._observe_current()
+        self._update_tile_ids()
+        info = {'steps': self.steps_taken, 'ram': self.ram}
+        if self.tile_index is not None:
+            info['tile_ids'] = self.tile_ids
+        return self._observation(), info
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of step timings and emulator counters ({} when metrics are disabled)."""
+        return self.metrics.snapshot() if self.metrics is not None else {}
     
     def render(self):
-        """Return current screen."""
-        return self.current_screen
+        """Return current full-resolution RGB screen."""
+        return self.current_frame
         
     def close(self):
         """Clean up environment."""
+        if self.tile_index is not None and self.tile_index.dirty and self.tile_index.path:
+            self.tile_index.save()
         if self.emulator:
             self.emulator.close()
     
-    def _get_observation(self) -> np.ndarray:
-        """Get current game screen."""
-        screen_data = self.emulator.get_screen()
-        screen = self.image_processor.decode_screenshot(screen_data)
-        return self.image_processor.normalize_size(screen)
+    def _observe_current(self) -> None:
+        """Fetch the screen and RAM the observation needs outside of step()."""
+        if self._fetch_screen:
+            self._process_frame(self.emulator.get_screen(), reset=True)
+        if self._step_memory_map is not None:
+            self.ram = self.emulator.read_memory(self._step_memory_map)
+    
+    def _process_frame(self, frame: np.ndarray, reset: bool = False) -> None:
+        """Take a new screen and preprocess it into the pixel observation buffer."""
+        # Raw RGB frame straight from the emulator's receive buffer, no decode step
+        self.current_frame = frame
+        if not self._preprocess:
+            return
+        if reset:
+            self.current_screen = self.pipeline.reset(frame)
+        elif self.emulator.frame_changed or self.pipeline.config.frame_stack > 1:
+            self.current_screen = self.pipeline(frame)
+        # Otherwise the screen is static: the emulator skipped the transfer, keep the last observation
+    
+    def _observation(self) -> Union[np.ndarray, Dict[str, np.ndarray]]:
+        """The pixel observation, or the configured Dict channels."""
+        if self.composer is None:
+            return self.current_screen
+        return self.composer.compose(self.current_screen, self.ram, self.tile_ids, self.state_manager.current_state)
+    
+    def _update_game_state(self) -> None:
+        """Classify the current screen and record state changes."""
+        if self.current_frame is not None:
+            state = self.state_classifier.classify(self.current_frame)
+        else:
+            # RAM-only observations: only the battle flag below is known
+            state = GameState.UNKNOWN
+        # The RAM battle flag is authoritative when available
+        if self.ram is not None and 'battle_flags' in self.ram.dtype.names and in_battle(self.ram):
+            state = GameState.BATTLE
+        self.state_manager.update_state(state)
+    
+    def _update_tile_ids(self) -> None:
+        """Encode the current screen as a grid of tile IDs."""
+        if self.tile_index is None or self.current_frame is None or not self.emulator.frame_changed:
+            return
+        self.tile_grid.update(self.current_frame)
+        self.tile_index.encode(self.tile_grid.hashes(), out=self.tile_ids)
     
     def _calculate_reward(self) -> float:
         """Calculate reward based on current state."""
-        # Implement reward calculation based on game events
-        return 0.0  # Placeholder
\ No newline at end of file
+        reward = 0.0
+        if self.visit_counter is not None and self.ram is not None:
+            ram = self.ram
+            reward += float(self.visit_counter.update(
+                ram['map_bank'], ram['map_number'], ram['x'], ram['y'], env_ids=self.env_index
+            )[0])
+        return reward
\ No newline at end of file
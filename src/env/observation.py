@@ -0,0 +1,123 @@
+"""Dict observations composed from pixels, RAM, tile IDs and the game state."""
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+from gymnasium import spaces
+
+from ..core.memory_map import MemoryMap
+from ..core.state_manager import GameState, N_STATES
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('pixels', 'ram', 'tiles', 'state')
+# Channels computed from the screen; without any of them no screen is fetched
+SCREEN_CHANNELS = frozenset(('pixels', 'tiles', 'state'))
+
+
+class ObservationConfig:
+    """Which channels make up a Dict observation."""
+
+    def __init__(self, channels: Sequence[str] = ('pixels',), ram_fields: Optional[Sequence[str]] = None):
+        """
+        Args:
+            channels: Any of 'pixels' (preprocessed screen), 'ram' (float32
+                vector of memory map fields), 'tiles' ((11, 15) uint16 tile-ID
+                grid) and 'state' (float32 GameState one-hot)
+            ram_fields: Memory map fields in the 'ram' vector, in order;
+                defaults to every field (array fields are flattened)
+        """
+        unknown = set(channels) - set(CHANNELS)
+        if unknown or not channels:
+            raise ValueError(f"Channels must be a non-empty subset of {CHANNELS}, got {tuple(channels)}")
+        self.channels = tuple(channels)
+        self.ram_fields = tuple(ram_fields) if ram_fields else None
+
+    @property
+    def needs_screen(self) -> bool:
+        return not SCREEN_CHANNELS.isdisjoint(self.channels)
+
+    @property
+    def needs_ram(self) -> bool:
+        return 'ram' in self.channels
+
+
+class ObservationComposer:
+    """Builds the Dict observation for an ObservationConfig.
+
+    Every channel is written into a buffer allocated once, so compose()
+    returns the same arrays on every call; copy them to keep them.
+    """
+
+    def __init__(
+        self,
+        config: ObservationConfig,
+        pixel_shape: Tuple[int, ...],
+        memory_map: Optional[MemoryMap] = None,
+        tile_shape: Tuple[int, int] = (11, 15)
+    ):
+        """
+        Args:
+            config: Requested channels
+            pixel_shape: Shape of the preprocessed screen (FramePipeline.observation_shape)
+            memory_map: Memory map the 'ram' channel is taken from
+            tile_shape: Shape of the tile-ID grid
+        """
+        self.config = config
+        channels = config.channels
+        space: Dict[str, spaces.Space] = {}
+        if 'pixels' in channels:
+            space['pixels'] = spaces.Box(0, 255, pixel_shape, dtype=np.uint8)
+        self._ram_slices: List[Tuple[str, slice]] = []
+        if 'ram' in channels:
+            if memory_map is None:
+                raise ValueError("The 'ram' channel needs a memory map")
+            names = config.ram_fields or memory_map.dtype.names
+            offset = 0
+            for name in names:
+                if name not in memory_map.dtype.names:
+                    raise ValueError(f"Memory map has no field {name!r}")
+                size = int(np.prod(memory_map.dtype[name].shape, dtype=np.int64))
+                self._ram_slices.append((name, slice(offset, offset + size)))
+                offset += size
+            self._ram = np.zeros(offset, dtype=np.float32)
+            space['ram'] = spaces.Box(-np.inf, np.inf, (offset,), dtype=np.float32)
+        if 'tiles' in channels:
+            space['tiles'] = spaces.Box(0, np.iinfo(np.uint16).max, tile_shape, dtype=np.uint16)
+        if 'state' in channels:
+            self._state = np.zeros(N_STATES, dtype=np.float32)
+            space['state'] = spaces.Box(0.0, 1.0, (N_STATES,), dtype=np.float32)
+        self.space = spaces.Dict(space)
+
+    def compose(
+        self,
+        pixels: Optional[np.ndarray],
+        ram: Optional[np.void],
+        tile_ids: Optional[np.ndarray],
+        state: GameState
+    ) -> Dict[str, np.ndarray]:
+        """
+        Assemble the requested channels.
+
+        Args:
+            pixels: Preprocessed screen
+            ram: RAM record from read_memory()
+            tile_ids: Tile-ID grid
+            state: Current game state
+        """
+        observation = {}
+        channels = self.config.channels
+        if 'pixels' in channels:
+            observation['pixels'] = pixels
+        if self._ram_slices:
+            out = self._ram
+            for name, where in self._ram_slices:
+                out[where] = ram[name]
+            observation['ram'] = out
+        if 'tiles' in channels:
+            observation['tiles'] = tile_ids
+        if 'state' in channels:
+            self._state[:] = 0.0
+            self._state[state.value - 1] = 1.0
+            observation['state'] = self._state
+        return observation
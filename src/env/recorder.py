@@ -0,0 +1,295 @@
+"""Chunked trajectory recording with a background writer, and a memory-mapped reader."""
+from typing import Any, Dict, List, Optional, Union
+from collections import OrderedDict
+from pathlib import Path
+import json
+import logging
+import queue
+import threading
+
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+# Bumped whenever the meaning of a column changes; 2: 'state' holds StateManager codes
+FORMAT_VERSION = 2
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """Records every transition of a PokemonFireRedEnv to chunked files on disk.
+
+    Transitions are copied into a preallocated chunk buffer. Full chunks go
+    through a bounded queue to a writer thread, and the buffer comes back
+    once it is written, so step() never waits on disk unless the writer
+    falls a whole queue behind.
+
+    Each row holds the observation the action was taken on, the action, the
+    resulting reward and termination flags, the StateManager state code
+    (GameState.value - 1) and the emulator frame number after the step.
+    Dict observations are stored as one field per key, named
+    'observation.<key>'. Uncompressed chunks are directories of .npy files
+    that TrajectoryReader memory-maps; compressed chunks are single .npz
+    files that are decompressed on access.
+    """
+
+    def __init__(
+        self,
+        env: gym.Env,
+        directory: Union[str, Path],
+        chunk_size: int = 4096,
+        queue_size: int = 4,
+        compress: bool = False
+    ):
+        """
+        Args:
+            env: Environment to record (a PokemonFireRedEnv or wrapper of one)
+            directory: Output directory; chunks are numbered after existing
+                ones, which must have been recorded with the same fields
+            chunk_size: Transitions per chunk file
+            queue_size: Full chunks allowed to wait for the writer
+            compress: Write zlib-compressed .npz chunks instead of raw .npy
+        """
+        super().__init__(env)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.compress = compress
+
+        obs_space = env.observation_space
+        if isinstance(obs_space, spaces.Dict):
+            self._obs_fields = {key: f'observation.{key}' for key in obs_space.spaces}
+            obs_spaces = {f'observation.{key}': sub for key, sub in obs_space.spaces.items()}
+        else:
+            self._obs_fields = None
+            obs_spaces = {'observation': obs_space}
+        for name, space in obs_spaces.items():
+            if space.shape is None:
+                raise ValueError(f"Cannot record {name} from a {type(space).__name__} space; Box-like spaces only")
+        self._fields = {
+            **{name: (space.shape, space.dtype) for name, space in obs_spaces.items()},
+            'action': ((), np.int64),
+            'reward': ((), np.float32),
+            'terminated': ((), np.bool_),
+            'truncated': ((), np.bool_),
+            'state': ((), np.uint8),
+            'frame': ((), np.int64),
+            'episode': ((), np.int64),
+        }
+        self._write_meta()
+
+        # One buffer being filled, the rest recycled between step() and the writer
+        self._free: 'queue.Queue[Dict[str, np.ndarray]]' = queue.Queue()
+        for _ in range(queue_size + 1):
+            self._free.put(self._allocate())
+        self._queue: 'queue.Queue[Optional[tuple]]' = queue.Queue(maxsize=queue_size)
+        self._buffer = self._free.get()
+        self._rows = 0
+        self._chunk = len(_list_chunks(self.directory))
+        self._episode = -1
+        # Owned copies: the env reuses its observation buffers on the next step
+        self._last_obs = {name: np.empty(space.shape, dtype=space.dtype) for name, space in obs_spaces.items()}
+        self._error: Optional[BaseException] = None
+
+        self._writer = threading.Thread(target=self._write_loop, name='trajectory-writer', daemon=True)
+        self._writer.start()
+
+    def _allocate(self) -> Dict[str, np.ndarray]:
+        return {
+            name: np.empty((self.chunk_size,) + tuple(shape), dtype=dtype)
+            for name, (shape, dtype) in self._fields.items()
+        }
+
+    def _write_meta(self) -> None:
+        meta = {
+            'format': FORMAT_VERSION,
+            'fields': {name: [list(shape), np.dtype(dtype).str] for name, (shape, dtype) in self._fields.items()},
+            'chunk_size': self.chunk_size,
+        }
+        path = self.directory / META_FILE
+        if path.exists():
+            # Appending: existing chunks must share the layout the reader will assume
+            with open(path) as f:
+                existing = json.load(f)
+            if existing.get('format') != meta['format'] or existing.get('fields') != meta['fields']:
+                raise ValueError(
+                    f"{self.directory} holds trajectories with a different layout "
+                    f"(format {existing.get('format')}); record into a new directory"
+                )
+        with open(path, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._episode += 1
+        self._keep_observation(obs)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        if self._error is not None:
+            raise RuntimeError("Trajectory writer failed") from self._error
+
+        row, buf = self._rows, self._buffer
+        for name, last in self._last_obs.items():
+            buf[name][row] = last
+        buf['action'][row] = action
+        buf['reward'][row] = reward
+        buf['terminated'][row] = terminated
+        buf['truncated'][row] = truncated
+        buf['state'][row] = self.env.unwrapped.state_manager.current_state.value - 1
+        buf['frame'][row] = info.get('frame', -1)
+        buf['episode'][row] = self._episode
+        self._rows += 1
+        if self._rows == self.chunk_size:
+            self._flush()
+
+        self._keep_observation(obs)
+        return obs, reward, terminated, truncated, info
+
+    def _keep_observation(self, obs) -> None:
+        if self._obs_fields is None:
+            np.copyto(self._last_obs['observation'], obs)
+        else:
+            for key, name in self._obs_fields.items():
+                np.copyto(self._last_obs[name], obs[key])
+
+    def _flush(self) -> None:
+        """Hand the current buffer to the writer and take a recycled one."""
+        if not self._rows:
+            return
+        self._queue.put((self._chunk, self._buffer, self._rows))
+        self._chunk += 1
+        self._buffer = self._free.get()
+        self._rows = 0
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            index, buffer, rows = item
+            try:
+                self._write_chunk(index, buffer, rows)
+            except BaseException as e:
+                logger.error(f"Failed to write trajectory chunk {index}: {e}")
+                self._error = e
+            finally:
+                self._free.put(buffer)
+
+    def _write_chunk(self, index: int, buffer: Dict[str, np.ndarray], rows: int) -> None:
+        name = _chunk_name(index)
+        if self.compress:
+            tmp = self.directory / f'.{name}.npz'
+            np.savez_compressed(tmp, **{k: v[:rows] for k, v in buffer.items()})
+            tmp.rename(self.directory / f'{name}.npz')
+        else:
+            tmp = self.directory / f'.{name}'
+            tmp.mkdir(exist_ok=True)
+            for field, values in buffer.items():
+                np.save(tmp / f'{field}.npy', values[:rows])
+            tmp.rename(self.directory / name)
+        logger.debug(f"Wrote trajectory chunk {name} ({rows} rows)")
+
+    def close(self):
+        """Flush the partial chunk, wait for the writer and close the env."""
+        if self._writer.is_alive():
+            self._flush()
+            self._queue.put(None)
+            self._writer.join()
+        super().close()
+
+
+class TrajectoryReader:
+    """Random access over chunks written by TrajectoryRecorder.
+
+    Uncompressed chunks are opened with np.load(mmap_mode='r'), so only the
+    rows actually touched are read from disk. Compressed chunks are
+    decompressed whole and kept in a small LRU cache.
+    """
+
+    def __init__(self, directory: Union[str, Path], cache_chunks: int = 4):
+        """
+        Args:
+            directory: Directory written by TrajectoryRecorder
+            cache_chunks: Decompressed .npz chunks kept in memory
+        """
+        self.directory = Path(directory)
+        with open(self.directory / META_FILE) as f:
+            self.meta = json.load(f)
+        self.fields = list(self.meta['fields'])
+        self.chunks = _list_chunks(self.directory)
+        self._cache: 'OrderedDict[Path, Dict[str, np.ndarray]]' = OrderedDict()
+        self._cache_chunks = cache_chunks
+
+        lengths = [self._chunk_length(path) for path in self.chunks]
+        self._starts = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    def _chunk_length(self, path: Path) -> int:
+        if path.suffix == '.npz':
+            with np.load(path) as data:
+                return len(data['reward'])
+        return len(np.load(path / 'reward.npy', mmap_mode='r'))
+
+    def chunk(self, index: int) -> Dict[str, np.ndarray]:
+        """All fields of one chunk (memory-mapped when uncompressed)."""
+        path = self.chunks[index]
+        cached = self._cache.get(path)
+        if cached is not None:
+            self._cache.move_to_end(path)
+            return cached
+        if path.suffix == '.npz':
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in self.fields}
+        else:
+            arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in self.fields}
+        self._cache[path] = arrays
+        if len(self._cache) > self._cache_chunks:
+            self._cache.popitem(last=False)
+        return arrays
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        chunk = int(np.searchsorted(self._starts, index, side='right')) - 1
+        row = index - int(self._starts[chunk])
+        return {name: values[row] for name, values in self.chunk(chunk).items()}
+
+    def gather(self, indices: np.ndarray, fields: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Fetch rows by global index into freshly stacked arrays, one read per chunk."""
+        indices = np.asarray(indices, dtype=np.int64)
+        fields = fields or self.fields
+        chunk_ids = np.searchsorted(self._starts, indices, side='right') - 1
+        out = None
+        for chunk in np.unique(chunk_ids):
+            mask = chunk_ids == chunk
+            rows = indices[mask] - self._starts[chunk]
+            arrays = self.chunk(int(chunk))
+            if out is None:
+                out = {
+                    name: np.empty((len(indices),) + arrays[name].shape[1:], dtype=arrays[name].dtype)
+                    for name in fields
+                }
+            for name in fields:
+                out[name][mask] = arrays[name][rows]
+        return out if out is not None else {}
+
+    def sample(self, batch_size: int, rng: Optional[np.random.Generator] = None) -> Dict[str, np.ndarray]:
+        """Uniformly sample a batch of transitions."""
+        rng = rng or np.random.default_rng()
+        return self.gather(rng.integers(0, len(self), size=batch_size))
+
+
+def _chunk_name(index: int) -> str:
+    return f'chunk_{index:06d}'
+
+
+def _list_chunks(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.glob('chunk_*') if p.is_dir() or p.suffix == '.npz')
@@ -0,0 +1,429 @@
+"""Batched Pokemon FireRed environments running several emulators at once."""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import functools
+import logging
+import multiprocessing as mp
+import os
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector.utils import batch_space
+
+from .game_env import PokemonFireRedEnv
+
+logger = logging.getLogger(__name__)
+
+EnvFn = Callable[[], PokemonFireRedEnv]
+
+
+class SyncFireRedVectorEnv:
+    """Steps N environments one after another in the current process.
+
+    Each environment owns its own BizHawkEmulator, which binds an OS-assigned
+    port, so the instances never collide. Observations are stacked into a
+    preallocated (N, 160, 240, 3) buffer (one per key for Dict observations)
+    that is overwritten on every call.
+    Episodes that end are reset automatically; the last observation of the
+    finished episode is reported as info["final_observation"].
+    """
+
+    def __init__(self, env_fns: Sequence[EnvFn]):
+        """
+        Args:
+            env_fns: Callables that each build one PokemonFireRedEnv
+        """
+        self.envs = [fn() for fn in env_fns]
+        self.num_envs = len(self.envs)
+        self.single_observation_space = self.envs[0].observation_space
+        self.single_action_space = self.envs[0].action_space
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+        self._observations = _allocate_batch(self.single_observation_space, self.num_envs)
+
+    def reset(self, *, seed=None, options=None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Reset all environments; returns stacked observations and per-env infos."""
+        infos = []
+        for i, env in enumerate(self.envs):
+            obs, info = env.reset(seed=_env_seed(seed, i), options=options)
+            _write_batch(self._observations, i, obs)
+            infos.append(info)
+        return self._observations, infos
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Step all environments with one action each."""
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            obs, rewards[i], terminated[i], truncated[i], info = _step_autoreset(env, action)
+            _write_batch(self._observations, i, obs)
+            infos.append(info)
+        return self._observations, rewards, terminated, truncated, infos
+
+    def get_metrics(self) -> List[Dict[str, Dict[str, Any]]]:
+        """PokemonFireRedEnv.get_metrics() of every environment."""
+        return [env.get_metrics() for env in self.envs]
+
+    def close(self) -> None:
+        """Close every environment."""
+        for env in self.envs:
+            try:
+                env.close()
+            except Exception as e:
+                logger.error(f"Failed to close environment: {e}")
+
+
+class SharedObservationRing:
+    """Observation slots in shared memory, laid out (ring_size, num_envs, *obs_shape).
+
+    The parent creates the block; workers attach to it by name and write
+    their env's observation for a step into ring[slot, index], so frames
+    never go through a pipe. ring[slot] is then the batched observation,
+    readable without a copy.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype, num_envs: int, ring_size: int = 2, name: Optional[str] = None):
+        """
+        Args:
+            shape: Shape of one env's observation
+            dtype: Observation dtype
+            num_envs: Envs per slot
+            ring_size: Number of slots cycled through
+            name: Existing block to attach to; None creates (and owns) a new one
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.num_envs = num_envs
+        self.ring_size = ring_size
+        full_shape = (ring_size, num_envs) + self.shape
+        self.owner = name is None
+        nbytes = int(np.prod(full_shape)) * self.dtype.itemsize
+        # Workers inherit the parent's resource tracker (started before they
+        # are), so the block is tracked once and only the owner's unlink() frees it
+        self.shm = SharedMemory(name=name, create=self.owner, size=nbytes if self.owner else 0)
+        self.array = np.ndarray(full_shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self) -> tuple:
+        """Picklable arguments for attach() in another process."""
+        return self.shape, self.dtype.str, self.num_envs, self.ring_size, self.shm.name
+
+    @classmethod
+    def attach(cls, spec: tuple) -> 'SharedObservationRing':
+        shape, dtype, num_envs, ring_size, name = spec
+        return cls(shape, dtype, num_envs, ring_size, name=name)
+
+    def close(self) -> None:
+        """Release the mapping; the owner also frees the block."""
+        if self.array is None:
+            return
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class AsyncFireRedVectorEnv:
+    """Runs each environment in its own worker process.
+
+    Commands are broadcast to all workers before any reply is collected, so
+    the emulators step concurrently and a rollout box can use every core.
+    Same interface and autoreset semantics as SyncFireRedVectorEnv.
+
+    By default observations travel through a SharedObservationRing (one per
+    key for Dict observations) and only rewards, flags and infos are
+    pickled. The returned batch is a view of one ring slot: it stays valid
+    for the next ring_size - 1 calls, after which the slot is overwritten.
+    """
+
+    def __init__(
+        self,
+        env_fns: Sequence[EnvFn],
+        context: Optional[str] = None,
+        shared_memory: bool = True,
+        ring_size: int = 2
+    ):
+        """
+        Args:
+            env_fns: Picklable callables that each build one PokemonFireRedEnv
+            context: multiprocessing start method (defaults to the platform's)
+            shared_memory: Pass observations through shared memory instead
+                of pickling them through the pipes
+            ring_size: Shared-memory slots; a returned batch survives
+                ring_size - 1 further reset()/step() calls
+        """
+        ctx = mp.get_context(context)
+        if shared_memory and os.name == 'posix':
+            # Start the tracker now so every worker shares it; a worker that
+            # started its own would unlink the ring when it exits
+            resource_tracker.ensure_running()
+        self.num_envs = len(env_fns)
+        self.remotes, self.processes = [], []
+        for env_fn in env_fns:
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(child, parent, env_fn), daemon=True)
+            process.start()
+            child.close()
+            self.remotes.append(parent)
+            self.processes.append(process)
+        self.closed = False
+
+        self._broadcast([("spaces", None)] * self.num_envs)
+        self.single_observation_space, self.single_action_space = self._gather()[0]
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+        self._ring = None
+        self._ring_size = ring_size
+        self._slot = 0
+        if shared_memory:
+            self._ring = _allocate_rings(self.single_observation_space, self.num_envs, ring_size)
+            spec = _ring_specs(self._ring)
+            self._broadcast([("attach", (spec, i)) for i in range(self.num_envs)])
+            self._gather()
+        else:
+            self._observations = _allocate_batch(self.single_observation_space, self.num_envs)
+
+    def _next_slot(self) -> int:
+        if self._ring is not None:
+            self._slot = (self._slot + 1) % self._ring_size
+        return self._slot
+
+    def _batch(self, slot: int, observations: List[Optional[np.ndarray]]) -> np.ndarray:
+        """Batched observations: ring slot views, or the pipe results copied into one buffer."""
+        if self._ring is not None:
+            return _ring_slot(self._ring, slot)
+        for i, obs in enumerate(observations):
+            _write_batch(self._observations, i, obs)
+        return self._observations
+
+    def reset(self, *, seed=None, options=None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Reset all environments; returns stacked observations and per-env infos."""
+        slot = self._next_slot()
+        self._broadcast([("reset", (_env_seed(seed, i), options, slot)) for i in range(self.num_envs)])
+        observations, infos = zip(*self._gather())
+        return self._batch(slot, observations), list(infos)
+
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Step all environments concurrently with one action each."""
+        slot = self._next_slot()
+        self._broadcast([("step", (action, slot)) for action in actions])
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        observations, infos = [], []
+        for i, (obs, rewards[i], terminated[i], truncated[i], info) in enumerate(self._gather()):
+            observations.append(obs)
+            infos.append(info)
+        return self._batch(slot, observations), rewards, terminated, truncated, infos
+
+    def get_metrics(self) -> List[Dict[str, Dict[str, Any]]]:
+        """PokemonFireRedEnv.get_metrics() of every environment."""
+        self._broadcast([("metrics", None)] * self.num_envs)
+        return self._gather()
+
+    def close(self) -> None:
+        """Shut down all workers and their emulators."""
+        if self.closed:
+            return
+        self.closed = True
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for remote, process in zip(self.remotes, self.processes):
+            try:
+                remote.recv()
+            except (BrokenPipeError, EOFError):
+                pass
+            remote.close()
+            process.join(timeout=10.0)
+            if process.is_alive():
+                process.terminate()
+        if self._ring is not None:
+            _close_rings(self._ring)
+
+    def _broadcast(self, commands: List[Tuple[str, Any]]) -> None:
+        for remote, command in zip(self.remotes, commands):
+            remote.send(command)
+
+    def _gather(self) -> List[Any]:
+        results = [remote.recv() for remote in self.remotes]
+        for ok, payload in results:
+            if not ok:
+                raise RuntimeError(f"Environment worker failed: {payload}")
+        return [payload for _, payload in results]
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
+
+
+def make_vector_env(
+    num_envs: int,
+    bizhawk_path,
+    rom_path,
+    lua_path,
+    asynchronous: bool = False,
+    **env_kwargs
+):
+    """
+    Build a vector of PokemonFireRedEnv instances, one emulator each.
+
+    Args:
+        num_envs: Number of emulator instances
+        bizhawk_path: Path to BizHawk executable
+        rom_path: Path to Pokemon FireRed ROM
+        lua_path: Path to Lua control script
+        asynchronous: Run each env in a subprocess instead of in-process
+        **env_kwargs: Extra PokemonFireRedEnv arguments (save_state, frameskip, ...).
+            A visit_counter is shared: env i records its episode visits in
+            row i, so it needs at least num_envs rows
+    """
+    counter = env_kwargs.get('visit_counter')
+    if counter is not None and counter.num_envs < num_envs:
+        raise ValueError(f"visit_counter has rows for {counter.num_envs} envs, need {num_envs}")
+    # Without a shared counter each env keeps a private one-row counter
+    env_fns = [
+        functools.partial(
+            PokemonFireRedEnv, bizhawk_path, rom_path, lua_path,
+            env_index=i if counter is not None else 0, **env_kwargs
+        )
+        for i in range(num_envs)
+    ]
+    if asynchronous:
+        return AsyncFireRedVectorEnv(env_fns)
+    return SyncFireRedVectorEnv(env_fns)
+
+
+def _allocate_batch(space, num_envs: int):
+    if isinstance(space, spaces.Dict):
+        return {key: _allocate_batch(sub, num_envs) for key, sub in space.spaces.items()}
+    return np.zeros((num_envs,) + space.shape, dtype=space.dtype)
+
+
+def _write_batch(batch, index: int, obs) -> None:
+    if isinstance(batch, dict):
+        for key, array in batch.items():
+            array[index] = obs[key]
+    else:
+        batch[index] = obs
+
+
+def _allocate_rings(space, num_envs: int, ring_size: int):
+    if isinstance(space, spaces.Dict):
+        return {key: _allocate_rings(sub, num_envs, ring_size) for key, sub in space.spaces.items()}
+    return SharedObservationRing(space.shape, space.dtype, num_envs, ring_size)
+
+
+def _ring_specs(rings):
+    if isinstance(rings, dict):
+        return {key: _ring_specs(ring) for key, ring in rings.items()}
+    return rings.spec
+
+
+def _attach_rings(specs):
+    if isinstance(specs, dict):
+        return {key: _attach_rings(spec) for key, spec in specs.items()}
+    return SharedObservationRing.attach(specs)
+
+
+def _ring_slot(rings, slot: int):
+    if isinstance(rings, dict):
+        return {key: _ring_slot(ring, slot) for key, ring in rings.items()}
+    return rings.array[slot]
+
+
+def _write_rings(rings, slot: int, index: int, obs) -> None:
+    if isinstance(rings, dict):
+        for key, ring in rings.items():
+            _write_rings(ring, slot, index, obs[key])
+    else:
+        rings.array[slot, index] = obs
+
+
+def _close_rings(rings) -> None:
+    if isinstance(rings, dict):
+        for ring in rings.values():
+            _close_rings(ring)
+    else:
+        rings.close()
+
+
+def _copy_observation(obs):
+    if isinstance(obs, dict):
+        return {key: np.array(value) for key, value in obs.items()}
+    return np.array(obs)
+
+
+def _env_seed(seed: Optional[int], index: int) -> Optional[int]:
+    return None if seed is None else seed + index
+
+
+def _step_autoreset(env: PokemonFireRedEnv, action):
+    obs, reward, terminated, truncated, info = env.step(action)
+    if terminated or truncated:
+        info["final_observation"] = _copy_observation(obs)
+        obs, reset_info = env.reset()
+        info["reset_info"] = reset_info
+    return obs, reward, terminated, truncated, info
+
+
+def _worker(remote, parent_remote, env_fn: EnvFn) -> None:
+    """Subprocess loop: owns one environment and serves commands over a pipe."""
+    parent_remote.close()
+    env = None
+    ring, index = None, 0
+    try:
+        env = env_fn()
+        while True:
+            command, data = remote.recv()
+            try:
+                if command == "step":
+                    action, slot = data
+                    obs, reward, terminated, truncated, info = _step_autoreset(env, action)
+                    if ring is not None:
+                        _write_rings(ring, slot, index, obs)
+                        obs = None
+                    remote.send((True, (obs, reward, terminated, truncated, info)))
+                elif command == "reset":
+                    seed, options, slot = data
+                    obs, info = env.reset(seed=seed, options=options)
+                    if ring is not None:
+                        _write_rings(ring, slot, index, obs)
+                        obs = None
+                    remote.send((True, (obs, info)))
+                elif command == "attach":
+                    spec, index = data
+                    ring = _attach_rings(spec)
+                    remote.send((True, None))
+                elif command == "metrics":
+                    remote.send((True, env.get_metrics()))
+                elif command == "spaces":
+                    remote.send((True, (env.observation_space, env.action_space)))
+                elif command == "close":
+                    remote.send((True, None))
+                    break
+                else:
+                    raise ValueError(f"Unknown command: {command}")
+            except Exception as e:
+                logger.error(f"Worker command {command} failed: {e}")
+                remote.send((False, repr(e)))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception as e:
+        logger.error(f"Worker failed to start environment: {e}")
+        try:
+            remote.send((False, repr(e)))
+        except (BrokenPipeError, EOFError):
+            pass
+    finally:
+        if env is not None:
+            env.close()
+        if ring is not None:
+            _close_rings(ring)
+        remote.close()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Throughput and latency benchmarks for the transport, decode and env paths.
+
+Everything runs against FakeLuaPeer threads (src/core/fake_peer.py), so no
+BizHawk or ROM is needed and results are comparable between machines and
+commits. Each benchmark reports calls per second and p50/p99 latency.
+
+    python -m src.scripts.benchmark                     # all suites
+    python -m src.scripts.benchmark --suite env --envs 4 --latency 0.0005
+    python -m src.scripts.benchmark --suite transport --transport tcp --transport unix
+"""
+
+import argparse
+import asyncio
+import functools
+import logging
+import socket
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from src.core.fake_peer import FakeBizHawkEmulator, FakeAsyncBizHawkEmulator, make_frame
+from src.core.image_utils import PreprocessConfig, FramePipeline
+from src.core.memory_map import FIRERED_MEMORY_MAP
+from src.core.state_classifier import GameStateClassifier
+from src.core.tile_grid import TileGrid
+from src.core.tile_index import TileIndex
+from src.core.transport import TRANSPORTS
+from src.env.game_env import PokemonFireRedEnv
+from src.env.vector_env import make_vector_env
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SUITES = ('transport', 'decode', 'env')
+# Transports usable on this platform
+AVAILABLE_TRANSPORTS = tuple(t for t in TRANSPORTS if t != 'unix' or hasattr(socket, 'AF_UNIX'))
+
+
+def measure(name: str, fn: Callable[[], object], iterations: int, per_call: int = 1) -> dict:
+    """
+    Time `iterations` calls of fn individually and print a result row.
+
+    Args:
+        name: Row label
+        fn: Operation to time
+        iterations: Number of timed calls (after a few warm-up calls)
+        per_call: Operations performed by one call (e.g. envs per vector step)
+
+    Returns:
+        Dict with ops_per_sec, p50_us and p99_us
+    """
+    for _ in range(min(10, iterations)):
+        fn()
+    times = np.empty(iterations, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(iterations):
+        start = clock()
+        fn()
+        times[i] = clock() - start
+    result = {
+        'ops_per_sec': per_call * iterations / (times.sum() / 1e9),
+        'p50_us': np.percentile(times, 50) / 1e3,
+        'p99_us': np.percentile(times, 99) / 1e3,
+    }
+    print(f"  {name:<38} {result['ops_per_sec']:>11.0f}/s {result['p50_us']:>10.1f} {result['p99_us']:>10.1f}")
+    return result
+
+
+def _header(title: str) -> None:
+    print(f"\n{title}")
+    print(f"  {'':<38} {'throughput':>13} {'p50 us':>10} {'p99 us':>10}")
+
+
+def bench_transport(args) -> None:
+    for transport in args.transport or AVAILABLE_TRANSPORTS:
+        _bench_sync_transport(args, transport)
+    asyncio.run(_bench_async_transport(args))
+
+
+def _bench_sync_transport(args, transport: str) -> None:
+    _header(f"Transport (FakeLuaPeer over {transport.upper()})")
+    emulator = FakeBizHawkEmulator(latency=args.latency, transport=transport)
+    try:
+        buttons = iter(np.random.default_rng(0).choice(['up', 'down', 'left', 'right'], size=1 << 20))
+        measure("step ack (6 frames)", lambda: emulator.step('a', 6), args.iterations)
+
+        def moving_screen():
+            emulator.step(next(buttons), 1)
+            emulator.get_screen()
+
+        measure("step + changed screen", moving_screen, args.iterations)
+        measure("unchanged screen (hash only)", emulator.get_screen, args.iterations)
+        measure("readmem FIRERED_MEMORY_MAP", lambda: emulator.read_memory(FIRERED_MEMORY_MAP), args.iterations)
+
+        def snapshot_roundtrip():
+            state_id = emulator.save_memory_state()
+            emulator.load_memory_state(state_id)
+            emulator.drop_memory_state(state_id)
+
+        measure("savemem + loadmem + dropmem", snapshot_roundtrip, args.iterations)
+    finally:
+        emulator.close()
+
+
+async def _bench_async_transport(args) -> None:
+    _header("Async transport (FakeLuaPeer over UDP)")
+    emulator = await FakeAsyncBizHawkEmulator.create(max_in_flight=args.in_flight, latency=args.latency)
+    loop = asyncio.get_running_loop()
+    try:
+        batch = args.in_flight
+        times = []
+        for _ in range(args.iterations // batch):
+            start = loop.time()
+            await asyncio.gather(*(emulator.get_screen() for _ in range(batch)))
+            times.append((loop.time() - start) / batch)
+        times = np.array(times)
+        print(f"  {f'async screens ({batch} in flight)':<38} {1 / times.mean():>11.0f}/s "
+              f"{np.percentile(times, 50) * 1e6:>10.1f} {np.percentile(times, 99) * 1e6:>10.1f}")
+    finally:
+        await emulator.close()
+
+
+def bench_decode(args) -> None:
+    _header("Decode (per frame, no I/O)")
+    frames = [make_frame(seed) for seed in range(16)]
+    cycle = iter(frames * (args.iterations // len(frames) + 16))
+
+    rgb = FramePipeline(PreprocessConfig())
+    rgb.reset(frames[0])
+    measure("FramePipeline RGB copy", lambda: rgb(next(cycle)), args.iterations)
+
+    cycle = iter(frames * (args.iterations // len(frames) + 16))
+    small = FramePipeline(PreprocessConfig(grayscale=True, downscale=2, frame_stack=4))
+    small.reset(frames[0])
+    measure("FramePipeline gray /2 stack 4", lambda: small(next(cycle)), args.iterations)
+
+    classifier = GameStateClassifier.default()
+    cycle = iter(frames * (args.iterations // len(frames) + 16))
+    measure("GameStateClassifier.classify", lambda: classifier.classify(next(cycle)), args.iterations)
+
+    grid, index = TileGrid(), TileIndex()
+    ids = np.zeros((11, 15), dtype=np.uint16)
+    cycle = iter(frames * (args.iterations // len(frames) + 16))
+
+    def tiles():
+        grid.update(next(cycle))
+        index.encode(grid.hashes(), out=ids)
+
+    measure("TileGrid.hashes + TileIndex.encode", tiles, args.iterations)
+
+    raw = bytes(FIRERED_MEMORY_MAP.nbytes)
+    measure("MemoryMap.decode", lambda: FIRERED_MEMORY_MAP.decode(raw), args.iterations)
+
+
+def bench_env(args) -> None:
+    _header("Environment steps (fake emulator)")
+    factory = functools.partial(FakeBizHawkEmulator, latency=args.latency, fps=args.fps)
+    rng = np.random.default_rng(0)
+
+    configs = [
+        ("env.step RGB", {}),
+        ("env.step gray /2 stack 4 + tiles", {
+            'preprocess': PreprocessConfig(grayscale=True, downscale=2, frame_stack=4),
+            'tile_index': TileIndex(),
+        }),
+        ("env.step RAM-only observation", {'observation': ('ram',)}),
+    ]
+    for name, kwargs in configs:
+        env = PokemonFireRedEnv(None, None, None, emulator_factory=factory, **kwargs)
+        try:
+            env.reset(seed=0)
+            actions = iter(rng.integers(0, env.action_space.n, size=args.iterations + 16))
+            measure(name, lambda: env.step(next(actions)), args.iterations)
+        finally:
+            env.close()
+
+    for asynchronous in (False, True):
+        envs = make_vector_env(
+            args.envs, None, None, None, asynchronous=asynchronous, emulator_factory=factory
+        )
+        try:
+            envs.reset(seed=0)
+            actions = iter(rng.integers(0, 8, size=(args.iterations + 16, args.envs)))
+            label = f"{'async' if asynchronous else 'sync'} vector step x{args.envs} (env steps)"
+            measure(label, lambda: envs.step(next(actions)), args.iterations, per_call=args.envs)
+        finally:
+            envs.close()
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suite', choices=SUITES, action='append', help="Suites to run (default: all)")
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the fake peer waits before each reply")
+    parser.add_argument('--fps', type=float, default=None, help="Emulated frames per second (default: unlimited)")
+    parser.add_argument('--envs', type=int, default=4, help="Envs in the vector benchmarks")
+    parser.add_argument('--in-flight', type=int, default=8, help="Pipelined requests in the async benchmark")
+    parser.add_argument('--transport', choices=AVAILABLE_TRANSPORTS, action='append',
+                        help="Transports in the transport suite (default: all available)")
+    args = parser.parse_args(argv)
+
+    suites = {'transport': bench_transport, 'decode': bench_decode, 'env': bench_env}
+    for suite in args.suite or SUITES:
+        suites[suite](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark raw framebuffer transport against the legacy PNG screen path.
+
+Runs BizHawkEmulator against a FakeLuaPeer thread (src/core/fake_peer.py), so
+no BizHawk or ROM is needed. The legacy path is measured as one PNG datagram
+per frame followed by ImageProcessor.decode_screenshot; the raw path is
+BizHawkEmulator.get_screen, both for a changing screen and for a static one
+answered by hash only. See benchmark.py for the full suite.
+"""
+
+import io
+import time
+import logging
+
+import numpy as np
+from PIL import Image
+
+from src.core.fake_peer import FakeLuaPeer, FakeBizHawkEmulator
+from src.core.image_utils import ImageProcessor
+from src.core.protocol import FRAME_SHAPE
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class PngLuaPeer(FakeLuaPeer):
+    """FakeLuaPeer that also answers the legacy `pngscreen` command."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        buffer = io.BytesIO()
+        Image.fromarray(self.frame()).save(buffer, format='PNG')
+        self.png = buffer.getvalue()
+        # Ignore the client's frame hash, so every screen is sent in full
+        self.changing = True
+
+    def frame(self) -> np.ndarray:
+        return np.frombuffer(self.screens[self.screen_index()], dtype=np.uint8).reshape(FRAME_SHAPE)
+
+    def _cmd_screen(self, req_id: int, args: str) -> None:
+        super()._cmd_screen(req_id, '' if self.changing else args)
+
+    def _cmd_pngscreen(self, req_id: int, args: str) -> None:
+        self._send(self.png)
+
+
+class FakeEmulator(FakeBizHawkEmulator):
+    """FakeBizHawkEmulator with the legacy PNG screen path."""
+
+    peer_class = PngLuaPeer
+
+    def get_screen_png(self) -> np.ndarray:
+        """Legacy path: one PNG datagram decoded through PIL and cv2."""
+        self.transport.send(b"pngscreen")
+        data = bytearray(65535)
+        size = self.transport.recv_into(data)
+        return ImageProcessor.decode_screenshot(bytes(data[:size]))
+
+
+def bench(fn, iterations: int) -> float:
+    """Return mean seconds per call."""
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(iterations: int = 500) -> None:
+    emulator = FakeEmulator()
+    try:
+        frame = emulator.peer.frame()
+        assert np.array_equal(emulator.get_screen(), frame)
+        png = bench(emulator.get_screen_png, iterations)
+        raw = bench(emulator.get_screen, iterations)
+        emulator.peer.changing = False
+        static = bench(emulator.get_screen, iterations)
+        print(f"PNG datagram ({len(emulator.peer.png)} B) + decode: {png * 1e6:8.1f} us/frame")
+        print(f"Raw chunked frame ({frame.nbytes} B):        {raw * 1e6:8.1f} us/frame")
+        print(f"Unchanged frame (hash only):           {static * 1e6:8.1f} us/frame")
+        print(f"Speedup: {png / raw:.1f}x")
+    finally:
+        emulator.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark emulator startup: import time, serial vs concurrent launch, warm pool.
+
+Uses FakeLuaPeer instances that wait `--delay` seconds before their "ready"
+handshake to stand in for BizHawk's boot time, so no BizHawk or ROM is needed.
+
+    python -m src.scripts.benchmark_startup --count 32 --delay 0.5
+"""
+
+import argparse
+import functools
+import logging
+import subprocess
+import sys
+import time
+from typing import List
+
+from src.core.fake_peer import FakeBizHawkEmulator
+from src.core.launcher import EmulatorLauncher, WarmPool
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import src.env.game_env
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('cv2', 'PIL', 'dotenv') if m in sys.modules]
+print(f"{elapsed:.3f} {','.join(heavy) or '-'}")
+"""
+
+
+def measure_import() -> None:
+    """Time a cold import of the env module in a fresh interpreter."""
+    out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], capture_output=True, text=True, check=True)
+    elapsed, heavy = out.stdout.split()
+    print(f"import src.env.game_env:        {float(elapsed) * 1e3:8.1f} ms (eagerly loaded: {heavy})")
+
+
+def close_all(emulators: List[FakeBizHawkEmulator]) -> None:
+    for emulator in emulators:
+        emulator.close()
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=16, help="Emulators to start")
+    parser.add_argument('--delay', type=float, default=0.25, help="Simulated boot time per emulator (s)")
+    args = parser.parse_args(argv)
+
+    measure_import()
+    factory = functools.partial(FakeBizHawkEmulator, startup_delay=args.delay)
+
+    start = time.perf_counter()
+    emulators = [factory() for _ in range(args.count)]
+    serial = time.perf_counter() - start
+    close_all(emulators)
+    print(f"serial start of {args.count}:            {serial:8.2f} s")
+
+    launcher = EmulatorLauncher(None, None, None, emulator_factory=factory)
+    start = time.perf_counter()
+    emulators = launcher.launch(args.count)
+    parallel = time.perf_counter() - start
+    close_all(emulators)
+    print(f"EmulatorLauncher start of {args.count}:   {parallel:8.2f} s ({serial / parallel:.1f}x)")
+
+    pool = WarmPool(launcher, args.count)
+    try:
+        while len(pool) < args.count:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        emulators = [pool.acquire() for _ in range(args.count)]
+        warm = time.perf_counter() - start
+        close_all(emulators)
+        print(f"WarmPool acquire of {args.count}:         {warm * 1e3:8.2f} ms")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
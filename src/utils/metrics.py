@@ -0,0 +1,244 @@
+"""Low-overhead counters and fixed-bucket histograms with Prometheus text export."""
+from typing import Dict, Optional, Sequence, Tuple, Union
+from bisect import bisect_left
+from pathlib import Path
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds: 10 us .. 10 s, roughly 1-2.5-5 per decade
+TIME_BUCKETS = (
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+    1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Upper bounds in bytes for per-frame transfer sizes
+BYTE_BUCKETS = (64, 1024, 16384, 65536, 131072, 262144, 1048576)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    """Monotonic count."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Counts of observations falling into fixed buckets.
+
+    observe() is one bisect over a short tuple plus three additions, so it
+    can sit on the per-step hot path. Buckets are stored non-cumulatively
+    and accumulated on export.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float] = TIME_BUCKETS):
+        """
+        Args:
+            bounds: Increasing bucket upper bounds; a +Inf bucket is implied
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if beyond the last bound)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Registry of named counters and histograms.
+
+    Instruments are created once with counter()/histogram() and the returned
+    objects are updated directly, so recording never touches the registry.
+    Components hold an Optional[Metrics] and skip all timing when it is None.
+
+    With `textfile` set, maybe_write() rewrites that file in Prometheus text
+    format at most every `interval` seconds, for node_exporter's textfile
+    collector.
+    """
+
+    def __init__(
+        self,
+        namespace: str = 'firered',
+        labels: Optional[Dict[str, str]] = None,
+        textfile: Optional[Union[str, Path]] = None,
+        interval: float = 15.0
+    ):
+        """
+        Args:
+            namespace: Prefix of every exported metric name
+            labels: Constant labels added to every series, e.g. {'env': '3'}
+            textfile: Prometheus .prom file written by maybe_write()
+            interval: Minimum seconds between textfile writes
+        """
+        self.namespace = namespace
+        self.labels = dict(labels or {})
+        self.textfile = Path(textfile) if textfile else None
+        self.interval = interval
+        self._counters: Dict[Tuple[str, LabelKey], Counter] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._next_write = time.monotonic() + interval
+
+    def counter(self, name: str, help: str = '', **labels: str) -> Counter:
+        """Get or create a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._counters:
+            self._counters[key] = Counter()
+            self._help.setdefault(name, help)
+        return self._counters[key]
+
+    def histogram(
+        self, name: str, bounds: Sequence[float] = TIME_BUCKETS, help: str = '', **labels: str
+    ) -> Histogram:
+        """Get or create a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(bounds)
+            self._help.setdefault(name, help)
+        return self._histograms[key]
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """
+        Plain-dict copy of every instrument.
+
+        Returns:
+            {'counters': {series: value}, 'histograms': {series: {count, sum,
+            mean, p50, p99, buckets}}}, where series is the name plus any
+            labels, e.g. 'step_phase_seconds{phase="screen"}'
+        """
+        counters = {_series(name, labels): c.value for (name, labels), c in self._counters.items()}
+        histograms = {}
+        for (name, labels), h in self._histograms.items():
+            histograms[_series(name, labels)] = {
+                'count': h.count,
+                'sum': h.sum,
+                'mean': h.sum / h.count if h.count else 0.0,
+                'p50': h.quantile(0.5),
+                'p99': h.quantile(0.99),
+                'buckets': dict(zip(h.bounds + (float('inf'),), h.counts)),
+            }
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self) -> str:
+        """Render every instrument in the Prometheus text exposition format."""
+        const = tuple(sorted(self.labels.items()))
+        lines = []
+        typed = set()
+
+        def declare(name: str, kind: str) -> str:
+            full = f"{self.namespace}_{name}"
+            if full not in typed:
+                typed.add(full)
+                if self._help.get(name):
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        for (name, labels), c in sorted(self._counters.items()):
+            full = declare(name, 'counter')
+            lines.append(f"{_series(full, const + labels)} {c.value}")
+        for (name, labels), h in sorted(self._histograms.items()):
+            full = declare(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(h.bounds + (float('inf'),), h.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{_series(full + '_bucket', const + labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(full + '_sum', const + labels)} {h.sum!r}")
+            lines.append(f"{_series(full + '_count', const + labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Atomically (write + rename) dump to_prometheus() to a file."""
+        path = Path(path) if path else self.textfile
+        if path is None:
+            raise ValueError("No path given for metrics textfile")
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp.write_text(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def maybe_write(self) -> None:
+        """Write the textfile if one is configured and `interval` has elapsed."""
+        if self.textfile is None:
+            return
+        now = time.monotonic()
+        if now < self._next_write:
+            return
+        self._next_write = now + self.interval
+        try:
+            self.write_textfile()
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {self.textfile}: {e}")
+
+
+class PhaseTimer:
+    """Splits an operation into consecutive phases and records each duration.
+
+    Call start() at the beginning and lap(phase) after each phase; the time
+    since the previous mark goes into that phase's histogram and into
+    `timings`, which always holds the durations of the latest run.
+    """
+
+    __slots__ = ('_histograms', '_total', '_start', '_mark', 'timings')
+
+    def __init__(self, metrics: Metrics, name: str, phases: Sequence[str]):
+        """
+        Args:
+            metrics: Registry holding the histograms
+            name: Histogram name; phases become its `phase` label, and the
+                whole run is recorded as phase="total"
+            phases: Phase names in the order they run
+        """
+        help = "Wall time per phase"
+        self._histograms = {p: metrics.histogram(name, help=help, phase=p) for p in phases}
+        self._total = metrics.histogram(name, help=help, phase='total')
+        self._start = self._mark = 0.0
+        self.timings = dict.fromkeys(phases, 0.0)
+
+    def start(self) -> None:
+        self._start = self._mark = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        self._mark = now
+        self._histograms[phase].observe(elapsed)
+        self.timings[phase] = elapsed
+
+    def stop(self) -> float:
+        """Record and return the time since start()."""
+        total = time.perf_counter() - self._start
+        self._total.observe(total)
+        return total
+
+
+def _series(name: str, labels: LabelKey) -> str:
+    if not labels:
+        return name
+    body = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{name}{{{body}}}"
@@ -0,0 +1,43 @@
+"""BizHawkEmulator against a fake Lua peer that loses datagrams."""
+import numpy as np
+
+from src.core.fake_peer import FakeBizHawkEmulator
+from src.core.memory_map import FIRERED_MEMORY_MAP
+from src.core.protocol import HEADER, KIND_FRAME, MAGIC
+from src.utils.metrics import Metrics
+
+
+def _drop_frame_chunk(peer, index):
+    """Make the peer lose chunk `index` of the next frame it sends."""
+    send = peer._send
+    dropped = []
+
+    def lossy(data, *args):
+        if not dropped and data[:2] == MAGIC:
+            _, kind, _, _, chunk, _, _, _ = HEADER.unpack_from(data)
+            if kind == KIND_FRAME and chunk == index:
+                dropped.append(chunk)
+                return None
+        return send(data, *args)
+
+    peer._send = lossy
+    return dropped
+
+
+def test_step_with_both_riders_survives_a_lost_frame_chunk():
+    reference = FakeBizHawkEmulator()
+    emulator = FakeBizHawkEmulator()
+    metrics = Metrics()
+    emulator.set_metrics(metrics)
+    emulator.timeout = 0.2
+    try:
+        expected_image, expected_ram = reference.step_observe('right', 6, memory_map=FIRERED_MEMORY_MAP)
+        dropped = _drop_frame_chunk(emulator.peer, 3)
+        image, ram = emulator.step_observe('right', 6, memory_map=FIRERED_MEMORY_MAP)
+        assert dropped == [3]
+        assert metrics.snapshot()['counters']['retransmits_total'] == 1
+        np.testing.assert_array_equal(image, expected_image)
+        assert ram == expected_ram
+    finally:
+        reference.close()
+        emulator.close()
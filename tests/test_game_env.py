@@ -0,0 +1,45 @@
+"""PokemonFireRedEnv against a fake Lua peer."""
+import pytest
+
+from src.core.fake_peer import FakeBizHawkEmulator
+from src.core.novelty import VisitCounter
+from src.env.game_env import PokemonFireRedEnv
+
+
+def _count_readmem(env):
+    """Count the RAM reads the env's fake peer answers."""
+    peer = env.emulator.peer
+    readmem = peer._cmd_readmem
+    calls = []
+
+    def counting(req_id, args):
+        calls.append(req_id)
+        readmem(req_id, args)
+
+    peer._cmd_readmem = counting
+    return calls
+
+
+@pytest.mark.parametrize('novelty_reward, reads', [(False, 0), (True, 4)])
+def test_pixels_only_observation_reads_ram_only_for_the_novelty_reward(novelty_reward, reads):
+    env = PokemonFireRedEnv(
+        None, None, None, emulator_factory=FakeBizHawkEmulator,
+        observation=('pixels',), novelty_reward=novelty_reward
+    )
+    try:
+        assert (env.visit_counter is not None) == novelty_reward
+        calls = _count_readmem(env)
+        env.reset(seed=0)
+        for action in (3, 3, 2):
+            env.step(action)
+        assert len(calls) == reads
+    finally:
+        env.close()
+
+
+def test_visit_counter_needs_the_novelty_reward():
+    with pytest.raises(ValueError):
+        PokemonFireRedEnv(
+            None, None, None, emulator_factory=FakeBizHawkEmulator,
+            visit_counter=VisitCounter(), novelty_reward=False
+        )
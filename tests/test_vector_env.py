@@ -0,0 +1,62 @@
+"""Vector env construction against fake Lua peers."""
+import numpy as np
+import pytest
+
+from src.core.fake_peer import FakeBizHawkEmulator
+from src.core.novelty import VisitCounter
+from src.env.vector_env import make_vector_env
+
+
+def test_shared_visit_counter_keeps_one_row_per_env():
+    counter = VisitCounter(num_envs=2)
+    envs = make_vector_env(
+        2, None, None, None, emulator_factory=FakeBizHawkEmulator, visit_counter=counter
+    )
+    try:
+        envs.reset(seed=0)
+        assert [env.env_index for env in envs.envs] == [0, 1]
+        # Both envs walk into the same new cell: each is a first visit for its own episode
+        _, rewards, _, _, _ = envs.step(np.array([3, 3]))
+        assert rewards.tolist() == [1.0, 1.0]
+        assert counter.cells_visited(0) == counter.cells_visited(1) == 2
+        # Stepping back to the start cell is a revisit for both
+        _, rewards, _, _, _ = envs.step(np.array([2, 2]))
+        assert rewards.tolist() == [0.0, 0.0]
+    finally:
+        envs.close()
+
+
+def test_shared_visit_counter_needs_a_row_per_env():
+    with pytest.raises(ValueError):
+        make_vector_env(2, None, None, None, emulator_factory=FakeBizHawkEmulator, visit_counter=VisitCounter())
+
+
+def test_private_visit_counters_reward_every_env():
+    envs = make_vector_env(2, None, None, None, emulator_factory=FakeBizHawkEmulator)
+    try:
+        envs.reset(seed=0)
+        _, rewards, _, _, _ = envs.step(np.array([3, 3]))
+        assert rewards.tolist() == [1.0, 1.0]
+    finally:
+        envs.close()
+
+
+def test_async_dict_observations_use_one_ring_per_key():
+    kwargs = dict(emulator_factory=FakeBizHawkEmulator, observation=('pixels', 'ram'))
+    sync = make_vector_env(2, None, None, None, **kwargs)
+    async_envs = make_vector_env(2, None, None, None, asynchronous=True, **kwargs)
+    try:
+        assert sorted(async_envs._ring) == ['pixels', 'ram']
+        expected, _ = sync.reset(seed=0)
+        observations, _ = async_envs.reset(seed=0)
+        for action in (None, [3, 1], [0, 2]):
+            if action is not None:
+                expected, _, _, _, _ = sync.step(np.array(action))
+                observations, _, _, _, _ = async_envs.step(np.array(action))
+            assert sorted(observations) == sorted(expected)
+            for key, batch in observations.items():
+                assert batch.base is not None
+                np.testing.assert_array_equal(batch, expected[key])
+    finally:
+        sync.close()
+        async_envs.close()